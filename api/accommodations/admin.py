@@ -3,7 +3,8 @@ from .models import (
     PropertyType, PropertyCategory, PropertyAddress, Property,
     PropertyAmenity, PropertyAmenityLink, PropertyImage, PropertyDescription,
     RoomType, Room, RoomAmenity, RoomAmenityLink,
-    RoomAvailability, RoomPricing
+    RoomAvailability, RoomPricing, RoomAvailabilityRange, PropertySearchProjection,
+    RoomTypeInventory, RoomSeasonPriceState
 )
 
 
@@ -130,11 +131,92 @@ class RoomAmenityLinkAdmin(admin.ModelAdmin):
 
 @admin.register(RoomAvailability)
 class RoomAvailabilityAdmin(admin.ModelAdmin):
-    list_display = ['room', 'date', 'available', 'price', 'created_at']
+    list_display = ['room', 'date', 'available', 'price', 'price_from_season', 'created_at']
     search_fields = ['room__name', 'room__property__name']
-    list_filter = ['available', 'date', 'created_at']
+    list_filter = ['available', 'price_from_season', 'date', 'created_at']
     ordering = ['date']
     date_hierarchy = 'date'
+    readonly_fields = ['price_from_season']
+    
+    def save_model(self, request, obj, form, change):
+        # Un prix saisi remplace le prix de saison (voir season_prices.py)
+        if 'price' in form.changed_data:
+            obj.price_from_season = False
+        super().save_model(request, obj, form, change)
+
+
+# ============================================================================
+# ROOM AVAILABILITY RANGES
+# ============================================================================
+
+@admin.register(RoomAvailabilityRange)
+class RoomAvailabilityRangeAdmin(admin.ModelAdmin):
+    list_display = ['room', 'start_date', 'end_date', 'available', 'price', 'updated_at']
+    search_fields = ['room__name', 'room__property__name']
+    list_filter = ['available', 'start_date']
+    ordering = ['room', 'start_date']
+    date_hierarchy = 'start_date'
+
+
+# ============================================================================
+# PROPERTY SEARCH PROJECTIONS
+# ============================================================================
+
+@admin.register(PropertySearchProjection)
+class PropertySearchProjectionAdmin(admin.ModelAdmin):
+    """Lecture seule : la projection est recalculée par search_projection"""
+    list_display = [
+        'name', 'city', 'country', 'status', 'rating', 'max_guests',
+        'from_price', 'price_window_start', 'refreshed_at'
+    ]
+    search_fields = ['name', 'city', 'country']
+    list_filter = ['status', 'price_window_start']
+    ordering = ['name']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ============================================================================
+# ROOM TYPE INVENTORY
+# ============================================================================
+
+@admin.register(RoomTypeInventory)
+class RoomTypeInventoryAdmin(admin.ModelAdmin):
+    """Lecture seule : le stock est recalculé par inventory"""
+    list_display = ['property', 'room_type', 'date', 'rooms_total', 'rooms_available', 'min_price', 'updated_at']
+    search_fields = ['property__name', 'room_type__name']
+    list_filter = ['date']
+    ordering = ['property', 'room_type', 'date']
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ============================================================================
+# ROOM SEASON PRICE STATES
+# ============================================================================
+
+@admin.register(RoomSeasonPriceState)
+class RoomSeasonPriceStateAdmin(admin.ModelAdmin):
+    """Lecture seule : tenu par season_prices"""
+    list_display = ['room', 'horizon_end', 'materialized_at']
+    search_fields = ['room__name', 'room__property__name']
+    list_filter = ['horizon_end']
+    ordering = ['-materialized_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 # ============================================================================
@@ -175,6 +257,13 @@ class RoomAdmin(admin.ModelAdmin):
     ordering = ['property', 'name']
     autocomplete_fields = ['property', 'room_type']
     inlines = [RoomAmenityLinkInline, RoomAvailabilityInline]
+    
+    def save_formset(self, request, form, formset, change):
+        if formset.model is RoomAvailability:
+            for inline_form in formset.forms:
+                if 'price' in inline_form.changed_data:
+                    inline_form.instance.price_from_season = False
+        super().save_formset(request, form, formset, change)
 
 
 # ============================================================================
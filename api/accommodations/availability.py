@@ -0,0 +1,168 @@
+"""
+Requêtes calendrier pour les disponibilités des chambres.
+
+Une période de séjour est toujours exprimée comme l'intervalle semi-ouvert
+[check_in, check_out) : la nuit du check_out n'est pas incluse.
+"""
+from datetime import datetime, timedelta
+
+from django.db.models import Count
+
+from .models import Room, RoomAvailability, RoomAvailabilityRange
+from .availability_ranges import ranges_enabled, overlapping_ranges, iter_nights
+
+
+def parse_stay(check_in, check_out):
+    """
+    Convertir deux dates YYYY-MM-DD en période de séjour.
+
+    Lève ValueError si une date est invalide ou si check_out n'est pas
+    strictement après check_in.
+    """
+    try:
+        check_in_date = datetime.strptime(check_in, '%Y-%m-%d').date()
+        check_out_date = datetime.strptime(check_out, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError('Format de date invalide. Utilisez YYYY-MM-DD')
+    if check_in_date >= check_out_date:
+        raise ValueError('check_out doit être après check_in')
+    return check_in_date, check_out_date
+
+
+def stay_nights(check_in, check_out):
+    """Liste des nuits de la période [check_in, check_out)"""
+    return [
+        check_in + timedelta(days=offset)
+        for offset in range((check_out - check_in).days)
+    ]
+
+
+def get_stay_calendar(room_ids, check_in, check_out):
+    """
+    Récupérer en une seule requête le calendrier de plusieurs chambres.
+
+    Retourne un dictionnaire {room_id (str): {'available', 'unavailable_dates',
+    'nights'}}. Comme pour la recherche (rooms_available_for_stay), une nuit
+    n'est disponible que si elle a une ligne available=True : une nuit sans
+    ligne n'est pas réservable.
+    """
+    room_ids = [str(room_id) for room_id in room_ids]
+    nights = stay_nights(check_in, check_out)
+
+    calendar = {room_id: {} for room_id in room_ids}
+    for room_id, date, available, price in calendar_rows(room_ids, check_in, check_out):
+        calendar[str(room_id)][date] = (available, price)
+
+    result = {}
+    for room_id in room_ids:
+        room_rows = calendar[room_id]
+        unavailable_dates = []
+        nights_data = []
+        for night in nights:
+            available, price = room_rows.get(night, (False, None))
+            if not available:
+                unavailable_dates.append(str(night))
+            nights_data.append({
+                'date': str(night),
+                'available': available,
+                'price': float(price) if price is not None else None,
+            })
+        result[room_id] = {
+            'available': len(unavailable_dates) == 0,
+            'unavailable_dates': unavailable_dates,
+            'nights': nights_data,
+        }
+    return result
+
+
+def calendar_rows(room_ids, date_from, date_to):
+    """
+    Nuits enregistrées de [date_from, date_to) : tuples (room_id, date,
+    available, price), quel que soit le stockage (par nuit ou par plages).
+    """
+    if ranges_enabled():
+        ranges = overlapping_ranges(room_ids, date_from, date_to).order_by()
+        return [
+            (availability_range.room_id, night, availability_range.available, availability_range.price)
+            for availability_range, night in iter_nights(ranges, date_from, date_to)
+        ]
+    return RoomAvailability.objects.filter(
+        room_id__in=room_ids,
+        date__gte=date_from,
+        date__lt=date_to
+    ).order_by().values_list('room_id', 'date', 'available', 'price')
+
+
+def rooms_available_for_stay(check_in, check_out, guests=1, properties=None):
+    """
+    Chambres disponibles pour toutes les nuits de [check_in, check_out).
+
+    Une chambre est retenue si elle est en statut 'available', accepte au
+    moins `guests` personnes et possède une ligne available=True pour chaque
+    nuit du séjour. Le comptage est fait par un GROUP BY room_id / HAVING.
+
+    Si `properties` (queryset de Property ou de PropertySearchProjection) est
+    fourni, seules les chambres de ces propriétés sont comptées : la requête
+    part alors des chambres candidates et lit l'index unique (room, date) au
+    lieu de parcourir toute la période dans l'index (available, date, room).
+    """
+    nights = (check_out - check_in).days
+    if ranges_enabled():
+        return _rooms_available_for_stay_from_ranges(check_in, check_out, guests, properties)
+
+    calendar = RoomAvailability.objects.filter(
+        date__gte=check_in,
+        date__lt=check_out,
+        available=True
+    )
+    if properties is not None:
+        calendar = calendar.filter(
+            room__property_id__in=properties.order_by().values('pk')
+        )
+
+    open_rooms = calendar.order_by().values('room_id').annotate(
+        open_nights=Count('id')
+    ).filter(open_nights=nights).values('room_id')
+
+    return Room.objects.filter(
+        id__in=open_rooms,
+        status='available',
+        max_guests__gte=guests
+    )
+
+
+def _rooms_available_for_stay_from_ranges(check_in, check_out, guests, properties):
+    """
+    Variante de rooms_available_for_stay pour le stockage par plages.
+
+    Les plages ouvertes qui recouvrent le séjour sont lues en une requête ;
+    une chambre est retenue si leurs longueurs (coupées au séjour) couvrent
+    toutes les nuits, les plages d'une chambre ne se chevauchant pas.
+    """
+    nights = (check_out - check_in).days
+    ranges = RoomAvailabilityRange.objects.filter(
+        start_date__lt=check_out,
+        end_date__gt=check_in,
+        available=True,
+        room__status='available',
+        room__max_guests__gte=guests
+    )
+    if properties is not None:
+        ranges = ranges.filter(room__property_id__in=properties.order_by().values('pk'))
+
+    covered = {}
+    for room_id, start, end in ranges.order_by().values_list('room_id', 'start_date', 'end_date'):
+        covered[room_id] = covered.get(room_id, 0) + (min(end, check_out) - max(start, check_in)).days
+
+    return Room.objects.filter(
+        id__in=[room_id for room_id, count in covered.items() if count == nights],
+        status='available',
+        max_guests__gte=guests
+    )
+
+
+def properties_available_for_stay(check_in, check_out, guests=1, properties=None):
+    """Sous-requête des identifiants de propriétés ayant au moins une chambre libre"""
+    return rooms_available_for_stay(
+        check_in, check_out, guests, properties
+    ).order_by().values('property_id')
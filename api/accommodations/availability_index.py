@@ -0,0 +1,373 @@
+"""
+Index en mémoire des disponibilités des chambres.
+
+Pour chaque chambre, l'index garde deux bitmaps sur un horizon glissant qui
+commence aujourd'hui (bit i = nuit aujourd'hui + i jours) :
+- open_bits : nuits ayant une ligne RoomAvailability available=True
+- blocked_bits : nuits ayant une ligne RoomAvailability available=False
+ainsi que property_id, max_guests et status. Avec le stockage par plages
+(RoomAvailabilityRange), chaque plage remplit ses bits d'un seul masque.
+
+Un séjour [check_in, check_out) devient un masque de bits : la recherche et
+check_availability vérifient (open_bits & masque) == masque (une nuit sans
+ligne n'est pas réservable).
+
+L'index est propre au processus. Il est maintenu par les signaux post_save /
+post_delete de Room et RoomAvailability (voir signals.py), appliqués à la
+validation de la transaction, et reconstruit
+entièrement après AVAILABILITY_INDEX_MAX_AGE secondes pour rattraper les
+écritures des autres processus et les mises à jour en masse.
+"""
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Room, RoomAvailability, RoomAvailabilityRange
+from .availability_ranges import ranges_enabled
+
+
+class RoomEntry:
+    """Bitmaps et métadonnées d'une chambre"""
+    __slots__ = ('property_id', 'max_guests', 'status', 'open_bits', 'blocked_bits')
+
+    def __init__(self, property_id, max_guests, status):
+        self.property_id = property_id
+        self.max_guests = max_guests
+        self.status = status
+        self.open_bits = 0
+        self.blocked_bits = 0
+
+    def as_tuple(self):
+        return (self.property_id, self.max_guests, self.status, self.open_bits, self.blocked_bits)
+
+
+class RoomAvailabilityIndex:
+    """Bitmap de disponibilités par chambre sur un horizon glissant"""
+
+    def __init__(self, horizon_days=None):
+        self.horizon_days = horizon_days or getattr(
+            settings, 'AVAILABILITY_INDEX_HORIZON_DAYS', 730
+        )
+        self.start_date = None
+        self.rooms = {}
+        self.property_rooms = {}
+        self.built_at = None
+        self.build_seconds = None
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    def rebuild(self):
+        """Reconstruire tout l'index depuis la base (deux requêtes en flux)"""
+        started = time.perf_counter()
+        start_date = timezone.now().date()
+        rooms = {}
+        property_rooms = {}
+
+        for room_id, property_id, max_guests, status in Room.objects.order_by().values_list(
+            'id', 'property_id', 'max_guests', 'status'
+        ).iterator(chunk_size=10000):
+            rooms[room_id] = RoomEntry(property_id, max_guests, status)
+            property_rooms.setdefault(property_id, set()).add(room_id)
+
+        self._load_nights(rooms, start_date, start_date, start_date + timedelta(days=self.horizon_days))
+
+        with self._lock:
+            self.start_date = start_date
+            self.rooms = rooms
+            self.property_rooms = property_rooms
+            self.built_at = time.monotonic()
+            self.build_seconds = time.perf_counter() - started
+        return self
+
+    def _load_nights(self, rooms, start_date, date_from, date_to):
+        """Charger les nuits [date_from, date_to) dans les bitmaps de `rooms`"""
+        self._apply_runs(rooms, start_date, self._calendar_runs(date_from, date_to))
+
+    @staticmethod
+    def _calendar_runs(date_from, date_to, room_ids=None):
+        """
+        Nuits enregistrées de [date_from, date_to) : tuples (room_id, première
+        nuit, nombre de nuits, available), lus par nuit ou par plages selon
+        ROOM_AVAILABILITY_STORAGE.
+        """
+        if ranges_enabled():
+            ranges = RoomAvailabilityRange.objects.filter(
+                start_date__lt=date_to,
+                end_date__gt=date_from
+            )
+            if room_ids is not None:
+                ranges = ranges.filter(room_id__in=room_ids)
+            for room_id, start, end, available in ranges.order_by().values_list(
+                'room_id', 'start_date', 'end_date', 'available'
+            ).iterator(chunk_size=10000):
+                first = max(start, date_from)
+                yield room_id, first, (min(end, date_to) - first).days, available
+            return
+
+        rows = RoomAvailability.objects.filter(
+            date__gte=date_from,
+            date__lt=date_to
+        )
+        if room_ids is not None:
+            rows = rows.filter(room_id__in=room_ids)
+        for room_id, date, available in rows.order_by().values_list(
+            'room_id', 'date', 'available'
+        ).iterator(chunk_size=10000):
+            yield room_id, date, 1, available
+
+    @staticmethod
+    def _apply_runs(rooms, start_date, runs):
+        for room_id, first, nights, available in runs:
+            entry = rooms.get(room_id)
+            if entry is None:
+                continue
+            bits = ((1 << nights) - 1) << (first - start_date).days
+            if available:
+                entry.open_bits |= bits
+            else:
+                entry.blocked_bits |= bits
+
+    def ensure_fresh(self):
+        """Construire, faire glisser ou reconstruire l'index si nécessaire"""
+        max_age = getattr(settings, 'AVAILABILITY_INDEX_MAX_AGE', 3600)
+        if self.built_at is None or time.monotonic() - self.built_at > max_age:
+            return self.rebuild()
+
+        today = timezone.now().date()
+        if today != self.start_date:
+            self._roll(today)
+        return self
+
+    def _roll(self, today):
+        """Faire glisser l'horizon jusqu'à `today` et charger les nouvelles nuits"""
+        with self._lock:
+            shift = (today - self.start_date).days
+            if shift <= 0:
+                return
+            old_end = self.start_date + timedelta(days=self.horizon_days)
+            for entry in self.rooms.values():
+                entry.open_bits >>= shift
+                entry.blocked_bits >>= shift
+            self.start_date = today
+            new_end = today + timedelta(days=self.horizon_days)
+            self._load_nights(self.rooms, today, max(old_end, today), new_end)
+
+    # ------------------------------------------------------------------
+    # Mises à jour incrémentales (appelées par les signaux)
+    # ------------------------------------------------------------------
+
+    def set_room(self, room_id, property_id, max_guests, status):
+        with self._lock:
+            entry = self.rooms.get(room_id)
+            if entry is None:
+                entry = self.rooms[room_id] = RoomEntry(property_id, max_guests, status)
+            elif entry.property_id != property_id:
+                self.property_rooms.get(entry.property_id, set()).discard(room_id)
+            entry.property_id = property_id
+            entry.max_guests = max_guests
+            entry.status = status
+            self.property_rooms.setdefault(property_id, set()).add(room_id)
+
+    def remove_room(self, room_id):
+        with self._lock:
+            entry = self.rooms.pop(room_id, None)
+            if entry is not None:
+                self.property_rooms.get(entry.property_id, set()).discard(room_id)
+
+    def set_night(self, room_id, date, available):
+        """Enregistrer une ligne RoomAvailability ; available=None efface la nuit"""
+        if isinstance(date, str):
+            date = datetime.strptime(date, '%Y-%m-%d').date()
+        offset = self._offset(date)
+        if offset is None:
+            return
+        with self._lock:
+            entry = self.rooms.get(room_id)
+            if entry is None:
+                return
+            bit = 1 << offset
+            entry.open_bits &= ~bit
+            entry.blocked_bits &= ~bit
+            if available is True:
+                entry.open_bits |= bit
+            elif available is False:
+                entry.blocked_bits |= bit
+
+    def reload_nights(self, room_ids, date_from, date_to):
+        """Relire en base les nuits [date_from, date_to) de quelques chambres"""
+        if self.start_date is None:
+            return
+        date_from = max(date_from, self.start_date)
+        date_to = min(date_to, self.start_date + timedelta(days=self.horizon_days))
+        if date_from >= date_to:
+            return
+
+        room_ids = [to_room_key(room_id) for room_id in room_ids]
+        mask = ((1 << (date_to - date_from).days) - 1) << (date_from - self.start_date).days
+        runs = list(self._calendar_runs(date_from, date_to, room_ids))
+
+        with self._lock:
+            for room_id in room_ids:
+                entry = self.rooms.get(room_id)
+                if entry is not None:
+                    entry.open_bits &= ~mask
+                    entry.blocked_bits &= ~mask
+            self._apply_runs(self.rooms, self.start_date, runs)
+
+    def _offset(self, date):
+        if self.start_date is None:
+            return None
+        offset = (date - self.start_date).days
+        if 0 <= offset < self.horizon_days:
+            return offset
+        return None
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    def stay_mask(self, check_in, check_out):
+        """Masque de bits du séjour, ou None s'il sort de l'horizon"""
+        start = self._offset(check_in)
+        if start is None or (check_out - self.start_date).days > self.horizon_days:
+            return None
+        return ((1 << (check_out - check_in).days) - 1) << start
+
+    def covers(self, check_in, check_out):
+        return self.stay_mask(check_in, check_out) is not None
+
+    def room_open_for_stay(self, entry, mask, guests):
+        return (
+            entry.status == 'available'
+            and entry.max_guests >= guests
+            and entry.open_bits & mask == mask
+        )
+
+    def available_property_ids(self, check_in, check_out, guests=1, property_ids=None):
+        """
+        Propriétés ayant au moins une chambre ouverte toutes les nuits du séjour.
+
+        `property_ids` limite la recherche à un ensemble de propriétés
+        candidates ; sinon toutes les chambres de l'index sont examinées.
+        """
+        mask = self.stay_mask(check_in, check_out)
+        if mask is None:
+            raise ValueError('Séjour hors de l\'horizon de l\'index')
+
+        rooms = self.rooms
+        if property_ids is None:
+            property_ids = list(self.property_rooms.keys())
+
+        result = []
+        for property_id in property_ids:
+            for room_id in self.property_rooms.get(property_id, ()):
+                entry = rooms.get(room_id)
+                if entry is not None and self.room_open_for_stay(entry, mask, guests):
+                    result.append(property_id)
+                    break
+        return result
+
+    def open_room_capacities(self, check_in, check_out, property_ids):
+        """{property_id: [max_guests des chambres ouvertes toutes les nuits du séjour]}"""
+        mask = self.stay_mask(check_in, check_out)
+        if mask is None:
+            raise ValueError('Séjour hors de l\'horizon de l\'index')
+
+        rooms = self.rooms
+        result = {}
+        for property_id in property_ids:
+            for room_id in self.property_rooms.get(property_id, ()):
+                entry = rooms.get(room_id)
+                if entry is not None and self.room_open_for_stay(entry, mask, 1):
+                    result.setdefault(property_id, []).append(entry.max_guests)
+        return result
+
+    def unavailable_dates(self, room_id, check_in, check_out):
+        """Nuits non réservables (fermées ou sans ligne) d'une chambre pendant le séjour"""
+        mask = self.stay_mask(check_in, check_out)
+        if mask is None:
+            raise ValueError('Séjour hors de l\'horizon de l\'index')
+
+        entry = self.rooms.get(room_id)
+        blocked = mask & ~entry.open_bits if entry is not None else mask
+        dates = []
+        while blocked:
+            low_bit = blocked & -blocked
+            dates.append(self.start_date + timedelta(days=low_bit.bit_length() - 1))
+            blocked ^= low_bit
+        return dates
+
+    # ------------------------------------------------------------------
+    # Diagnostic
+    # ------------------------------------------------------------------
+
+    def memory_footprint(self):
+        """Estimation de la mémoire occupée par l'index (en octets)"""
+        bitmap_bytes = 0
+        entry_bytes = 0
+        for entry in self.rooms.values():
+            bitmap_bytes += sys.getsizeof(entry.open_bits) + sys.getsizeof(entry.blocked_bits)
+            entry_bytes += sys.getsizeof(entry)
+        buckets_bytes = sys.getsizeof(self.property_rooms) + sum(
+            sys.getsizeof(room_ids) for room_ids in self.property_rooms.values()
+        )
+        total = bitmap_bytes + entry_bytes + sys.getsizeof(self.rooms) + buckets_bytes
+        return {
+            'rooms': len(self.rooms),
+            'properties': len(self.property_rooms),
+            'horizon_days': self.horizon_days,
+            'start_date': str(self.start_date) if self.start_date else None,
+            'bitmap_bytes': bitmap_bytes,
+            'total_bytes': total,
+            'bytes_per_room': round(total / len(self.rooms), 1) if self.rooms else 0,
+            'build_seconds': round(self.build_seconds, 3) if self.build_seconds is not None else None,
+        }
+
+    def check_consistency(self, max_mismatches=100):
+        """
+        Comparer l'index avec la base de données.
+
+        Retourne les chambres manquantes, en trop ou dont les bitmaps ou
+        métadonnées diffèrent d'un index reconstruit à l'instant.
+        """
+        reference = RoomAvailabilityIndex(self.horizon_days)
+        reference.rebuild()
+        if reference.start_date != self.start_date:
+            self._roll(reference.start_date)
+
+        missing = [room_id for room_id in reference.rooms if room_id not in self.rooms]
+        extra = [room_id for room_id in self.rooms if room_id not in reference.rooms]
+        mismatched = [
+            room_id for room_id, entry in reference.rooms.items()
+            if room_id in self.rooms and self.rooms[room_id].as_tuple() != entry.as_tuple()
+        ]
+        return {
+            'consistent': not (missing or extra or mismatched),
+            'rooms_checked': len(reference.rooms),
+            'missing': [str(room_id) for room_id in missing[:max_mismatches]],
+            'extra': [str(room_id) for room_id in extra[:max_mismatches]],
+            'mismatched': [str(room_id) for room_id in mismatched[:max_mismatches]],
+        }
+
+
+availability_index = RoomAvailabilityIndex()
+
+
+def get_availability_index():
+    """Index du processus, ou None si désactivé par AVAILABILITY_INDEX_ENABLED"""
+    if not getattr(settings, 'AVAILABILITY_INDEX_ENABLED', False):
+        return None
+    return availability_index.ensure_fresh()
+
+
+def to_room_key(room_id):
+    """Clé utilisée par l'index pour un identifiant de chambre"""
+    return room_id if isinstance(room_id, uuid.UUID) else uuid.UUID(str(room_id))
@@ -0,0 +1,76 @@
+"""
+Matrice chambres × dates du calendrier d'une propriété (extranet).
+
+Une ligne par chambre, une colonne par date : deux tableaux compacts par
+chambre (disponibilité et prix) au lieu d'un objet par nuit. Les nuits sont
+lues en une seule requête triée par (room_id, date), parcourue par lots, et
+le JSON est produit chambre par chambre pour être envoyé en flux
+(StreamingHttpResponse).
+"""
+import json
+from datetime import timedelta
+
+from .models import RoomAvailability
+from .availability_ranges import ranges_enabled, overlapping_ranges, iter_nights
+
+
+CHUNK_SIZE = 2000
+
+
+def ordered_calendar_rows(room_ids, date_from, date_to):
+    """
+    Nuits enregistrées de [date_from, date_to) triées par (room_id, date) :
+    tuples (room_id, date, available, price), quel que soit le stockage.
+    """
+    if ranges_enabled():
+        ranges = overlapping_ranges(room_ids, date_from, date_to).order_by('room_id', 'start_date')
+        for availability_range, night in iter_nights(ranges.iterator(chunk_size=CHUNK_SIZE), date_from, date_to):
+            yield availability_range.room_id, night, availability_range.available, availability_range.price
+        return
+    yield from RoomAvailability.objects.filter(
+        room_id__in=room_ids,
+        date__gte=date_from,
+        date__lt=date_to
+    ).order_by('room_id', 'date').values_list(
+        'room_id', 'date', 'available', 'price'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def iter_matrix_json(property_id, rooms, date_from, date_to):
+    """
+    Morceaux du document JSON de la matrice des nuits [date_from, date_to).
+
+    `rooms` : tuples (id, name, room_type_id) triés par id. Pour chaque
+    chambre, `available[i]` vaut 1, 0 ou null (nuit sans ligne, donc
+    non réservable) et `prices[i]` le prix de la nuit `dates[i]` ou null.
+    """
+    days = (date_to - date_from).days
+    dates = [str(date_from + timedelta(days=offset)) for offset in range(days)]
+    yield json.dumps({
+        'property_id': str(property_id),
+        'date_from': str(date_from),
+        'date_to': str(date_to - timedelta(days=1)),
+        'dates': dates,
+    })[:-1] + ', "rooms": ['
+
+    rows = ordered_calendar_rows([room_id for room_id, _, _ in rooms], date_from, date_to)
+    pending = next(rows, None)
+    for position, (room_id, name, room_type_id) in enumerate(rooms):
+        available = [None] * days
+        prices = [None] * days
+        # Les nuits arrivent dans l'ordre des chambres : on consomme celles
+        # de la chambre courante
+        while pending is not None and pending[0] == room_id:
+            _, night, is_available, price = pending
+            column = (night - date_from).days
+            available[column] = 1 if is_available else 0
+            prices[column] = float(price) if price is not None else None
+            pending = next(rows, None)
+        yield (', ' if position else '') + json.dumps({
+            'room_id': str(room_id),
+            'room_name': name,
+            'room_type_id': str(room_type_id) if room_type_id else None,
+            'available': available,
+            'prices': prices,
+        })
+    yield ']}'
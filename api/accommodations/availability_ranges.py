@@ -0,0 +1,204 @@
+"""
+Stockage des disponibilités par plages (RoomAvailabilityRange).
+
+Avec ROOM_AVAILABILITY_STORAGE = 'ranges', le calendrier d'une chambre est un
+ensemble de plages [start_date, end_date) qui ne se chevauchent pas, chacune
+avec une disponibilité et un prix. Une écriture découpe les plages qu'elle
+recouvre et fusionne le résultat avec ses voisines identiques ; une lecture
+développe les plages en nuits.
+
+Les écritures de ce module ne déclenchent pas de signaux (bulk_create) :
+l'appelant doit appeler calendar_bulk.calendar_changed().
+"""
+import uuid
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import RoomAvailability, RoomAvailabilityRange
+
+
+def ranges_enabled():
+    """Le calendrier est-il stocké par plages plutôt que par nuit ?"""
+    return getattr(settings, 'ROOM_AVAILABILITY_STORAGE', 'daily') == 'ranges'
+
+
+def overlapping_ranges(room_ids, date_from, date_to):
+    """Plages des chambres qui recouvrent au moins une nuit de [date_from, date_to)"""
+    return RoomAvailabilityRange.objects.filter(
+        room_id__in=room_ids,
+        start_date__lt=date_to,
+        end_date__gt=date_from
+    )
+
+
+def iter_nights(ranges, date_from, date_to):
+    """Développer des plages en (plage, nuit) pour les nuits de [date_from, date_to)"""
+    for availability_range in ranges:
+        night = max(availability_range.start_date, date_from)
+        end = min(availability_range.end_date, date_to)
+        while night < end:
+            yield availability_range, night
+            night += timedelta(days=1)
+
+
+def as_daily_rows(ranges, date_from, date_to):
+    """
+    Nuits de [date_from, date_to) sous forme de RoomAvailability non enregistrés.
+
+    Chaque nuit reprend les horodatages de sa plage et a pour identifiant
+    uuid5(id de la plage, date) : un UUID stable et unique par nuit, si bien
+    que RoomAvailabilitySerializer produit la même sortie que pour le
+    stockage par nuit. Ces objets ne doivent pas être enregistrés.
+    """
+    return [
+        RoomAvailability(
+            id=uuid.uuid5(availability_range.id, night.isoformat()),
+            room=availability_range.room,
+            date=night,
+            available=availability_range.available,
+            price=availability_range.price,
+            created_at=availability_range.created_at,
+            updated_at=availability_range.updated_at
+        )
+        for availability_range, night in iter_nights(ranges, date_from, date_to)
+    ]
+
+
+def daily_rows_for_rooms(rooms, date_from=None, date_to=None):
+    """
+    Nuits de plusieurs chambres : {room_id: [RoomAvailability non enregistrés]}.
+
+    `date_from` et `date_to` sont des chaînes YYYY-MM-DD incluses et
+    optionnelles ; lève ValueError si l'une est invalide.
+    """
+    try:
+        start = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else date.min
+        end = datetime.strptime(date_to, '%Y-%m-%d').date() + timedelta(days=1) if date_to else date.max
+    except ValueError:
+        raise ValueError('Format de date invalide. Utilisez YYYY-MM-DD')
+
+    room_ids = [room.id for room in rooms]
+    ranges = overlapping_ranges(room_ids, start, end).select_related(
+        'room', 'room__property'
+    ).order_by('start_date')
+    rows = {room_id: [] for room_id in room_ids}
+    for row in as_daily_rows(ranges, start, end):
+        rows[row.room_id].append(row)
+    return rows
+
+
+def count_nights(room_ids, date_from, date_to):
+    """Nombre de nuits de [date_from, date_to) couvertes par des plages"""
+    return sum(
+        (min(end, date_to) - max(start, date_from)).days
+        for start, end in overlapping_ranges(room_ids, date_from, date_to).values_list(
+            'start_date', 'end_date'
+        )
+    )
+
+
+def write_range(room_id, start_date, end_date, clear=False, **values):
+    """
+    Écrire `values` (available et/ou price) sur les nuits [start_date, end_date).
+
+    Les plages recouvertes sont découpées : les nuits hors de la période
+    gardent leurs valeurs, les nuits de la période prennent `values` (les
+    champs absents gardent la valeur existante, ou la valeur par défaut du
+    modèle pour une nuit sans plage). clear=True supprime les nuits de la
+    période. Les plages contiguës de mêmes valeurs sont ensuite fusionnées, y
+    compris avec les voisines qui touchent la période.
+
+    Retourne les plages enregistrées qui recouvrent la période.
+    """
+    with transaction.atomic():
+        existing = list(
+            RoomAvailabilityRange.objects.select_for_update().filter(
+                room_id=room_id,
+                start_date__lte=end_date,
+                end_date__gte=start_date
+            ).order_by('start_date')
+        )
+
+        default = (RoomAvailabilityRange._meta.get_field('available').get_default(), None)
+        pieces = []
+        cursor = start_date
+        for availability_range in existing:
+            current = (availability_range.available, availability_range.price)
+            first = max(availability_range.start_date, start_date)
+            last = min(availability_range.end_date, end_date)
+            if first >= last:
+                # Voisine qui touche la période : candidate à la fusion
+                pieces.append((availability_range.start_date, availability_range.end_date) + current)
+                continue
+
+            if availability_range.start_date < start_date:
+                pieces.append((availability_range.start_date, start_date) + current)
+            if not clear:
+                if cursor < first:
+                    pieces.append((cursor, first) + _merge_values(default, values))
+                pieces.append((first, last) + _merge_values(current, values))
+            cursor = last
+            if availability_range.end_date > end_date:
+                pieces.append((end_date, availability_range.end_date) + current)
+        if not clear and cursor < end_date:
+            pieces.append((cursor, end_date) + _merge_values(default, values))
+
+        merged = []
+        for piece in sorted(pieces, key=lambda piece: piece[0]):
+            if merged and merged[-1][1] == piece[0] and merged[-1][2:] == piece[2:]:
+                merged[-1] = (merged[-1][0], piece[1]) + piece[2:]
+            else:
+                merged.append(piece)
+
+        RoomAvailabilityRange.objects.filter(
+            id__in=[availability_range.id for availability_range in existing]
+        ).delete()
+        created = RoomAvailabilityRange.objects.bulk_create([
+            RoomAvailabilityRange(
+                room_id=room_id, start_date=start, end_date=end, available=available, price=price
+            )
+            for start, end, available, price in merged
+        ])
+    return [
+        availability_range for availability_range in created
+        if availability_range.start_date < end_date and availability_range.end_date > start_date
+    ]
+
+
+def _merge_values(current, values):
+    available, price = current
+    return (values.get('available', available), values.get('price', price))
+
+
+def compact_daily_rows(rows):
+    """
+    Regrouper des nuits en plages.
+
+    `rows` : tuples (room_id, date, available, price) triés par chambre puis
+    date. Produit des RoomAvailabilityRange non enregistrés ; une nuit
+    manquante ou un changement de valeur termine la plage courante.
+    """
+    current = None
+    for room_id, night, available, price in rows:
+        if (
+            current is not None
+            and current.room_id == room_id
+            and current.end_date == night
+            and current.available == available
+            and current.price == price
+        ):
+            current.end_date = night + timedelta(days=1)
+            continue
+        if current is not None:
+            yield current
+        current = RoomAvailabilityRange(
+            room_id=room_id,
+            start_date=night,
+            end_date=night + timedelta(days=1),
+            available=available,
+            price=price
+        )
+    if current is not None:
+        yield current
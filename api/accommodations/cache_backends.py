@@ -0,0 +1,36 @@
+"""
+Backend de cache local en mémoire à taille bornée et éviction LRU.
+
+LocMemCache supprime 1/CULL_FREQUENCY des entrées quand MAX_ENTRIES est
+atteint. Ce backend n'évince que l'entrée la moins récemment utilisée et
+compte les évictions, exposées par stats() avec le nombre d'entrées.
+"""
+from django.core.cache.backends.locmem import LocMemCache
+
+
+# Compteurs partagés par toutes les instances (une instance par thread)
+_evictions = {}
+
+
+class LRULocMemCache(LocMemCache):
+    """LocMemCache avec éviction LRU entrée par entrée et compteur d'évictions"""
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self._name = name
+        _evictions.setdefault(name, 0)
+
+    def _cull(self):
+        # Appelé sous self._lock par _set() quand le cache est plein
+        while self._cache and len(self._cache) >= self._max_entries:
+            key, _ = self._cache.popitem()
+            self._expire_info.pop(key, None)
+            _evictions[self._name] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._cache),
+                'max_entries': self._max_entries,
+                'evictions': _evictions[self._name],
+            }
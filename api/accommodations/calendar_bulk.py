@@ -0,0 +1,210 @@
+"""
+Écritures en masse du calendrier des chambres (RoomAvailability).
+
+Les plages de dates sont développées en nuits côté serveur puis écrites par
+lots avec un upsert sur la clé unique (room, date) ; avec le stockage par
+plages (ROOM_AVAILABILITY_STORAGE = 'ranges'), chaque plage est écrite telle
+quelle par availability_ranges.write_range. bulk_create ne déclenche
+pas les signaux post_save : calendar_changed() répercute les écritures sur
+l'index de disponibilités, la projection de recherche et le cache de
+recherche à la validation de la transaction, et sur le stock par type de
+chambre (inventory) dans la transaction.
+"""
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .models import Room, RoomAvailability
+from .availability_index import availability_index
+from .availability_ranges import ranges_enabled, count_nights, write_range
+from .search_projection import schedule_refresh
+from . import inventory, search_cache
+
+
+BATCH_SIZE = 2000
+INSERT_FIELDS = ['id', 'room', 'date', 'available', 'price', 'price_from_season', 'created_at', 'updated_at']
+
+
+def expand_range(date_from, date_to):
+    """Nuits de date_from à date_to, bornes incluses"""
+    return [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+
+
+def upsert_ranges(ranges, batch_size=BATCH_SIZE):
+    """
+    Appliquer des plages de calendrier dans une seule transaction.
+
+    `ranges` : dictionnaires validés par RoomAvailabilityRangeSerializer
+    (room_ids, date_from, date_to et available et/ou price). Seuls les champs
+    fournis sont modifiés sur les nuits existantes ; les nuits créées prennent
+    les valeurs par défaut du modèle pour les autres. Les plages sont
+    appliquées dans l'ordre : la dernière l'emporte en cas de chevauchement.
+
+    Retourne un dictionnaire par plage : nights, created, updated.
+    """
+    results = []
+    with transaction.atomic():
+        for data in ranges:
+            room_ids = data['room_ids']
+            nights = expand_range(data['date_from'], data['date_to'])
+            values = {
+                field: data[field] for field in ('available', 'price') if field in data
+            }
+
+            end_date = data['date_to'] + timedelta(days=1)
+            if ranges_enabled():
+                existing = count_nights(room_ids, data['date_from'], end_date)
+                for room_id in room_ids:
+                    write_range(room_id, data['date_from'], end_date, **values)
+            else:
+                existing = RoomAvailability.objects.filter(
+                    room_id__in=room_ids,
+                    date__gte=data['date_from'],
+                    date__lte=data['date_to']
+                ).count()
+                _upsert_nights(room_ids, nights, values, batch_size)
+
+            total = len(room_ids) * len(nights)
+            results.append({
+                'room_ids': [str(room_id) for room_id in room_ids],
+                'date_from': str(data['date_from']),
+                'date_to': str(data['date_to']),
+                'nights': total,
+                'created': total - existing,
+                'updated': existing,
+            })
+            calendar_changed(room_ids, data['date_from'], end_date)
+    return results
+
+
+def _upsert_nights(room_ids, nights, values, batch_size):
+    """
+    INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE multi-lignes.
+
+    bulk_create(update_conflicts=True) produit le même SQL mais prépare chaque
+    champ de chaque ligne à travers l'ORM (près de 90 % du temps pour 100 000
+    nuits). Ici chaque valeur distincte (chambre, date, prix, horodatage) est
+    adaptée une seule fois pour le backend. Les champs absents de `values`
+    prennent la valeur par défaut du modèle à la création et ne sont pas
+    modifiés sur les nuits existantes.
+    """
+    opts = RoomAvailability._meta
+    connection = transaction.get_connection()
+    ops = connection.ops
+    fields = [opts.get_field(name) for name in INSERT_FIELDS]
+    update_columns = [opts.get_field(name).column for name in list(values) + ['updated_at']]
+
+    pk_field = opts.pk
+    available = opts.get_field('available').get_db_prep_save(
+        values.get('available', opts.get_field('available').get_default()), connection
+    )
+    price = opts.get_field('price').get_db_prep_save(values.get('price'), connection)
+    # Un prix écrit ici remplace le prix de saison éventuel (season_prices)
+    if 'price' in values:
+        update_columns.append(opts.get_field('price_from_season').column)
+    now = opts.get_field('updated_at').get_db_prep_save(timezone.now(), connection)
+    room_keys = [pk_field.get_db_prep_save(room_id, connection) for room_id in room_ids]
+    date_keys = [ops.adapt_datefield_value(night) for night in nights]
+
+    native_uuid = connection.features.has_native_uuid_field
+    rows = [
+        (uuid.uuid4() if native_uuid else uuid.uuid4().hex, room_key, date_key,
+         available, price, False, now, now)
+        for room_key in room_keys
+        for date_key in date_keys
+    ]
+
+    _execute_upsert(connection, fields, update_columns, rows, batch_size)
+
+
+def upsert_night_prices(nights, batch_size=BATCH_SIZE):
+    """
+    Écrire le prix de nuits précises, par le même INSERT multi-lignes que
+    _upsert_nights.
+
+    `nights` : tuples (room_id, date, price, price_from_season). Seuls price,
+    price_from_season et updated_at sont modifiés sur les nuits existantes ;
+    les nuits créées sont disponibles (valeur par défaut du modèle). Chaque
+    chambre, date et prix distinct n'est adapté qu'une fois.
+    """
+    opts = RoomAvailability._meta
+    connection = transaction.get_connection()
+    ops = connection.ops
+    fields = [opts.get_field(name) for name in INSERT_FIELDS]
+    update_columns = [opts.get_field(name).column for name in ('price', 'price_from_season', 'updated_at')]
+
+    available = opts.get_field('available').get_db_prep_save(
+        opts.get_field('available').get_default(), connection
+    )
+    now = opts.get_field('updated_at').get_db_prep_save(timezone.now(), connection)
+    native_uuid = connection.features.has_native_uuid_field
+    room_keys = {}
+    date_keys = {}
+    price_keys = {}
+    rows = []
+    for room_id, night, price, from_season in nights:
+        if room_id not in room_keys:
+            room_keys[room_id] = opts.pk.get_db_prep_save(room_id, connection)
+        if night not in date_keys:
+            date_keys[night] = ops.adapt_datefield_value(night)
+        if price not in price_keys:
+            price_keys[price] = opts.get_field('price').get_db_prep_save(price, connection)
+        rows.append((
+            uuid.uuid4() if native_uuid else uuid.uuid4().hex, room_keys[room_id], date_keys[night],
+            available, price_keys[price], from_season, now, now
+        ))
+    _execute_upsert(connection, fields, update_columns, rows, batch_size)
+
+
+def _execute_upsert(connection, fields, update_columns, rows, batch_size):
+    """INSERT ... ON CONFLICT (room, date) de `rows` (valeurs déjà adaptées), par lots"""
+    ops = connection.ops
+    batch_size = min(batch_size, ops.bulk_batch_size(fields, rows) or batch_size)
+    placeholder = '(%s)' % ', '.join(['%s'] * len(fields))
+    sql_prefix = 'INSERT INTO %s (%s) VALUES ' % (
+        ops.quote_name(RoomAvailability._meta.db_table),
+        ', '.join(ops.quote_name(field.column) for field in fields)
+    )
+    suffix = ops.on_conflict_suffix_sql(
+        fields, OnConflict.UPDATE, update_columns, ['room_id', 'date']
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                sql_prefix + ', '.join([placeholder] * len(batch)) + ' ' + suffix,
+                [value for row in batch for value in row]
+            )
+
+
+def calendar_changed(room_ids, date_from, date_to):
+    """
+    Signaler une écriture en masse sur les nuits [date_from, date_to) de `room_ids`.
+
+    À appeler après toute écriture qui contourne les signaux (bulk_create,
+    update(), SQL brut). L'index de disponibilités relit ces nuits et les
+    recherches des villes concernées sont invalidées, une fois la transaction
+    validée. Les prix d'appel des propriétés concernées sont recalculés
+    (search_projection), ainsi que leur stock par type de chambre
+    (inventory).
+    """
+    room_ids = list(room_ids)
+
+    def refresh_index():
+        if availability_index.built_at is not None:
+            availability_index.reload_nights(room_ids, date_from, date_to)
+
+    transaction.on_commit(refresh_index)
+
+    rooms = list(Room.objects.filter(id__in=room_ids).values_list(
+        'property_id', 'property__address__city'
+    ))
+    schedule_refresh({property_id for property_id, _ in rooms})
+    inventory.schedule_refresh(room_ids, date_from, date_to)
+    cities = {city for _, city in rooms}
+    nights = expand_range(date_from, date_to - timedelta(days=1))
+    for city in cities:
+        search_cache.invalidate(city, nights)
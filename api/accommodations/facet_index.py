@@ -0,0 +1,258 @@
+"""
+Index en mémoire des facettes de la recherche de propriétés.
+
+Pour chaque propriété, l'index garde le code de son type, de sa catégorie et
+de sa ville, sa note, et ses équipements (codes triés par propriété avec un
+tableau d'offsets, comme une matrice creuse CSR) dans des tableaux NumPy. Les compteurs de facettes d'une
+recherche sont calculés sur la liste d'identifiants déjà filtrée (celle du
+cache de recherche) par des np.bincount, sans requête SQL, puis gardés pour
+les pages suivantes de la même recherche (clé du cache de recherche).
+
+L'index est propre au processus. Il est marqué périmé par les signaux des
+modèles lus (voir signals.py), reconstruit à la demande suivante, et
+reconstruit après PROPERTY_FACET_INDEX_MAX_AGE secondes pour rattraper les
+écritures des autres processus.
+"""
+import threading
+import time
+from itertools import repeat
+
+import numpy as np
+from django.conf import settings
+
+from .models import (
+    PropertyType, PropertyCategory, PropertyAmenity, Property, PropertyAmenityLink
+)
+
+
+FACET_LIMIT = 50
+MEMO_SIZE = 256
+RATING_THRESHOLDS = [4.5, 4, 3, 2, 1]
+
+
+class FacetSnapshot:
+    """Contenu de l'index à un instant donné (jamais modifié après construction)"""
+    __slots__ = (
+        'positions', 'ratings',
+        'type_codes', 'type_labels',
+        'category_codes', 'category_labels',
+        'city_codes', 'city_labels',
+        'amenity_offsets', 'amenity_codes', 'amenity_totals', 'amenity_labels',
+        'memo', 'memo_lock',
+    )
+
+    def __init__(self, **values):
+        for name, value in values.items():
+            setattr(self, name, value)
+        # Compteurs déjà calculés, par clé de recherche (vidés à la reconstruction)
+        self.memo = {}
+        self.memo_lock = threading.Lock()
+
+
+def _encode(values, labels_by_key=None):
+    """
+    Codes entiers (-1 pour None) d'une colonne de valeurs.
+
+    Retourne (codes, clés) ; les clés sont celles de `labels_by_key` si fourni
+    (identifiants connus), sinon les valeurs distinctes rencontrées.
+    """
+    if labels_by_key is not None:
+        keys = list(labels_by_key)
+        lookup = {key: code for code, key in enumerate(keys)}
+    else:
+        keys = []
+        lookup = {}
+    codes = np.full(len(values), -1, dtype=np.int32)
+    for row, value in enumerate(values):
+        if value is None:
+            continue
+        code = lookup.get(value)
+        if code is None:
+            if labels_by_key is not None:
+                continue
+            code = lookup[value] = len(keys)
+            keys.append(value)
+        codes[row] = code
+    return codes, keys
+
+
+class PropertyFacetIndex:
+    """Type, catégorie, ville, note et équipements de chaque propriété"""
+
+    def __init__(self):
+        self.snapshot = None
+        self.built_at = None
+        self.build_seconds = None
+        self.dirty = True
+        self._lock = threading.Lock()
+
+    def rebuild(self):
+        """Reconstruire l'index depuis la base (cinq requêtes)"""
+        # Une écriture pendant la lecture remettra dirty à True
+        self.dirty = False
+        started = time.perf_counter()
+
+        types = dict(PropertyType.objects.order_by().values_list('id', 'name'))
+        categories = dict(PropertyCategory.objects.order_by().values_list('id', 'name'))
+        amenities = dict(PropertyAmenity.objects.order_by().values_list('id', 'name'))
+
+        rows = list(Property.objects.order_by().values_list(
+            'id', 'property_type_id', 'property_category_id', 'rating', 'address__city'
+        ).iterator(chunk_size=10000))
+        positions = {str(row[0]): position for position, row in enumerate(rows)}
+        type_codes, type_keys = _encode([row[1] for row in rows], types)
+        category_codes, category_keys = _encode([row[2] for row in rows], categories)
+        city_codes, city_keys = _encode([row[4] for row in rows])
+        ratings = np.array([float(row[3] or 0) for row in rows], dtype=np.float64)
+
+        amenity_keys = list(amenities)
+        amenity_lookup = {key: code for code, key in enumerate(amenity_keys)}
+        amenity_rows = []
+        amenity_codes = []
+        for property_id, amenity_id in PropertyAmenityLink.objects.order_by().values_list(
+            'property_id', 'amenity_id'
+        ).iterator(chunk_size=10000):
+            row = positions.get(str(property_id))
+            code = amenity_lookup.get(amenity_id)
+            if row is not None and code is not None:
+                amenity_rows.append(row)
+                amenity_codes.append(code)
+        amenity_rows = np.array(amenity_rows, dtype=np.int64)
+        amenity_codes = np.array(amenity_codes, dtype=np.int32)[np.argsort(amenity_rows, kind='stable')]
+        amenity_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(amenity_rows, minlength=len(rows)), out=amenity_offsets[1:])
+
+        self.snapshot = FacetSnapshot(
+            positions=positions,
+            ratings=ratings,
+            type_codes=type_codes,
+            type_labels=[(str(key), types[key]) for key in type_keys],
+            category_codes=category_codes,
+            category_labels=[(str(key), categories[key]) for key in category_keys],
+            city_codes=city_codes,
+            city_labels=city_keys,
+            amenity_offsets=amenity_offsets,
+            amenity_codes=amenity_codes,
+            amenity_totals=np.bincount(amenity_codes, minlength=len(amenity_keys)),
+            amenity_labels=[(str(key), amenities[key]) for key in amenity_keys],
+        )
+        self.built_at = time.monotonic()
+        self.build_seconds = time.perf_counter() - started
+        return self
+
+    def ensure_fresh(self):
+        max_age = getattr(settings, 'PROPERTY_FACET_INDEX_MAX_AGE', 300)
+        if self.dirty or self.built_at is None or time.monotonic() - self.built_at > max_age:
+            with self._lock:
+                if self.dirty or self.built_at is None or time.monotonic() - self.built_at > max_age:
+                    self.rebuild()
+        return self
+
+    def counts(self, property_ids, key=None, limit=FACET_LIMIT):
+        """
+        Compteurs des facettes pour une liste d'identifiants de propriétés
+        (chaînes, comme dans le cache de recherche).
+
+        Chaque facette est triée par nombre décroissant et limitée à `limit`
+        valeurs ; rating donne le nombre de propriétés au-dessus de chaque
+        seuil (valeurs de min_rating). `key` : clé du cache de recherche, sous
+        laquelle le résultat est gardé tant que l'index n'est pas reconstruit.
+        """
+        snapshot = self.snapshot
+        if key is not None:
+            facets = snapshot.memo.get((key, limit))
+            if facets is not None:
+                return facets
+
+        facets = self._count(snapshot, property_ids, limit)
+        if key is not None:
+            with snapshot.memo_lock:
+                if len(snapshot.memo) >= MEMO_SIZE:
+                    snapshot.memo.pop(next(iter(snapshot.memo)))
+                snapshot.memo[(key, limit)] = facets
+        return facets
+
+    @staticmethod
+    def _count(snapshot, property_ids, limit):
+        # map() + dict.get : la correspondance identifiant -> ligne reste en C
+        rows = np.fromiter(
+            map(snapshot.positions.get, property_ids, repeat(-1)),
+            dtype=np.int64,
+            count=len(property_ids)
+        )
+        selected = np.zeros(len(snapshot.ratings), dtype=bool)
+        selected[rows[rows >= 0]] = True
+        # Lignes triées et sans doublon
+        rows = np.flatnonzero(selected)
+
+        ratings = snapshot.ratings[rows]
+        return {
+            'total': int(len(rows)),
+            'property_types': _id_facet(
+                _bincount(snapshot.type_codes[rows], len(snapshot.type_labels)),
+                snapshot.type_labels, limit
+            ),
+            'property_categories': _id_facet(
+                _bincount(snapshot.category_codes[rows], len(snapshot.category_labels)),
+                snapshot.category_labels, limit
+            ),
+            'amenities': _id_facet(_amenity_counts(snapshot, rows, selected), snapshot.amenity_labels, limit),
+            'cities': [
+                {'city': snapshot.city_labels[code], 'count': count}
+                for code, count in _top(
+                    _bincount(snapshot.city_codes[rows], len(snapshot.city_labels)), limit
+                )
+            ],
+            'rating': [
+                {'min_rating': threshold, 'count': int(np.count_nonzero(ratings >= threshold))}
+                for threshold in RATING_THRESHOLDS
+            ],
+        }
+
+
+def _amenity_counts(snapshot, rows, selected):
+    """
+    Nombre de propriétés retenues par équipement.
+
+    Au-delà de la moitié du catalogue, on compte les propriétés écartées et
+    on retranche du total : le coût reste proportionnel à la plus petite part.
+    """
+    if len(rows) * 2 > len(selected):
+        return snapshot.amenity_totals - _link_counts(snapshot, np.flatnonzero(~selected))
+    return _link_counts(snapshot, rows)
+
+
+def _link_counts(snapshot, rows):
+    """bincount des équipements des lignes `rows` (parcours des segments CSR)"""
+    starts = snapshot.amenity_offsets[rows]
+    lengths = snapshot.amenity_offsets[rows + 1] - starts
+    total = int(lengths.sum())
+    # Indices des liens de chaque segment, mis bout à bout sans boucle Python
+    shifts = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    links = np.arange(total, dtype=np.int64) + shifts
+    return np.bincount(snapshot.amenity_codes[links], minlength=len(snapshot.amenity_labels))
+
+
+def _bincount(codes, size):
+    return np.bincount(codes[codes >= 0], minlength=size)
+
+
+def _top(counts, limit):
+    """(code, nombre) des valeurs présentes, par nombre décroissant puis code"""
+    codes = np.flatnonzero(counts)
+    order = np.lexsort((codes, -counts[codes]))[:limit]
+    return [(int(codes[i]), int(counts[codes[i]])) for i in order]
+
+
+def _id_facet(counts, labels, limit):
+    return [
+        {'id': labels[code][0], 'name': labels[code][1], 'count': count}
+        for code, count in _top(counts, limit)
+    ]
+
+
+property_facet_index = PropertyFacetIndex()
+
+
+def get_property_facet_index():
+    return property_facet_index.ensure_fresh()
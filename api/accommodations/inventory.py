@@ -0,0 +1,304 @@
+"""
+Stock par type de chambre (RoomTypeInventory) : « plus que N chambres ».
+
+Une ligne par (propriété, type de chambre, nuit) sur les
+ROOM_INVENTORY_HORIZON_DAYS prochains jours : chambres en service du type
+(rooms_total), chambres libres (rooms_available : ouvertes dans le
+calendrier — une nuit sans ligne ne l'est pas — et non réservées par une
+réservation non annulée) et prix de nuit le
+plus bas des chambres libres (min_price, même règle que pricing.py : prix de
+la nuit, sinon saison). Les chambres sans type n'ont pas de stock.
+
+Maintenance :
+- les réservations recalculent les (propriété, type) touchés dans leur
+  propre transaction (voir bookings/signals.py) ;
+- les écritures sur le calendrier, les saisons et les chambres (signals.py,
+  calendar_bulk.calendar_changed) appellent schedule_refresh(), qui
+  recalcule les nuits touchées en un seul passage à la validation de la
+  transaction : une écriture isolée ne paie ni le recalcul ni les verrous ;
+- un recalcul verrouille les lignes existantes avant de relire les chambres
+  et les réservations : deux recalculs simultanés ne s'écrasent donc pas ;
+- la commande refresh_room_inventory recalcule tout l'horizon : à lancer
+  une fois après la migration pour remplir le stock des propriétés
+  existantes, puis chaque nuit (glissement quotidien, écritures faites sans
+  signaux).
+"""
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+from django.utils import timezone
+
+from nomade_api.upsert import upsert_options
+
+from .availability import stay_nights
+from .models import Room, RoomTypeInventory
+from .pricing import price_matrix
+
+
+BATCH_SIZE = 200
+UPDATE_FIELDS = ['rooms_total', 'rooms_available', 'min_price', 'updated_at']
+
+
+def inventory_horizon(today=None):
+    """Nuits couvertes par le stock : [aujourd'hui, aujourd'hui + horizon)"""
+    today = today or timezone.localdate()
+    return today, today + timedelta(days=getattr(settings, 'ROOM_INVENTORY_HORIZON_DAYS', 365))
+
+
+def _clip(date_from, date_to, today=None):
+    """[date_from, date_to) ramené dans l'horizon ; (None, None) si vide"""
+    start, end = inventory_horizon(today)
+    date_from = max(date_from or start, start)
+    date_to = min(date_to or end, end)
+    if date_from >= date_to:
+        return None, None
+    return date_from, date_to
+
+
+# ============================================================================
+# CALCUL
+# ============================================================================
+
+def _booked_matrix(room_ids, date_from, date_to):
+    """Nuits réservées (réservations non annulées), chambres × nuits"""
+    from bookings.models import BookingRoom, BookingStatus
+
+    room_index = {room_id: i for i, room_id in enumerate(room_ids)}
+    booked = np.zeros((len(room_ids), (date_to - date_from).days), dtype=bool)
+    for room_id, check_in, check_out in BookingRoom.objects.filter(
+        room_id__in=room_ids, check_in__lt=date_to, check_out__gt=date_from
+    ).exclude(
+        booking_item__booking__status__name__in=BookingStatus.CANCELLED_NAMES
+    ).order_by().values_list('room_id', 'check_in', 'check_out'):
+        first = max((check_in - date_from).days, 0)
+        last = min((check_out - date_from).days, booked.shape[1])
+        booked[room_index[room_id], first:last] = True
+    return booked
+
+
+def build_inventory(pairs, date_from, date_to):
+    """
+    Lignes RoomTypeInventory (non enregistrées) des couples
+    (property_id, room_type_id) sur [date_from, date_to).
+
+    Retourne (lignes, couples sans chambre en service).
+    """
+    pairs = set(pairs)
+    rooms = {}
+    for room_id, property_id, room_type_id in Room.objects.filter(
+        property_id__in={property_id for property_id, _ in pairs},
+        room_type_id__in={room_type_id for _, room_type_id in pairs},
+        status='available'
+    ).order_by('id').values_list('id', 'property_id', 'room_type_id'):
+        if (property_id, room_type_id) in pairs:
+            rooms.setdefault((property_id, room_type_id), []).append(room_id)
+
+    room_ids = [room_id for members in rooms.values() for room_id in members]
+    nights = stay_nights(date_from, date_to)
+    nightly, seasonal, blocked, _ = price_matrix(room_ids, date_from, date_to)
+    prices = np.where(np.isnan(nightly), seasonal, nightly)
+    free = ~blocked & ~_booked_matrix(room_ids, date_from, date_to)
+    free_prices = np.where(free, prices, np.nan)
+
+    rows = []
+    start = 0
+    for (property_id, room_type_id), members in rooms.items():
+        block = slice(start, start + len(members))
+        start += len(members)
+        available = free[block].sum(axis=0)
+        lowest = np.where(np.isnan(free_prices[block]), np.inf, free_prices[block]).min(axis=0)
+        priced = np.isfinite(lowest)
+        for col, night in enumerate(nights):
+            rows.append(RoomTypeInventory(
+                property_id=property_id,
+                room_type_id=room_type_id,
+                date=night,
+                rooms_total=len(members),
+                rooms_available=int(available[col]),
+                min_price=round(float(lowest[col]), 2) if priced[col] else None,
+            ))
+    return rows, pairs - set(rooms)
+
+
+def refresh_pairs(pairs, date_from=None, date_to=None, today=None):
+    """
+    Recalculer le stock des couples (property_id, room_type_id) sur
+    [date_from, date_to), ramené dans l'horizon (par défaut : tout l'horizon).
+
+    Les lignes existantes sont verrouillées (select_for_update) avant la
+    relecture des chambres et des réservations. Les couples qui n'ont plus de
+    chambre en service perdent leurs lignes. Retourne le nombre de lignes
+    écrites.
+    """
+    pairs = {(property_id, room_type_id) for property_id, room_type_id in pairs if room_type_id is not None}
+    date_from, date_to = _clip(date_from, date_to, today)
+    if not pairs or date_from is None:
+        return 0
+
+    with transaction.atomic():
+        existing = RoomTypeInventory.objects.filter(
+            property_id__in={property_id for property_id, _ in pairs},
+            room_type_id__in={room_type_id for _, room_type_id in pairs},
+            date__gte=date_from, date__lt=date_to
+        )
+        list(existing.select_for_update().order_by('id').values_list('id', flat=True))
+
+        rows, emptied = build_inventory(pairs, date_from, date_to)
+        for property_id, room_type_id in emptied:
+            existing.filter(property_id=property_id, room_type_id=room_type_id).delete()
+        RoomTypeInventory.objects.bulk_create(
+            rows,
+            batch_size=2000,
+            **upsert_options(RoomTypeInventory, ['property', 'room_type', 'date'], UPDATE_FIELDS)
+        )
+    return len(rows)
+
+
+def refresh_rooms(room_ids, date_from=None, date_to=None, today=None):
+    """Recalculer le stock des types des chambres `room_ids` (voir refresh_pairs)"""
+    pairs = Room.objects.filter(
+        id__in=list(room_ids), room_type__isnull=False
+    ).order_by().values_list('property_id', 'room_type_id').distinct()
+    return refresh_pairs(list(pairs), date_from, date_to, today)
+
+
+def refresh_properties(property_ids, today=None):
+    """
+    Recalculer tout l'horizon de ces propriétés, y compris les types qui
+    n'ont plus de chambre en service.
+    """
+    property_ids = list(property_ids)
+    pairs = set(Room.objects.filter(
+        property_id__in=property_ids, room_type__isnull=False
+    ).order_by().values_list('property_id', 'room_type_id').distinct())
+    pairs |= set(RoomTypeInventory.objects.filter(
+        property_id__in=property_ids
+    ).order_by().values_list('property_id', 'room_type_id').distinct())
+    written = refresh_pairs(pairs, today=today)
+    # Nuits sorties de l'horizon
+    start, _ = inventory_horizon(today)
+    RoomTypeInventory.objects.filter(property_id__in=property_ids, date__lt=start).delete()
+    return written
+
+
+def refresh_all(batch_size=BATCH_SIZE, today=None, progress=None):
+    """
+    Recalculer le stock de toutes les propriétés ayant des chambres typées,
+    par lots de `batch_size` propriétés. `progress(done, total)` est appelé
+    après chaque lot. Retourne properties, rows et seconds.
+    """
+    started = time.perf_counter()
+    property_ids = sorted(set(Room.objects.filter(
+        room_type__isnull=False
+    ).order_by().values_list('property_id', flat=True)) | set(RoomTypeInventory.objects.order_by().values_list(
+        'property_id', flat=True
+    )))
+    written = 0
+    for start in range(0, len(property_ids), batch_size):
+        written += refresh_properties(property_ids[start:start + batch_size], today)
+        if progress is not None:
+            progress(min(start + batch_size, len(property_ids)), len(property_ids))
+    return {
+        'properties': len(property_ids),
+        'rows': written,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+# ============================================================================
+# RECALCUL À LA VALIDATION DES TRANSACTIONS
+# ============================================================================
+
+_pending = threading.local()
+
+
+def schedule_refresh(room_ids=(), date_from=None, date_to=None, pairs=()):
+    """
+    Recalculer, à la validation de la transaction en cours, le stock des
+    types des chambres `room_ids` sur [date_from, date_to) (par défaut tout
+    l'horizon) et tout l'horizon des couples (property_id, room_type_id)
+    `pairs` (chambre supprimée ou changée de type).
+
+    Les écritures d'une même transaction sont recalculées ensemble, par un
+    seul rappel on_commit : pour chaque chambre, sur l'enveloppe de ses
+    nuits touchées.
+    """
+    date_from, date_to = _clip(date_from, date_to)
+    pending = getattr(_pending, 'changes', None)
+    # Rappel déjà enregistré pour cette transaction ? (une transaction
+    # annulée retire ses rappels : on en enregistre alors un nouveau)
+    connection = transaction.get_connection()
+    queued = (
+        pending is not None
+        and connection.in_atomic_block
+        and any(entry[1] is _flush for entry in connection.run_on_commit)
+    )
+    if pending is None:
+        pending = _pending.changes = {'rooms': {}, 'pairs': set()}
+    if date_from is not None:
+        for room_id in room_ids:
+            current = pending['rooms'].get(room_id, (date_from, date_to))
+            pending['rooms'][room_id] = (min(current[0], date_from), max(current[1], date_to))
+    pending['pairs'].update(pair for pair in pairs if pair[1] is not None)
+    if not queued:
+        transaction.on_commit(_flush)
+
+
+def _flush():
+    pending = getattr(_pending, 'changes', None)
+    _pending.changes = None
+    if not pending:
+        return
+    if pending['pairs']:
+        refresh_pairs(pending['pairs'])
+    ranges = {}
+    for room_id, stay in pending['rooms'].items():
+        ranges.setdefault(stay, []).append(room_id)
+    for (date_from, date_to), room_ids in ranges.items():
+        refresh_rooms(room_ids, date_from, date_to)
+
+
+# ============================================================================
+# LECTURE
+# ============================================================================
+
+def rooms_left_by_type(property_id, check_in, check_out):
+    """
+    {room_type_id: chambres libres toutes les nuits du séjour} d'une
+    propriété (minimum par nuit, en une requête). Un type sans ligne pour
+    chaque nuit (hors horizon) est absent.
+    """
+    nights = (check_out - check_in).days
+    return {
+        room_type_id: rooms_left
+        for room_type_id, rooms_left, covered in RoomTypeInventory.objects.filter(
+            property_id=property_id, date__gte=check_in, date__lt=check_out
+        ).order_by().values('room_type_id').annotate(
+            rooms_left=Min('rooms_available'), covered=Count('date')
+        ).values_list('room_type_id', 'rooms_left', 'covered')
+        if covered == nights
+    }
+
+
+def rooms_left_by_property(property_ids, check_in, check_out):
+    """
+    {property_id: chambres libres} : pour chaque nuit, somme des types ; le
+    minimum sur les nuits du séjour. Une propriété sans ligne pour chaque
+    nuit est absente.
+    """
+    nights = (check_out - check_in).days
+    totals = {}
+    counts = {}
+    for property_id, night, available in RoomTypeInventory.objects.filter(
+        property_id__in=list(property_ids), date__gte=check_in, date__lt=check_out
+    ).order_by().values('property_id', 'date').annotate(
+        available=Sum('rooms_available')
+    ).values_list('property_id', 'date', 'available'):
+        totals[property_id] = min(totals.get(property_id, available), available)
+        counts[property_id] = counts.get(property_id, 0) + 1
+    return {property_id: total for property_id, total in totals.items() if counts[property_id] == nights}
@@ -0,0 +1,135 @@
+"""
+Benchmark des compteurs de facettes de PropertyViewSet.search.
+
+Crée un catalogue synthétique (villes préfixées « bench-facets- ») puis
+mesure PropertyFacetIndex.counts() sur trois jeux d'identifiants : tout le
+catalogue, une recherche par pays et une recherche par ville. Le coût mesuré
+est celui ajouté par facets=true à une recherche dont la liste
+d'identifiants est déjà connue (cache de recherche).
+
+À lancer uniquement sur une base de test :
+    python manage.py bench_property_facets --yes --properties 100000
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accommodations.facet_index import PropertyFacetIndex
+from accommodations.models import (
+    PropertyType, PropertyCategory, PropertyAddress, Property,
+    PropertyAmenity, PropertyAmenityLink
+)
+
+
+BENCH_PREFIX = 'bench-facets-'
+TARGET_MS = 30
+
+
+class Command(BaseCommand):
+    help = "Mesurer le coût des compteurs de facettes de la recherche de propriétés"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=100000,
+                            help='Nombre de propriétés du catalogue synthétique')
+        parser.add_argument('--cities', type=int, default=2000)
+        parser.add_argument('--amenities-per-property', type=int, default=8)
+        parser.add_argument('--repeat', type=int, default=50, help='Nombre de mesures par jeu')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Supprimer les données synthétiques à la fin')
+        parser.add_argument('--yes', action='store_true',
+                            help='Confirmer l\'écriture de données synthétiques dans la base')
+
+    def handle(self, *args, **options):
+        if not options['yes']:
+            raise CommandError(
+                'Ce benchmark écrit des centaines de milliers de lignes. Relancez avec --yes sur une base de test.'
+            )
+
+        self.random = random.Random(42)
+        self.batch_size = options['batch_size']
+        existing = Property.objects.filter(name__startswith=BENCH_PREFIX).count()
+        if existing < options['properties']:
+            self._create_catalog(
+                options['properties'] - existing, options['cities'], options['amenities_per_property']
+            )
+
+        index = PropertyFacetIndex().rebuild()
+        self.stdout.write(f"Index construit en {index.build_seconds * 1000:.0f} ms")
+
+        catalog = list(Property.objects.filter(name__startswith=BENCH_PREFIX).values_list(
+            'id', 'address__country', 'address__city'
+        ))
+        country = catalog[0][1]
+        city = catalog[0][2]
+        datasets = [
+            ('catalogue', [str(row[0]) for row in catalog]),
+            ('pays', [str(row[0]) for row in catalog if row[1] == country]),
+            ('ville', [str(row[0]) for row in catalog if row[2] == city]),
+        ]
+
+        self.stdout.write(f"{'jeu':>10} {'propriétés':>11} {'médiane (ms)':>14} {'p95 (ms)':>10}")
+        slowest = 0
+        for label, property_ids in datasets:
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                index.counts(property_ids)
+                timings.append((time.perf_counter() - started) * 1000)
+            p95 = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+            slowest = max(slowest, p95)
+            self.stdout.write(
+                f'{label:>10} {len(property_ids):>11} {statistics.median(timings):>14.2f} {p95:>10.2f}'
+            )
+
+        if slowest < TARGET_MS:
+            self.stdout.write(self.style.SUCCESS(f'p95 sous l\'objectif de {TARGET_MS} ms'))
+        else:
+            self.stdout.write(self.style.WARNING(f'p95 au-dessus de l\'objectif de {TARGET_MS} ms'))
+
+        if options['cleanup']:
+            Property.objects.filter(name__startswith=BENCH_PREFIX).delete()
+            PropertyAddress.objects.filter(city__startswith=BENCH_PREFIX).delete()
+            PropertyAmenity.objects.filter(name__startswith=BENCH_PREFIX).delete()
+            PropertyType.objects.filter(name__startswith=BENCH_PREFIX).delete()
+            PropertyCategory.objects.filter(name__startswith=BENCH_PREFIX).delete()
+            self.stdout.write(self.style.SUCCESS('Données synthétiques supprimées'))
+
+    def _create_catalog(self, count, cities, amenities_per_property):
+        """Créer `count` propriétés réparties sur `cities` villes, avec leurs équipements"""
+        types = self._get_or_create(PropertyType, 12)
+        categories = self._get_or_create(PropertyCategory, 8)
+        amenities = self._get_or_create(PropertyAmenity, 60)
+        addresses = PropertyAddress.objects.bulk_create([
+            PropertyAddress(city=f'{BENCH_PREFIX}city-{i}', country=f'{BENCH_PREFIX}country-{i % 40}')
+            for i in range(cities)
+        ], batch_size=self.batch_size)
+
+        for start in range(0, count, self.batch_size):
+            properties = Property.objects.bulk_create([
+                Property(
+                    name=f'{BENCH_PREFIX}{start + i}',
+                    property_type=self.random.choice(types),
+                    property_category=self.random.choice(categories),
+                    address=self.random.choice(addresses),
+                    rating=round(self.random.uniform(0, 5), 2)
+                )
+                for i in range(min(self.batch_size, count - start))
+            ])
+            PropertyAmenityLink.objects.bulk_create([
+                PropertyAmenityLink(property=property_obj, amenity=amenity)
+                for property_obj in properties
+                for amenity in self.random.sample(amenities, amenities_per_property)
+            ], batch_size=self.batch_size)
+            self.stdout.write(f'{start + len(properties)} propriétés créées')
+
+    def _get_or_create(self, model, count):
+        objects = list(model.objects.filter(name__startswith=BENCH_PREFIX))
+        if len(objects) < count:
+            objects += model.objects.bulk_create([
+                model(name=f'{BENCH_PREFIX}{model._meta.model_name}-{i}')
+                for i in range(len(objects), count)
+            ])
+        return objects
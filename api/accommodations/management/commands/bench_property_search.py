@@ -0,0 +1,171 @@
+"""
+Benchmark de PropertyViewSet.search quand room_availability grossit.
+
+Les données synthétiques sont créées sous des villes préfixées « bench-city- ».
+La ville mesurée garde un nombre fixe de propriétés : la croissance porte sur
+les autres villes, comme lorsqu'un catalogue s'élargit. Une latence stable
+d'une taille à l'autre montre que le plan de requête ne parcourt pas toute la
+table des disponibilités.
+
+Les données sont créées par bulk_create, sans signaux : la projection de
+recherche des propriétés créées est calculée explicitement. Le cache de
+recherche est vidé avant chaque requête mesurée, pour chronométrer la
+requête et non une lecture du cache.
+
+À lancer uniquement sur une base de test :
+    python manage.py bench_property_search --sizes 1000000,10000000,30000000
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from accommodations import search_cache, search_projection
+from accommodations.availability_ranges import ranges_enabled
+from accommodations.models import PropertyAddress, Property, PropertySearchProjection, Room, RoomAvailability
+from accommodations.views import PropertyViewSet
+
+
+BENCH_CITY_PREFIX = 'bench-city-'
+TARGET_CITY = BENCH_CITY_PREFIX + 'target'
+
+
+class Command(BaseCommand):
+    help = "Mesurer la latence de la recherche de propriétés selon la taille de room_availability"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='100000,1000000,10000000',
+            help='Tailles cibles de room_availability (lignes), séparées par des virgules'
+        )
+        parser.add_argument('--days', type=int, default=365, help='Horizon du calendrier par chambre')
+        parser.add_argument('--rooms-per-property', type=int, default=20)
+        parser.add_argument('--target-properties', type=int, default=50,
+                            help='Nombre de propriétés dans la ville mesurée')
+        parser.add_argument('--stay-nights', type=int, default=7)
+        parser.add_argument('--repeat', type=int, default=20, help='Nombre de recherches par taille')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Supprimer les données synthétiques à la fin')
+        parser.add_argument('--yes', action='store_true',
+                            help='Confirmer l\'écriture de données synthétiques dans la base')
+
+    def handle(self, *args, **options):
+        if not options['yes']:
+            raise CommandError(
+                'Ce benchmark écrit des millions de lignes. Relancez avec --yes sur une base de test.'
+            )
+
+        if ranges_enabled():
+            raise CommandError(
+                'Ce benchmark écrit le calendrier par nuit : ROOM_AVAILABILITY_STORAGE doit valoir daily.'
+            )
+
+        try:
+            sizes = sorted(int(size) for size in options['sizes'].split(','))
+        except ValueError:
+            raise CommandError('--sizes doit être une liste d\'entiers')
+
+        self.days = options['days']
+        self.rooms_per_property = options['rooms_per_property']
+        self.batch_size = options['batch_size']
+        self.start_date = timezone.now().date()
+        self.random = random.Random(42)
+        self.city_counter = 0
+
+        check_in = self.start_date + timedelta(days=30)
+        check_out = check_in + timedelta(days=options['stay_nights'])
+
+        rows = RoomAvailability.objects.filter(
+            room__property__address__city__startswith=BENCH_CITY_PREFIX
+        ).count()
+        if not PropertyAddress.objects.filter(city=TARGET_CITY).exists():
+            rows += self._create_properties(TARGET_CITY, options['target_properties'])
+        bench_properties = Property.objects.filter(address__city__startswith=BENCH_CITY_PREFIX)
+        if PropertySearchProjection.objects.filter(property__in=bench_properties).count() < bench_properties.count():
+            # Données d'un lancement antérieur sans projection
+            search_projection.refresh_all()
+
+        self.stdout.write(f"{'lignes':>12} {'médiane (ms)':>14} {'p95 (ms)':>10} {'résultats':>10}")
+        for size in sizes:
+            while rows < size:
+                self.city_counter += 1
+                rows += self._create_properties(f'{BENCH_CITY_PREFIX}{self.city_counter}', 50)
+
+            timings, count = self._measure(check_in, check_out, options['repeat'])
+            if not count:
+                raise CommandError(
+                    f'La recherche ne renvoie aucune propriété à {rows} lignes : la mesure serait celle '
+                    'd\'une réponse vide (projection de recherche non remplie ?)'
+                )
+            p95 = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+            self.stdout.write(
+                f'{rows:>12} {statistics.median(timings):>14.2f} {p95:>10.2f} {count:>10}'
+            )
+
+        if options['cleanup']:
+            Property.objects.filter(address__city__startswith=BENCH_CITY_PREFIX).delete()
+            PropertyAddress.objects.filter(city__startswith=BENCH_CITY_PREFIX).delete()
+            self.stdout.write(self.style.SUCCESS('Données synthétiques supprimées'))
+
+    def _create_properties(self, city, count):
+        """Créer `count` propriétés avec leurs chambres et calendriers ; retourne le nombre de nuits créées"""
+        address = PropertyAddress.objects.create(city=city, country='bench')
+        properties = Property.objects.bulk_create([
+            Property(name=f'bench-{city}-{i}', address=address, rating=self.random.randint(0, 5))
+            for i in range(count)
+        ])
+        rooms = Room.objects.bulk_create([
+            Room(property=property_obj, name=f'room-{i}', max_guests=self.random.randint(1, 6))
+            for property_obj in properties
+            for i in range(self.rooms_per_property)
+        ])
+
+        created = 0
+        batch = []
+        for room in rooms:
+            for offset in range(self.days):
+                batch.append(RoomAvailability(
+                    room=room,
+                    date=self.start_date + timedelta(days=offset),
+                    available=self.random.random() < 0.9,
+                    price=self.random.randint(50, 400)
+                ))
+                if len(batch) >= self.batch_size:
+                    RoomAvailability.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+        if batch:
+            RoomAvailability.objects.bulk_create(batch)
+            created += len(batch)
+        # bulk_create ne déclenche pas les signaux qui tiennent la projection à jour
+        search_projection.refresh_properties([property_obj.id for property_obj in properties])
+        return created
+
+    def _measure(self, check_in, check_out, repeat):
+        factory = APIRequestFactory()
+        view = PropertyViewSet.as_view({'get': 'search'})
+        params = {
+            'city': TARGET_CITY,
+            'check_in': str(check_in),
+            'check_out': str(check_out),
+            'guests': 2,
+        }
+
+        timings = []
+        count = 0
+        for _ in range(repeat):
+            # Cache vidé : sinon seule la première recherche ferait la requête
+            search_cache.get_cache().clear()
+            request = factory.get('/api/accommodations/properties/search/', params)
+            started = time.perf_counter()
+            response = view(request)
+            response.render()
+            timings.append((time.perf_counter() - started) * 1000)
+            count = response.data.get('count', 0)
+        return timings, count
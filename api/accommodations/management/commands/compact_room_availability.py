@@ -0,0 +1,90 @@
+"""
+Compacter room_availability (une ligne par nuit) en room_availability_ranges.
+
+Les nuits consécutives d'une chambre qui ont la même disponibilité et le même
+prix deviennent une seule plage. Les plages existantes des chambres traitées
+sont remplacées : room_availability reste la référence jusqu'au passage à
+ROOM_AVAILABILITY_STORAGE = 'ranges'.
+
+    python manage.py compact_room_availability --dry-run
+    python manage.py compact_room_availability
+    python manage.py compact_room_availability --delete-daily   # après la bascule
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accommodations.availability_ranges import compact_daily_rows
+from accommodations.models import Room, RoomAvailability, RoomAvailabilityRange
+
+
+class Command(BaseCommand):
+    help = "Regrouper les disponibilités par nuit en plages de dates (room_availability_ranges)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room-id', action='append', dest='room_ids',
+                            help='Limiter à une chambre (option répétable)')
+        parser.add_argument('--batch-rooms', type=int, default=500,
+                            help='Nombre de chambres traitées par transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Calculer le taux de compression sans rien écrire')
+        parser.add_argument('--delete-daily', action='store_true',
+                            help='Supprimer les lignes room_availability compactées '
+                                 '(uniquement avec ROOM_AVAILABILITY_STORAGE = \'ranges\')')
+
+    def handle(self, *args, **options):
+        if options['delete_daily'] and getattr(settings, 'ROOM_AVAILABILITY_STORAGE', 'daily') != 'ranges':
+            raise CommandError(
+                '--delete-daily supprimerait le calendrier lu par l\'application : '
+                'passez d\'abord ROOM_AVAILABILITY_STORAGE à \'ranges\'.'
+            )
+
+        rooms = Room.objects.order_by('id')
+        if options['room_ids']:
+            rooms = rooms.filter(id__in=options['room_ids'])
+        room_ids = list(rooms.values_list('id', flat=True))
+
+        started = time.perf_counter()
+        report = {'rooms': 0, 'daily_rows': 0, 'ranges': 0, 'deleted_daily_rows': 0}
+        batch_rooms = options['batch_rooms']
+        for start in range(0, len(room_ids), batch_rooms):
+            chunk = room_ids[start:start + batch_rooms]
+            rows = RoomAvailability.objects.filter(room_id__in=chunk).order_by(
+                'room_id', 'date'
+            ).values_list('room_id', 'date', 'available', 'price')
+
+            daily_rows = 0
+
+            def counted(rows):
+                nonlocal daily_rows
+                for row in rows.iterator(chunk_size=10000):
+                    daily_rows += 1
+                    yield row
+
+            ranges = list(compact_daily_rows(counted(rows)))
+            report['rooms'] += len(chunk)
+            report['daily_rows'] += daily_rows
+            report['ranges'] += len(ranges)
+            if options['dry_run']:
+                continue
+
+            # Suppressions sans signaux (ni chargement des lignes en mémoire) :
+            # les autres processus relisent le calendrier à l'expiration de
+            # leur index et de leur cache de recherche
+            with transaction.atomic():
+                existing = RoomAvailabilityRange.objects.filter(room_id__in=chunk)
+                existing._raw_delete(existing.db)
+                RoomAvailabilityRange.objects.bulk_create(ranges, batch_size=2000)
+                if options['delete_daily']:
+                    daily = RoomAvailability.objects.filter(room_id__in=chunk)
+                    report['deleted_daily_rows'] += daily._raw_delete(daily.db)
+
+        report['compression_ratio'] = (
+            round(report['daily_rows'] / report['ranges'], 1) if report['ranges'] else None
+        )
+        report['dry_run'] = options['dry_run']
+        report['seconds'] = round(time.perf_counter() - started, 2)
+        self.stdout.write(json.dumps(report, indent=2))
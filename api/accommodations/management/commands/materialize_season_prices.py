@@ -0,0 +1,47 @@
+"""
+Reporter les saisons RoomPricing dans le prix des nuits du calendrier
+(voir accommodations/season_prices.py).
+
+Incrémental : seules les chambres dont les saisons ont changé sont
+réécrites sur tout l'horizon ; les autres n'écrivent que les nuits entrées
+dans l'horizon depuis le passage précédent. À planifier chaque nuit :
+
+    python manage.py materialize_season_prices
+    python manage.py materialize_season_prices --room-id <uuid> --full
+    python manage.py materialize_season_prices --create-missing
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accommodations.season_prices import BATCH_SIZE, materialize
+
+
+class Command(BaseCommand):
+    help = "Reporter les prix de saison dans le calendrier des chambres"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room-id', action='append', dest='room_ids',
+                            help='Limiter à une chambre (option répétable)')
+        parser.add_argument('--full', action='store_true',
+                            help="Réécrire tout l'horizon, même sans changement de saisons")
+        parser.add_argument('--create-missing', action='store_true',
+                            help='Créer les nuits absentes du calendrier couvertes par une saison')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Nombre de chambres traitées par lot')
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            self.stdout.write(f'{done}/{total} chambres')
+
+        try:
+            report = materialize(
+                options['room_ids'],
+                full=options['full'],
+                create_missing=options['create_missing'],
+                batch_size=options['batch_size'],
+                progress=progress
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(json.dumps(report, indent=2))
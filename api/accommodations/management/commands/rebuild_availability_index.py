@@ -0,0 +1,29 @@
+"""
+Reconstruire et diagnostiquer l'index de disponibilités en mémoire.
+
+L'index est propre à chaque processus : cette commande construit l'index dans
+son propre processus pour mesurer le temps de construction et l'empreinte
+mémoire, et vérifier sa cohérence avec la base. Pour l'index d'un serveur en
+cours d'exécution, utiliser l'endpoint room-availability/index_status/.
+"""
+import json
+
+from django.core.management.base import BaseCommand
+
+from accommodations.availability_index import RoomAvailabilityIndex
+
+
+class Command(BaseCommand):
+    help = "Reconstruire l'index de disponibilités en mémoire et afficher son empreinte"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon-days', type=int, default=None)
+        parser.add_argument('--check', action='store_true',
+                            help='Vérifier la cohérence de l\'index avec la base')
+
+    def handle(self, *args, **options):
+        index = RoomAvailabilityIndex(options['horizon_days']).rebuild()
+        report = index.memory_footprint()
+        if options['check']:
+            report['consistency'] = index.check_consistency()
+        self.stdout.write(json.dumps(report, indent=2))
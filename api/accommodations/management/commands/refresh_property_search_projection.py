@@ -0,0 +1,38 @@
+"""
+Recalculer la projection de recherche des propriétés (property_search_projections).
+
+Les signaux tiennent la projection à jour au fil des écritures ; cette
+commande la recalcule entièrement pour rattraper les écritures faites sans
+signaux (update(), SQL brut, autres outils) et faire glisser la fenêtre du
+prix d'appel (la migration 0007 remplit la table des propriétés existantes). À planifier chaque nuit.
+
+    python manage.py refresh_property_search_projection
+    python manage.py refresh_property_search_projection --property-id <uuid>
+"""
+import json
+
+from django.core.management.base import BaseCommand
+
+from accommodations.search_projection import BATCH_SIZE, refresh_all, refresh_properties
+
+
+class Command(BaseCommand):
+    help = "Recalculer la projection de recherche des propriétés"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--property-id', action='append', dest='property_ids',
+                            help='Limiter à une propriété (option répétable)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Nombre de propriétés recalculées par lot')
+
+    def handle(self, *args, **options):
+        if options['property_ids']:
+            written = refresh_properties(options['property_ids'])
+            self.stdout.write(json.dumps({'properties': written}, indent=2))
+            return
+
+        def progress(done, total):
+            self.stdout.write(f'{done}/{total} propriétés')
+
+        report = refresh_all(options['batch_size'], progress=progress)
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,38 @@
+"""
+Recalculer le stock par type de chambre (room_type_inventory).
+
+Les signaux tiennent le stock à jour au fil des écritures ; cette commande le
+recalcule sur tout l'horizon (ROOM_INVENTORY_HORIZON_DAYS) pour rattraper
+les écritures faites sans signaux et faire glisser l'horizon (la migration
+0008 remplit le stock des propriétés existantes). À planifier chaque nuit.
+
+    python manage.py refresh_room_inventory
+    python manage.py refresh_room_inventory --property-id <uuid>
+"""
+import json
+
+from django.core.management.base import BaseCommand
+
+from accommodations.inventory import BATCH_SIZE, refresh_all, refresh_properties
+
+
+class Command(BaseCommand):
+    help = "Recalculer le stock par type de chambre et par nuit"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--property-id', action='append', dest='property_ids',
+                            help='Limiter à une propriété (option répétable)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Nombre de propriétés recalculées par lot')
+
+    def handle(self, *args, **options):
+        if options['property_ids']:
+            written = refresh_properties(options['property_ids'])
+            self.stdout.write(json.dumps({'rows': written}, indent=2))
+            return
+
+        def progress(done, total):
+            self.stdout.write(f'{done}/{total} propriétés')
+
+        report = refresh_all(options['batch_size'], progress=progress)
+        self.stdout.write(json.dumps(report, indent=2))
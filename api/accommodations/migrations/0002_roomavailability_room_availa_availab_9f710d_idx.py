@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accommodations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='roomavailability',
+            index=models.Index(fields=['available', 'date', 'room'], name='room_availa_availab_9f710d_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:46
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accommodations', '0002_roomavailability_room_availa_availab_9f710d_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomAvailabilityRange',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(help_text='Première nuit non incluse')),
+                ('available', models.BooleanField(default=True)),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, validators=[django.core.validators.MinValueValidator(0)])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_ranges', to='accommodations.room')),
+            ],
+            options={
+                'db_table': 'room_availability_ranges',
+                'ordering': ['room', 'start_date'],
+                'indexes': [models.Index(fields=['room', 'start_date'], name='room_availa_room_id_576be9_idx'), models.Index(fields=['room', 'end_date'], name='room_availa_room_id_9f0d5b_idx'), models.Index(fields=['available', 'start_date', 'end_date'], name='room_availa_availab_140277_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='roomavailabilityrange',
+            constraint=models.CheckConstraint(check=models.Q(('end_date__gt', models.F('start_date'))), name='room_availability_range_not_empty'),
+        ),
+    ]
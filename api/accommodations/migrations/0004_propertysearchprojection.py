@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accommodations', '0003_roomavailabilityrange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertyamenity',
+            name='search_bit',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, help_text="Bit de l'équipement dans PropertySearchProjection.amenity_mask", null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='PropertySearchProjection',
+            fields=[
+                ('property', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_projection', serialize=False, to='accommodations.property')),
+                ('name', models.CharField(max_length=255)),
+                ('status', models.CharField(max_length=20)),
+                ('property_type_id', models.UUIDField(blank=True, null=True)),
+                ('property_category_id', models.UUIDField(blank=True, null=True)),
+                ('city', models.CharField(blank=True, default='', help_text='Ville sans accents ni casse', max_length=100)),
+                ('country', models.CharField(blank=True, default='', help_text='Pays sans accents ni casse', max_length=100)),
+                ('rating', models.DecimalField(decimal_places=2, default=0.0, max_digits=3)),
+                ('total_reviews', models.IntegerField(default=0)),
+                ('amenity_mask', models.BigIntegerField(default=0, help_text='Bits PropertyAmenity.search_bit')),
+                ('max_guests', models.IntegerField(default=0, help_text='Capacité de la plus grande chambre disponible')),
+                ('from_price', models.DecimalField(blank=True, decimal_places=2, help_text="Prix minimum d'une nuit sur la fenêtre de prix", max_digits=10, null=True)),
+                ('price_window_start', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'property_search_projections',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'rating'], name='property_se_status_7f4e18_idx'), models.Index(fields=['status', 'from_price'], name='property_se_status_f0bd5c_idx'), models.Index(fields=['status', 'created_at'], name='property_se_status_b82f2b_idx'), models.Index(fields=['city'], name='property_se_city_1b937f_idx'), models.Index(fields=['country'], name='property_se_country_ea105c_idx'), models.Index(fields=['property_type_id'], name='property_se_propert_267bce_idx'), models.Index(fields=['property_category_id'], name='property_se_propert_cdff2f_idx')],
+            },
+        ),
+    ]
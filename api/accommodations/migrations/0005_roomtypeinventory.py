@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accommodations', '0004_propertysearchprojection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomTypeInventory',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('rooms_total', models.IntegerField(default=0)),
+                ('rooms_available', models.IntegerField(default=0)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, help_text='Prix de nuit le plus bas parmi les chambres libres', max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_type_inventory', to='accommodations.property')),
+                ('room_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory', to='accommodations.roomtype')),
+            ],
+            options={
+                'db_table': 'room_type_inventory',
+                'ordering': ['property', 'room_type', 'date'],
+                'indexes': [models.Index(fields=['property', 'date'], name='room_type_i_propert_cc8cac_idx'), models.Index(fields=['date', 'rooms_available'], name='room_type_i_date_3c6055_idx')],
+                'unique_together': {('property', 'room_type', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accommodations', '0005_roomtypeinventory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomSeasonPriceState',
+            fields=[
+                ('room', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='season_price_state', serialize=False, to='accommodations.room')),
+                ('pricing_fingerprint', models.CharField(max_length=64)),
+                ('horizon_end', models.DateField()),
+                ('materialized_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'room_season_price_states',
+                'ordering': ['-materialized_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='roomavailability',
+            name='price_from_season',
+            field=models.BooleanField(default=False, help_text="Prix recopié d'une saison RoomPricing (voir season_prices.py)"),
+        ),
+    ]
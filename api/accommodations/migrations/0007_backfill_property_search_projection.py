@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+# Cette migration ne remplit plus la projection de recherche : le calcul
+# (accommodations.search_projection) lit les modèles actuels, qui ne
+# correspondent pas forcément au schéma de cette étape des migrations.
+# Après la mise à jour, lancer :
+#     python manage.py refresh_property_search_projection
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accommodations', '0006_roomseasonpricestate'),
+    ]
+
+    operations = []
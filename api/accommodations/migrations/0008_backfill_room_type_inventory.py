@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+# Cette migration ne remplit plus le stock par type de chambre : le calcul
+# (accommodations.inventory) lit les modèles actuels, qui ne correspondent
+# pas forcément au schéma de cette étape des migrations. Après la mise à
+# jour, lancer :
+#     python manage.py refresh_room_inventory
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accommodations', '0007_backfill_property_search_projection'),
+    ]
+
+    operations = []
@@ -154,6 +154,13 @@ class PropertyAmenity(models.Model):
     name = models.CharField(max_length=100, unique=True, db_index=True)
     icon = models.CharField(max_length=50, blank=True, null=True)
     category = models.CharField(max_length=50, blank=True, null=True)
+    search_bit = models.PositiveSmallIntegerField(
+        blank=True,
+        null=True,
+        unique=True,
+        editable=False,
+        help_text="Bit de l'équipement dans PropertySearchProjection.amenity_mask"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -423,6 +430,10 @@ class RoomAvailability(models.Model):
         null=True,
         validators=[MinValueValidator(0)]
     )
+    price_from_season = models.BooleanField(
+        default=False,
+        help_text="Prix recopié d'une saison RoomPricing (voir season_prices.py)"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -434,6 +445,8 @@ class RoomAvailability(models.Model):
             models.Index(fields=['room']),
             models.Index(fields=['date']),
             models.Index(fields=['available']),
+            # Recherche « disponible toutes les nuits » (GROUP BY room / HAVING)
+            models.Index(fields=['available', 'date', 'room']),
         ]
         verbose_name_plural = 'Room Availabilities'
     
@@ -488,3 +501,189 @@ class RoomPricing(models.Model):
     
     def __str__(self):
         return f"{self.room.name} - {self.get_season_type_display()} ({self.base_price} {self.currency})"
+
+
+# ============================================================================
+# 15. ROOM AVAILABILITY RANGES
+# ============================================================================
+
+class RoomAvailabilityRange(models.Model):
+    """
+    Disponibilités par plages de dates [start_date, end_date).
+
+    Stockage alternatif à room_availability (ROOM_AVAILABILITY_STORAGE =
+    'ranges') : les nuits voisines identiques tiennent dans une seule ligne.
+    Les plages d'une chambre ne se chevauchent pas et deux plages contiguës
+    ont des valeurs différentes (voir availability_ranges.write_range).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    room = models.ForeignKey(
+        Room,
+        on_delete=models.CASCADE,
+        related_name='availability_ranges',
+        db_index=True
+    )
+    start_date = models.DateField()
+    end_date = models.DateField(help_text="Première nuit non incluse")
+    available = models.BooleanField(default=True)
+    price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(0)]
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'room_availability_ranges'
+        ordering = ['room', 'start_date']
+        indexes = [
+            models.Index(fields=['room', 'start_date']),
+            models.Index(fields=['room', 'end_date']),
+            models.Index(fields=['available', 'start_date', 'end_date']),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(end_date__gt=models.F('start_date')),
+                name='room_availability_range_not_empty'
+            ),
+        ]
+    
+    def __str__(self):
+        status = "Disponible" if self.available else "Indisponible"
+        return f"{self.room.name} - {self.start_date} → {self.end_date} ({status})"
+
+
+# ============================================================================
+# 16. PROPERTY SEARCH PROJECTION
+# ============================================================================
+
+class PropertySearchProjection(models.Model):
+    """
+    Projection dénormalisée d'une propriété pour le filtrage et le tri des
+    listes et recherches (une ligne par propriété, sans jointure).
+
+    Maintenue par les signaux et par la commande
+    refresh_property_search_projection (voir search_projection.py).
+    """
+    property = models.OneToOneField(
+        Property,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_projection'
+    )
+    name = models.CharField(max_length=255)
+    status = models.CharField(max_length=20)
+    property_type_id = models.UUIDField(blank=True, null=True)
+    property_category_id = models.UUIDField(blank=True, null=True)
+    city = models.CharField(max_length=100, blank=True, default='', help_text="Ville sans accents ni casse")
+    country = models.CharField(max_length=100, blank=True, default='', help_text="Pays sans accents ni casse")
+    rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
+    total_reviews = models.IntegerField(default=0)
+    amenity_mask = models.BigIntegerField(default=0, help_text="Bits PropertyAmenity.search_bit")
+    max_guests = models.IntegerField(default=0, help_text="Capacité de la plus grande chambre disponible")
+    from_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        help_text="Prix minimum d'une nuit sur la fenêtre de prix"
+    )
+    price_window_start = models.DateField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    refreshed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'property_search_projections'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'rating']),
+            models.Index(fields=['status', 'from_price']),
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['city']),
+            models.Index(fields=['country']),
+            models.Index(fields=['property_type_id']),
+            models.Index(fields=['property_category_id']),
+        ]
+    
+    def __str__(self):
+        return f"Projection - {self.name}"
+
+
+# ============================================================================
+# 17. ROOM TYPE INVENTORY
+# ============================================================================
+
+class RoomTypeInventory(models.Model):
+    """
+    Stock par (propriété, type de chambre, nuit) : chambres en service,
+    chambres libres (ni fermées ni réservées) et prix minimum des libres.
+
+    Recalculé dans la transaction des écritures qui le modifient (voir
+    inventory.py) sur ROOM_INVENTORY_HORIZON_DAYS jours.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    property = models.ForeignKey(
+        Property,
+        on_delete=models.CASCADE,
+        related_name='room_type_inventory',
+        db_index=True
+    )
+    room_type = models.ForeignKey(
+        RoomType,
+        on_delete=models.CASCADE,
+        related_name='inventory',
+        db_index=True
+    )
+    date = models.DateField()
+    rooms_total = models.IntegerField(default=0)
+    rooms_available = models.IntegerField(default=0)
+    min_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        help_text="Prix de nuit le plus bas parmi les chambres libres"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'room_type_inventory'
+        ordering = ['property', 'room_type', 'date']
+        unique_together = [['property', 'room_type', 'date']]
+        indexes = [
+            models.Index(fields=['property', 'date']),
+            models.Index(fields=['date', 'rooms_available']),
+        ]
+    
+    def __str__(self):
+        return f"{self.property.name} - {self.room_type.name} - {self.date} ({self.rooms_available}/{self.rooms_total})"
+
+
+# ============================================================================
+# 18. ROOM SEASON PRICE MATERIALIZATION
+# ============================================================================
+
+class RoomSeasonPriceState(models.Model):
+    """
+    État du report des saisons RoomPricing dans le calendrier d'une chambre :
+    empreinte des saisons reportées et fin de l'horizon déjà écrit.
+    """
+    room = models.OneToOneField(
+        Room,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='season_price_state'
+    )
+    pricing_fingerprint = models.CharField(max_length=64)
+    horizon_end = models.DateField()
+    materialized_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'room_season_price_states'
+        ordering = ['-materialized_at']
+    
+    def __str__(self):
+        return f"{self.room.name} (jusqu'au {self.horizon_end})"
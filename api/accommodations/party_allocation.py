@@ -0,0 +1,192 @@
+"""
+Répartition d'un groupe dans plusieurs chambres (recherche multi-chambres).
+
+Une propriété peut accueillir un groupe de `guests` personnes si une
+combinaison de ses chambres libres toutes les nuits du séjour a assez de
+places : c'est un test de capacité seul (les `rooms` plus grandes chambres
+suffisent-elles ?), fait pour toutes les propriétés candidates en un
+passage. La combinaison proposée, elle, n'est calculée que pour les
+propriétés de la page :
+- nombre de chambres : `rooms` si demandé, sinon le minimum possible
+  (glouton par capacité décroissante) ;
+- parmi ces combinaisons, la moins chère : solution gloutonne de départ,
+  puis recherche bornée (branch and bound) sur les groupes de chambres
+  identiques (même capacité, même prix), limitée à MAX_NODES nœuds.
+"""
+from .models import Property
+from .availability import rooms_available_for_stay
+from .pricing import quote_rooms
+
+
+MAX_NODES = 20000
+MAX_PARTY_ROOMS = 10
+# Coût d'une chambre sans tarif complet : retenue seulement faute de mieux
+UNPRICED = 10 ** 12
+
+
+def minimum_rooms(capacities, guests):
+    """Plus petit nombre de chambres pouvant accueillir `guests`, ou None"""
+    total = 0
+    for count, capacity in enumerate(sorted(capacities, reverse=True), start=1):
+        total += capacity
+        if total >= guests:
+            return count
+    return None
+
+
+def can_host(capacities, guests, room_count=None):
+    """Le groupe tient-il dans `room_count` chambres (ou autant que nécessaire) ?"""
+    if room_count is None:
+        return minimum_rooms(capacities, guests) is not None
+    return len(capacities) >= room_count and sum(sorted(capacities, reverse=True)[:room_count]) >= guests
+
+
+def allocate(rooms, guests, room_count=None, max_nodes=MAX_NODES):
+    """
+    Combinaison de chambres la moins chère pour `guests` personnes.
+
+    `rooms` : tuples (room_id, capacité, prix du séjour ou None). Retourne la
+    liste des room_id retenus, ou None si le groupe ne tient pas dans
+    `room_count` chambres. À prix égal, la combinaison avec le moins de
+    places perdues l'emporte.
+    """
+    capacities = [capacity for _, capacity, _ in rooms]
+    if room_count is None:
+        room_count = minimum_rooms(capacities, guests)
+        if room_count is None:
+            return None
+    elif not can_host(capacities, guests, room_count):
+        return None
+
+    # Chambres identiques regroupées : on choisit combien en prendre
+    groups = {}
+    for room_id, capacity, price in rooms:
+        cost = UNPRICED if price is None else price
+        groups.setdefault((cost, -capacity), []).append(room_id)
+    keys = sorted(groups)
+    costs = [cost for cost, _ in keys]
+    sizes = [-negative for _, negative in keys]
+    members = [groups[key] for key in keys]
+
+    # best_capacity[i][n] : places maximum de n chambres prises dans les groupes i..
+    best_capacity = [[0] * (room_count + 1) for _ in range(len(keys) + 1)]
+    suffix = []
+    for i in range(len(keys) - 1, -1, -1):
+        suffix = sorted(suffix + [sizes[i]] * min(len(members[i]), room_count), reverse=True)[:room_count]
+        running = 0
+        for n, capacity in enumerate(suffix, start=1):
+            running += capacity
+            best_capacity[i][n] = running
+        for n in range(len(suffix) + 1, room_count + 1):
+            best_capacity[i][n] = -1
+
+    best = _greedy(costs, sizes, members, guests, room_count)
+    counts = [0] * len(keys)
+    nodes = 0
+
+    def search(i, left, capacity, cost):
+        nonlocal best, nodes
+        nodes += 1
+        if left == 0:
+            if capacity >= guests and (best is None or (cost, capacity) < best[:2]):
+                best = (cost, capacity, list(counts))
+            return
+        if i == len(keys) or nodes > max_nodes:
+            return
+        # Groupes triés par prix : les chambres restantes coûtent au moins costs[i]
+        if best is not None and cost + left * costs[i] > best[0]:
+            return
+        reachable = best_capacity[i][left]
+        if reachable < 0 or capacity + reachable < guests:
+            return
+        for taken in range(min(left, len(members[i])), -1, -1):
+            counts[i] = taken
+            search(i + 1, left - taken, capacity + taken * sizes[i], cost + taken * costs[i])
+        counts[i] = 0
+
+    search(0, room_count, 0, 0)
+    if best is None:
+        return None
+    return [room_id for group, taken in zip(members, best[2]) for room_id in group[:taken]]
+
+
+def _greedy(costs, sizes, members, guests, room_count):
+    """
+    Première solution : la chambre la moins chère qui laisse le groupe
+    logeable avec les chambres restantes, tant qu'il reste des chambres à
+    choisir. Retourne (coût, places, nombre pris par groupe) ou None.
+    """
+    counts = [0] * len(costs)
+    capacity = cost = 0
+    for left in range(room_count, 0, -1):
+        for i in range(len(costs)):
+            if counts[i] == len(members[i]):
+                continue
+            counts[i] += 1
+            # Places possibles avec les left - 1 chambres restantes, hors celles déjà prises
+            remaining = sorted(
+                (sizes[j] for j in range(len(costs)) for _ in range(len(members[j]) - counts[j])),
+                reverse=True
+            )[:left - 1]
+            if capacity + sizes[i] + sum(remaining) >= guests:
+                capacity += sizes[i]
+                cost += costs[i]
+                break
+            counts[i] -= 1
+        else:
+            return None
+    return (cost, capacity, counts)
+
+
+def party_allocations(property_ids, check_in, check_out, guests, room_count=None):
+    """
+    Combinaison proposée pour chaque propriété (celles d'une page).
+
+    Retourne {property_id: répartition ou None} ; une répartition contient
+    rooms (room_id, room_name, max_guests, total), capacity, total (None si
+    une chambre n'a pas de tarif complet ou si les devises diffèrent),
+    currency (None si les devises diffèrent) et complete.
+    """
+    rooms = list(rooms_available_for_stay(
+        check_in, check_out, properties=Property.objects.filter(id__in=property_ids)
+    ).only('id', 'name', 'property_id', 'max_guests').order_by('id'))
+    quotes = quote_rooms(rooms, check_in, check_out)
+
+    by_property = {}
+    for room in rooms:
+        by_property.setdefault(str(room.property_id), []).append(room)
+
+    allocations = {}
+    for property_id in property_ids:
+        candidates = {room.id: room for room in by_property.get(str(property_id), [])}
+        chosen = allocate(
+            [
+                (room.id, room.max_guests, quotes[room.id]['total'] if quotes[room.id]['complete'] else None)
+                for room in candidates.values()
+            ],
+            guests,
+            room_count
+        )
+        if chosen is None:
+            allocations[property_id] = None
+            continue
+        selected = [quotes[room_id] for room_id in chosen]
+        # Des chambres tarifées dans des devises différentes ne s'additionnent pas
+        currencies = {quote['currency'] for quote in selected}
+        complete = all(quote['complete'] for quote in selected) and len(currencies) == 1
+        allocations[property_id] = {
+            'rooms': [
+                {
+                    'room_id': str(room_id),
+                    'room_name': candidates[room_id].name,
+                    'max_guests': candidates[room_id].max_guests,
+                    'total': quotes[room_id]['total'] if quotes[room_id]['complete'] else None,
+                }
+                for room_id in chosen
+            ],
+            'capacity': sum(candidates[room_id].max_guests for room_id in chosen),
+            'total': round(sum(quote['total'] for quote in selected), 2) if complete else None,
+            'currency': currencies.pop() if len(currencies) == 1 else None,
+            'complete': complete,
+        }
+    return allocations
@@ -0,0 +1,156 @@
+"""
+Calcul du prix d'un séjour (devis) pour un ensemble de chambres.
+
+Pour chaque nuit de [check_in, check_out), le tarif est :
+1. le prix de la nuit (RoomAvailability.price, ou la plage en stockage
+   'ranges') s'il est renseigné ;
+2. sinon le base_price de la saison RoomPricing qui couvre la nuit. Une
+   saison sans dates couvre toute l'année ; si plusieurs saisons couvrent la
+   même nuit, la plus forte l'emporte (peak > high > medium > low), puis la
+   plus courte.
+
+Le calcul est fait sur une matrice chambres × nuits (NumPy) remplie par trois
+requêtes, quel que soit le nombre de chambres : une page de recherche obtient
+les totaux de 50 propriétés en un seul passage.
+"""
+from datetime import date
+
+import numpy as np
+
+from .availability import calendar_rows, stay_nights
+from .models import Room, RoomPricing
+
+
+SEASON_PRECEDENCE = {'low': 0, 'medium': 1, 'high': 2, 'peak': 3}
+DEFAULT_CURRENCY = 'EUR'
+
+
+def price_matrix(room_ids, check_in, check_out):
+    """
+    Matrices chambres × nuits de [check_in, check_out), lignes dans l'ordre
+    de `room_ids` : (prix du calendrier, prix de saison, nuits bloquées,
+    devise de la saison retenue pour chaque nuit, None hors saison). Un prix
+    absent vaut NaN. Une nuit est bloquée si elle est fermée ou n'a pas de
+    ligne dans le calendrier (même règle que la recherche).
+    """
+    nights = stay_nights(check_in, check_out)
+    room_index = {room_id: i for i, room_id in enumerate(room_ids)}
+    shape = (len(room_index), len(nights))
+
+    nightly = np.full(shape, np.nan)
+    blocked = np.ones(shape, dtype=bool)
+    for room_id, night, available, price in calendar_rows(list(room_index), check_in, check_out):
+        row = room_index[room_id]
+        col = (night - check_in).days
+        if price is not None:
+            nightly[row, col] = float(price)
+        blocked[row, col] = not available
+
+    seasonal = np.full(shape, np.nan)
+    currencies = np.full(shape, None, dtype=object)
+    pricings = RoomPricing.objects.filter(room_id__in=list(room_index)).exclude(
+        start_date__gte=check_out
+    ).exclude(
+        end_date__lt=check_in
+    ).order_by().values_list('room_id', 'base_price', 'currency', 'season_type', 'start_date', 'end_date')
+    # Les saisons les plus prioritaires sont écrites en dernier
+    for room_id, base_price, currency, season_type, start_date, end_date in sorted(
+        pricings, key=_season_priority
+    ):
+        row = room_index[room_id]
+        first = max((start_date - check_in).days, 0) if start_date else 0
+        last = min((end_date - check_in).days + 1, len(nights)) if end_date else len(nights)
+        if first < last:
+            seasonal[row, first:last] = float(base_price)
+            currencies[row, first:last] = currency
+    return nightly, seasonal, blocked, currencies
+
+
+def quote_rooms(rooms, check_in, check_out):
+    """
+    Devis de plusieurs chambres pour un séjour.
+
+    `rooms` : chambres (instances Room). Retourne {room_id: devis} où un devis
+    contient total, currency, complete (toutes les nuits ont un tarif, dans
+    une seule devise), available (toutes les nuits ouvertes dans le
+    calendrier), missing_dates, mixed_currencies et nights (date, price,
+    source, available).
+
+    La devise d'une nuit est celle de la saison qui l'emporte ce soir-là (le
+    prix du calendrier n'a pas de devise propre), DEFAULT_CURRENCY hors
+    saison. Un séjour dont les nuits tarifées mélangent plusieurs devises n'a
+    pas de total significatif : currency vaut None et le devis n'est pas
+    complet.
+    """
+    rooms = list(rooms)
+    nights = stay_nights(check_in, check_out)
+    room_index = {room.id: i for i, room in enumerate(rooms)}
+    nightly, seasonal, blocked, currencies = price_matrix(list(room_index), check_in, check_out)
+
+    from_nightly = ~np.isnan(nightly)
+    prices = np.where(from_nightly, nightly, seasonal)
+    priced = ~np.isnan(prices)
+    totals = np.where(priced, prices, 0.0).sum(axis=1)
+    complete = priced.all(axis=1)
+    available = ~blocked.any(axis=1)
+
+    quotes = {}
+    for room in rooms:
+        row = room_index[room.id]
+        room_currencies = {
+            currencies[row, col] or DEFAULT_CURRENCY for col in np.flatnonzero(priced[row])
+        } or {DEFAULT_CURRENCY}
+        mixed = len(room_currencies) > 1
+        quotes[room.id] = {
+            'room_id': str(room.id),
+            'room_name': room.name,
+            'total': round(float(totals[row]), 2),
+            'currency': None if mixed else next(iter(room_currencies)),
+            'complete': bool(complete[row]) and not mixed,
+            'mixed_currencies': mixed,
+            'available': bool(available[row]),
+            'missing_dates': [str(nights[col]) for col in np.flatnonzero(~priced[row])],
+            'nights': [
+                {
+                    'date': str(night),
+                    'price': round(float(prices[row, col]), 2) if priced[row, col] else None,
+                    'source': 'night' if from_nightly[row, col] else ('season' if priced[row, col] else None),
+                    'available': not blocked[row, col],
+                }
+                for col, night in enumerate(nights)
+            ],
+        }
+    return quotes
+
+
+def _season_priority(pricing):
+    _, _, _, season_type, start_date, end_date = pricing
+    # À saison égale, la plus courte (la plus spécifique) l'emporte
+    span = ((end_date or date.max) - (start_date or date.min)).days
+    return (SEASON_PRECEDENCE.get(season_type, 0), -span)
+
+
+def quote_properties(property_ids, check_in, check_out, guests=1):
+    """
+    Meilleur devis de chaque propriété pour un séjour.
+
+    Parmi les chambres en statut 'available' d'au moins `guests` places, la
+    chambre retenue est la moins chère dont toutes les nuits ont un tarif et
+    sont ouvertes dans le calendrier. Retourne {property_id: devis ou None}.
+    """
+    rooms = list(Room.objects.filter(
+        property_id__in=property_ids,
+        status='available',
+        max_guests__gte=guests
+    ).only('id', 'name', 'property_id'))
+    quotes = quote_rooms(rooms, check_in, check_out)
+
+    best = {property_id: None for property_id in property_ids}
+    for room in rooms:
+        quote = quotes[room.id]
+        if not (quote['complete'] and quote['available']):
+            continue
+        current = best.get(room.property_id)
+        if current is None or quote['total'] < current['total']:
+            best[room.property_id] = quote
+    return best
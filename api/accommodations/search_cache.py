@@ -0,0 +1,246 @@
+"""
+Cache des résultats de PropertyViewSet.search.
+
+Une entrée contient la liste ordonnée des identifiants de propriétés d'une
+recherche, et non des pages sérialisées : toutes les pages d'une même
+recherche partagent donc une seule entrée.
+
+Invalidation : la clé d'une entrée contient des jetons de version par
+« portée » (filtre city normalisé, mois du séjour) :
+- v:<city>:*        changée à chaque modification d'une Property, d'une Room
+                    ou d'une saison RoomPricing de la ville (note, statut,
+                    capacité, prix...)
+- v:<city>:<YYYY-MM> changée à chaque modification d'une RoomAvailability de
+                    la ville pour une nuit de ce mois
+Comme le filtre city est un « contient » sans accents ni casse, une
+modification à Montréal change les jetons de toutes les recherches dont le
+filtre est contenu dans « montreal » (« mont », « Montreal »...) ainsi que
+des recherches sans filtre city. Les filtres
+city connus sont gardés dans un registre ; si ce registre est évincé du cache,
+son jeton change et toutes les entrées deviennent invalides.
+
+L'invalidation n'agit que sur le cache du processus (LocMem par défaut) : les
+écritures faites par un autre worker n'y apparaissent qu'après TIMEOUT.
+"""
+import hashlib
+import json
+import threading
+import uuid
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .availability import parse_stay
+from .text_index import fold, query_terms
+
+
+KEY_PREFIX = 'property-search'
+REGISTRY_KEY = f'{KEY_PREFIX}:registry'
+MAX_REGISTERED_CITIES = 2000
+
+# Paramètres de requête qui influencent le résultat de la recherche
+SEARCH_PARAMS = [
+    'city', 'country', 'check_in', 'check_out', 'guests', 'min_rating',
+    'property_type_id', 'property_category_id', 'status', 'amenity_id', 'q',
+    'ordering', 'party', 'rooms',
+]
+
+_counters = {'hits': 0, 'misses': 0}
+_counters_lock = threading.Lock()
+_registry_lock = threading.Lock()
+_pending = threading.local()
+
+
+def get_cache():
+    return caches[getattr(settings, 'PROPERTY_SEARCH_CACHE_ALIAS', 'property_search')]
+
+
+def normalize_city(value):
+    """
+    Forme de comparaison d'une ville ou d'un filtre city (portée
+    d'invalidation) : sans accents ni casse, comme le filtre city de la
+    projection de recherche (« Montreal » trouve « Montréal »)
+    """
+    return fold(value or '')
+
+
+def normalize_params(query_params):
+    """
+    Paramètres de recherche normalisés (formats numériques et dates).
+
+    Les textes (city, country) sont gardés tels quels ; q est réduit à ses
+    termes normalisés. Lève ValueError si les dates ou les nombres sont
+    invalides : ces recherches ne sont pas mises en cache.
+    """
+    params = {}
+    for name in SEARCH_PARAMS:
+        value = query_params.get(name)
+        if value:
+            params[name] = value
+
+    params['guests'] = int(params.get('guests', 2))
+    if 'rooms' in params:
+        params['rooms'] = int(params['rooms'])
+    if 'party' in params:
+        params['party'] = params['party'].lower()
+    if 'min_rating' in params:
+        try:
+            params['min_rating'] = str(Decimal(params['min_rating']).normalize())
+        except InvalidOperation:
+            raise ValueError('min_rating invalide')
+    if 'check_in' in params and 'check_out' in params:
+        check_in, check_out = parse_stay(params['check_in'], params['check_out'])
+        params['check_in'], params['check_out'] = str(check_in), str(check_out)
+    if 'q' in params:
+        # « Hôtels Nice » et « hotel nice » donnent la même recherche
+        params['q'] = ' '.join(query_terms(params['q']))
+    return params
+
+
+def _months(check_in, check_out):
+    """Mois (YYYY-MM) couverts par les nuits [check_in, check_out)"""
+    months = []
+    current = check_in.replace(day=1)
+    while current < check_out:
+        months.append(current.strftime('%Y-%m'))
+        current = (current + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def _version_key(city, month):
+    # La ville est hachée : les clés restent valides pour tous les backends
+    digest = hashlib.sha1(city.encode('utf-8')).hexdigest()[:16]
+    return f'{KEY_PREFIX}:v:{digest}:{month}'
+
+
+def _scope_version_keys(params):
+    city = normalize_city(params.get('city'))
+    keys = [_version_key(city, '*')]
+    if 'check_in' in params and 'check_out' in params:
+        check_in, check_out = parse_stay(params['check_in'], params['check_out'])
+        keys.extend(_version_key(city, month) for month in _months(check_in, check_out))
+    return keys
+
+
+def _new_token():
+    return uuid.uuid4().hex[:12]
+
+
+def _read_versions(cache, keys):
+    """Jetons de version ; un jeton absent (jamais créé ou évincé) est recréé"""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            token = _new_token()
+            if not cache.add(key, token, timeout=None):
+                token = cache.get(key, token)
+            versions[key] = token
+    return [versions[key] for key in keys]
+
+
+def _registry(cache):
+    registry = cache.get(REGISTRY_KEY)
+    if registry is None:
+        registry = {'token': _new_token(), 'cities': []}
+        if not cache.add(REGISTRY_KEY, registry, timeout=None):
+            registry = cache.get(REGISTRY_KEY, registry)
+    return registry
+
+
+def make_key(params):
+    """Clé de cache d'une recherche, incluant les jetons de version de sa portée"""
+    cache = get_cache()
+    city = normalize_city(params.get('city'))
+    with _registry_lock:
+        registry = _registry(cache)
+        if city and city not in registry['cities']:
+            if len(registry['cities']) >= MAX_REGISTERED_CITIES:
+                # Registre plein : nouveau jeton, les anciennes entrées expirent
+                registry = {'token': _new_token(), 'cities': []}
+            registry['cities'] = registry['cities'] + [city]
+            cache.set(REGISTRY_KEY, registry, timeout=None)
+
+    versions = _read_versions(cache, _scope_version_keys(params))
+    digest = hashlib.sha1(
+        json.dumps(params, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+    return f"{KEY_PREFIX}:r:{digest}:{registry['token']}:{'.'.join(versions)}"
+
+
+def get_ids(key):
+    """Liste ordonnée des identifiants en cache, ou None"""
+    ids = get_cache().get(key)
+    with _counters_lock:
+        _counters['hits' if ids is not None else 'misses'] += 1
+    return ids
+
+
+def set_ids(key, ids):
+    max_ids = getattr(settings, 'PROPERTY_SEARCH_CACHE_MAX_IDS', 10000)
+    if len(ids) <= max_ids:
+        get_cache().set(key, [str(pk) for pk in ids])
+
+
+def stats():
+    """Compteurs de succès/échecs du processus et état du backend"""
+    with _counters_lock:
+        data = dict(_counters)
+    lookups = data['hits'] + data['misses']
+    data['hit_ratio'] = round(data['hits'] / lookups, 4) if lookups else None
+    cache = get_cache()
+    if hasattr(cache, 'stats'):
+        data.update(cache.stats())
+    return data
+
+
+# ============================================================================
+# INVALIDATION
+# ============================================================================
+
+def invalidate(city=None, dates=None):
+    """
+    Invalider les recherches touchées par une modification dans `city`.
+
+    `dates` : nuits modifiées (RoomAvailability) ; None pour une modification
+    qui ne dépend pas des dates (Property, Room). city=None invalide tout.
+    Les invalidations sont regroupées et appliquées à la fin de la
+    transaction en cours : le premier rappel on_commit applique toutes les
+    portées en attente, les suivants n'ont plus rien à faire. Les portées d'une
+    transaction annulée sont appliquées avec la suivante, ce qui ne fait
+    qu'invalider un peu plus que nécessaire.
+    """
+    if not hasattr(_pending, 'scopes'):
+        _pending.scopes = set()
+
+    city = None if city is None else normalize_city(city)
+    if dates is None:
+        _pending.scopes.add((city, '*'))
+    else:
+        for date in dates:
+            _pending.scopes.add((city, str(date)[:7]))
+
+    transaction.on_commit(_flush)
+
+
+def _flush():
+    scopes = getattr(_pending, 'scopes', None)
+    _pending.scopes = set()
+    if not scopes:
+        return
+
+    cache = get_cache()
+    if any(city is None for city, _ in scopes):
+        # Portée inconnue : changer le jeton du registre invalide tout
+        cache.delete(REGISTRY_KEY)
+        return
+
+    registry = _registry(cache)
+    tokens = {}
+    for city, month in scopes:
+        for registered in [''] + registry['cities']:
+            if registered in city:
+                tokens[_version_key(registered, month)] = _new_token()
+    cache.set_many(tokens, timeout=None)
@@ -0,0 +1,275 @@
+"""
+Projection de recherche des propriétés (PropertySearchProjection).
+
+Une ligne par propriété regroupe tout ce que filtrent et trient la liste et
+la recherche de PropertyViewSet : statut, type, catégorie, ville et pays
+normalisés (sans accents ni casse), note, nombre d'avis, équipements (un bit
+par équipement dans amenity_mask), capacité de la plus grande chambre et
+prix d'appel (from_price). Les requêtes de filtrage et de tri ne lisent que
+cette table ; les propriétés de la page sont chargées ensuite.
+
+from_price est le prix de nuit le plus bas des chambres disponibles sur les
+PRICE_WINDOW_DAYS prochains jours : prix des nuits ouvertes du calendrier et
+base_price des saisons RoomPricing qui recouvrent la fenêtre. C'est un prix
+d'appel : une saison compte même si certaines de ses nuits sont fermées.
+
+Maintenance :
+- les signaux (voir signals.py) et calendar_bulk.calendar_changed()
+  appellent schedule_refresh(), qui recalcule les propriétés touchées en un
+  seul passage à la validation de la transaction ;
+- la commande refresh_property_search_projection recalcule toute la table :
+  à lancer une fois après la migration pour remplir la table des
+  propriétés existantes, puis chaque nuit (rattrapage des écritures sans
+  signaux et glissement quotidien de la fenêtre de prix).
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from nomade_api.upsert import upsert_options
+
+from .models import (
+    Property, PropertyAmenity, PropertyAmenityLink, PropertySearchProjection,
+    Room, RoomAvailability, RoomPricing
+)
+from .availability_ranges import ranges_enabled, overlapping_ranges
+from .text_index import fold
+
+
+PRICE_WINDOW_DAYS = 90
+# amenity_mask est un entier signé de 64 bits : le bit de signe reste libre
+MAX_AMENITY_BITS = 63
+BATCH_SIZE = 500
+UPDATE_FIELDS = [
+    'name', 'status', 'property_type_id', 'property_category_id', 'city', 'country',
+    'rating', 'total_reviews', 'amenity_mask', 'max_guests', 'from_price',
+    'price_window_start', 'created_at', 'refreshed_at',
+]
+
+
+def projection_enabled():
+    """La liste et la recherche lisent-elles la projection ?"""
+    return getattr(settings, 'PROPERTY_SEARCH_PROJECTION_ENABLED', True)
+
+
+# ============================================================================
+# BITS DES ÉQUIPEMENTS
+# ============================================================================
+
+def amenity_bits():
+    """
+    {amenity_id: bit} des équipements de amenity_mask.
+
+    Les équipements sans bit en reçoivent un libre, dans l'ordre de création,
+    tant qu'il en reste. Au-delà de MAX_AMENITY_BITS équipements, les
+    suivants n'ont pas de bit : le filtre amenity_id passe alors par la
+    table des liens (voir filter_amenity).
+    """
+    bits = dict(PropertyAmenity.objects.filter(
+        search_bit__isnull=False
+    ).order_by().values_list('id', 'search_bit'))
+    if len(bits) >= MAX_AMENITY_BITS or not PropertyAmenity.objects.filter(search_bit__isnull=True).exists():
+        return bits
+
+    try:
+        with transaction.atomic():
+            missing = list(PropertyAmenity.objects.select_for_update().filter(
+                search_bit__isnull=True
+            ).order_by('created_at', 'id').values_list('id', flat=True))
+            used = set(PropertyAmenity.objects.filter(
+                search_bit__isnull=False
+            ).values_list('search_bit', flat=True))
+            free = [bit for bit in range(MAX_AMENITY_BITS) if bit not in used]
+            for amenity_id, bit in zip(missing, free):
+                PropertyAmenity.objects.filter(pk=amenity_id).update(search_bit=bit)
+    except IntegrityError:
+        # Bit attribué en même temps par un autre processus : les équipements
+        # restés sans bit en recevront un au prochain recalcul
+        pass
+    return dict(PropertyAmenity.objects.filter(
+        search_bit__isnull=False
+    ).order_by().values_list('id', 'search_bit'))
+
+
+def filter_amenity(queryset, amenity_id):
+    """Filtrer un queryset de projections sur un équipement"""
+    bit = PropertyAmenity.objects.filter(pk=amenity_id).values_list('search_bit', flat=True).first()
+    if bit is None:
+        return queryset.filter(
+            property_id__in=PropertyAmenityLink.objects.filter(amenity_id=amenity_id).values('property_id')
+        )
+    return queryset.alias(
+        amenity_bit=F('amenity_mask').bitand(1 << bit)
+    ).filter(amenity_bit=1 << bit)
+
+
+# ============================================================================
+# CALCUL DES LIGNES
+# ============================================================================
+
+def _min_night_prices(room_ids, date_from, date_to):
+    """{room_id: prix minimum} des nuits ouvertes et tarifées de [date_from, date_to)"""
+    if ranges_enabled():
+        nights = overlapping_ranges(room_ids, date_from, date_to)
+    else:
+        nights = RoomAvailability.objects.filter(
+            room_id__in=room_ids, date__gte=date_from, date__lt=date_to
+        )
+    return dict(nights.filter(
+        available=True, price__isnull=False
+    ).order_by().values('room_id').annotate(
+        min_price=Min('price')
+    ).values_list('room_id', 'min_price'))
+
+
+def _min_season_prices(room_ids, date_from, date_to):
+    """{room_id: base_price minimum} des saisons qui recouvrent [date_from, date_to)"""
+    return dict(RoomPricing.objects.filter(room_id__in=room_ids).exclude(
+        start_date__gte=date_to
+    ).exclude(
+        end_date__lt=date_from
+    ).order_by().values('room_id').annotate(
+        min_price=Min('base_price')
+    ).values_list('room_id', 'min_price'))
+
+
+def build_projections(property_ids, today=None):
+    """Lignes PropertySearchProjection (non enregistrées) des propriétés existantes"""
+    today = today or timezone.localdate()
+    window_end = today + timedelta(days=PRICE_WINDOW_DAYS)
+    property_ids = list(property_ids)
+
+    masks = {}
+    bits = amenity_bits()
+    for property_id, amenity_id in PropertyAmenityLink.objects.filter(
+        property_id__in=property_ids
+    ).order_by().values_list('property_id', 'amenity_id'):
+        bit = bits.get(amenity_id)
+        if bit is not None:
+            masks[property_id] = masks.get(property_id, 0) | (1 << bit)
+
+    rooms = {}
+    capacities = {}
+    for room_id, property_id, max_guests in Room.objects.filter(
+        property_id__in=property_ids, status='available'
+    ).order_by().values_list('id', 'property_id', 'max_guests'):
+        rooms[room_id] = property_id
+        capacities[property_id] = max(capacities.get(property_id, 0), max_guests)
+
+    prices = {}
+    for room_prices in (
+        _min_night_prices(list(rooms), today, window_end),
+        _min_season_prices(list(rooms), today, window_end),
+    ):
+        for room_id, price in room_prices.items():
+            property_id = rooms[room_id]
+            if property_id not in prices or price < prices[property_id]:
+                prices[property_id] = price
+
+    return [
+        PropertySearchProjection(
+            property_id=property_id,
+            name=name,
+            status=status,
+            property_type_id=property_type_id,
+            property_category_id=property_category_id,
+            city=fold(city or '')[:100],
+            country=fold(country or '')[:100],
+            rating=rating,
+            total_reviews=total_reviews,
+            amenity_mask=masks.get(property_id, 0),
+            max_guests=capacities.get(property_id, 0),
+            from_price=prices.get(property_id),
+            price_window_start=today,
+            created_at=created_at,
+        )
+        for property_id, name, status, property_type_id, property_category_id, city, country,
+        rating, total_reviews, created_at in Property.objects.filter(
+            id__in=property_ids
+        ).order_by().values_list(
+            'id', 'name', 'status', 'property_type_id', 'property_category_id',
+            'address__city', 'address__country', 'rating', 'total_reviews', 'created_at'
+        )
+    ]
+
+
+def refresh_properties(property_ids, today=None):
+    """
+    Recalculer la projection de ces propriétés (upsert).
+
+    Les propriétés supprimées n'ont rien à faire : leur ligne est supprimée
+    en cascade. Retourne le nombre de lignes écrites.
+    """
+    projections = build_projections(property_ids, today)
+    PropertySearchProjection.objects.bulk_create(
+        projections,
+        **upsert_options(PropertySearchProjection, ['property'], UPDATE_FIELDS)
+    )
+    return len(projections)
+
+
+def refresh_all(batch_size=BATCH_SIZE, today=None, progress=None):
+    """
+    Recalculer toute la projection par lots de `batch_size` propriétés.
+
+    `progress(done, total)` est appelé après chaque lot. Retourne les
+    compteurs du passage : properties, missing (propriétés qui n'avaient pas
+    de ligne) et seconds.
+    """
+    started = time.perf_counter()
+    property_ids = list(Property.objects.order_by('id').values_list('id', flat=True))
+    missing = len(property_ids) - PropertySearchProjection.objects.count()
+    written = 0
+    for start in range(0, len(property_ids), batch_size):
+        written += refresh_properties(property_ids[start:start + batch_size], today)
+        if progress is not None:
+            progress(min(start + batch_size, len(property_ids)), len(property_ids))
+    return {
+        'properties': written,
+        'missing': max(missing, 0),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+# ============================================================================
+# RECALCUL À LA VALIDATION DES TRANSACTIONS
+# ============================================================================
+
+_pending = threading.local()
+
+
+def schedule_refresh(property_ids):
+    """
+    Recalculer ces propriétés à la validation de la transaction en cours.
+
+    Les propriétés signalées pendant une même transaction sont recalculées
+    ensemble, par un seul rappel on_commit.
+    """
+    if not projection_enabled():
+        return
+    pending = getattr(_pending, 'ids', None)
+    # Rappel déjà enregistré pour cette transaction ? (une transaction
+    # annulée retire ses rappels : on en enregistre alors un nouveau)
+    connection = transaction.get_connection()
+    queued = (
+        pending is not None
+        and connection.in_atomic_block
+        and any(entry[1] is _flush for entry in connection.run_on_commit)
+    )
+    if pending is None:
+        pending = _pending.ids = set()
+    pending.update(pk for pk in property_ids if pk is not None)
+    if not queued:
+        transaction.on_commit(_flush)
+
+
+def _flush():
+    property_ids = getattr(_pending, 'ids', None)
+    _pending.ids = None
+    if property_ids:
+        refresh_properties(property_ids)
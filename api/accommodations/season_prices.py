@@ -0,0 +1,223 @@
+"""
+Report des saisons RoomPricing dans le prix des nuits (RoomAvailability.price).
+
+Pour chaque chambre, les saisons sont compilées en intervalles disjoints
+[début, fin) → prix, la priorité étant celle des devis (pricing.py : peak >
+high > medium > low, puis la saison la plus courte). Le prix effectif est
+ensuite écrit par lots sur les nuits de [aujourd'hui, aujourd'hui +
+ROOM_SEASON_PRICE_HORIZON_DAYS) :
+- seules les nuits sans prix ou dont le prix vient déjà d'une saison
+  (price_from_season) sont écrites : un prix saisi à la main est gardé ;
+- une nuit dont la saison a disparu perd son prix de saison ;
+- les nuits absentes du calendrier ne sont créées qu'avec create_missing
+  (une nuit sans ligne n'est pas ouverte à la recherche).
+
+Le report est incrémental : RoomSeasonPriceState garde par chambre
+l'empreinte des saisons reportées et la fin de l'horizon écrit. Une chambre
+dont les saisons n'ont pas changé n'écrit que les nuits entrées dans
+l'horizon depuis le passage précédent. Les écritures passent par
+calendar_bulk.calendar_changed() (index, projection, stock et cache de
+recherche).
+
+Stockage par plages (ROOM_AVAILABILITY_STORAGE = 'ranges') : non pris en
+charge, les devis y résolvent les saisons à la volée.
+"""
+import hashlib
+import heapq
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from nomade_api.upsert import upsert_options
+
+from .models import Room, RoomAvailability, RoomPricing, RoomSeasonPriceState
+from .availability_ranges import ranges_enabled
+from .calendar_bulk import calendar_changed, upsert_night_prices
+from .pricing import _season_priority
+
+
+BATCH_SIZE = 500
+
+
+def season_price_horizon(today=None):
+    """Nuits à tenir à jour : [aujourd'hui, aujourd'hui + horizon)"""
+    today = today or timezone.localdate()
+    return today, today + timedelta(days=getattr(settings, 'ROOM_SEASON_PRICE_HORIZON_DAYS', 365))
+
+
+# ============================================================================
+# COMPILATION DES SAISONS
+# ============================================================================
+
+def compile_seasons(pricings, date_from, date_to):
+    """
+    Intervalles disjoints (début, fin exclue, prix) des saisons sur
+    [date_from, date_to), triés par date.
+
+    `pricings` : tuples (id, base_price, currency, season_type, start_date,
+    end_date). Balayage des bornes avec un tas des saisons ouvertes : la plus
+    prioritaire est au sommet, les saisons terminées sont retirées au fil de
+    l'eau. Deux intervalles contigus de même prix sont fusionnés.
+    """
+    events = []
+    for index, pricing in enumerate(pricings):
+        _, base_price, _, _, start_date, end_date = pricing
+        start = max(start_date or date_from, date_from)
+        end = min(end_date + timedelta(days=1) if end_date else date_to, date_to)
+        if start < end:
+            level, span = _season_priority(pricing)
+            # À priorité égale, la dernière saison lue l'emporte (comme pricing.py)
+            events.append((start, end, (-level, -span, -index), base_price))
+    if not events:
+        return []
+    events.sort(key=lambda event: event[0])
+    boundaries = sorted({start for start, _, _, _ in events} | {end for _, end, _, _ in events})
+
+    intervals = []
+    active = []
+    position = 0
+    for left, right in zip(boundaries, boundaries[1:]):
+        while position < len(events) and events[position][0] <= left:
+            start, end, rank, price = events[position]
+            heapq.heappush(active, (rank, end, price))
+            position += 1
+        while active and active[0][1] <= left:
+            heapq.heappop(active)
+        if not active:
+            continue
+        price = active[0][2]
+        if intervals and intervals[-1][1] == left and intervals[-1][2] == price:
+            intervals[-1] = (intervals[-1][0], right, price)
+        else:
+            intervals.append((left, right, price))
+    return intervals
+
+
+def fingerprint(pricings):
+    """Empreinte des saisons d'une chambre (ordre indifférent)"""
+    content = '|'.join(sorted(
+        f'{pricing_id}:{base_price}:{season_type}:{start_date}:{end_date}'
+        for pricing_id, base_price, _, season_type, start_date, end_date in pricings
+    ))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _nightly_prices(intervals, date_from, date_to):
+    """{nuit: prix} des nuits de [date_from, date_to) couvertes par une saison"""
+    prices = {}
+    for start, end, price in intervals:
+        night = max(start, date_from)
+        while night < min(end, date_to):
+            prices[night] = price
+            night += timedelta(days=1)
+    return prices
+
+
+# ============================================================================
+# ÉCRITURE
+# ============================================================================
+
+def _materialize_batch(room_ids, full, create_missing, today):
+    """Reporter les saisons d'un lot de chambres ; retourne (chambres écrites, nuits écrites)"""
+    horizon_start, horizon_end = season_price_horizon(today)
+    pricings = {}
+    for pricing in RoomPricing.objects.filter(room_id__in=room_ids).order_by().values_list(
+        'room_id', 'id', 'base_price', 'currency', 'season_type', 'start_date', 'end_date'
+    ):
+        pricings.setdefault(pricing[0], []).append(pricing[1:])
+    states = {state.room_id: state for state in RoomSeasonPriceState.objects.filter(room_id__in=room_ids)}
+
+    # Nuits à écrire par chambre
+    windows = {}
+    fingerprints = {}
+    for room_id in room_ids:
+        fingerprints[room_id] = fingerprint(pricings.get(room_id, []))
+        state = states.get(room_id)
+        if full or state is None or state.pricing_fingerprint != fingerprints[room_id]:
+            windows[room_id] = (horizon_start, horizon_end)
+        elif state.horizon_end < horizon_end:
+            windows[room_id] = (max(state.horizon_end, horizon_start), horizon_end)
+    if not windows:
+        return 0, 0
+
+    date_from = min(start for start, _ in windows.values())
+    rows = []
+    with transaction.atomic():
+        existing = {}
+        for room_id, night, price, from_season in RoomAvailability.objects.select_for_update().filter(
+            room_id__in=list(windows), date__gte=date_from, date__lt=horizon_end
+        ).order_by('room_id', 'date').values_list('room_id', 'date', 'price', 'price_from_season'):
+            existing[(room_id, night)] = (price, from_season)
+
+        for room_id, (start, end) in windows.items():
+            season_prices = _nightly_prices(
+                compile_seasons(pricings.get(room_id, []), start, end), start, end
+            )
+            night = start
+            while night < end:
+                season_price = season_prices.get(night)
+                current = existing.get((room_id, night))
+                if current is None:
+                    if create_missing and season_price is not None:
+                        rows.append((room_id, night, season_price, True))
+                elif current[0] is None or current[1]:
+                    target = (season_price, season_price is not None)
+                    if (current[0], current[1]) != target:
+                        rows.append((room_id, night) + target)
+                night += timedelta(days=1)
+
+        upsert_night_prices(rows)
+        RoomSeasonPriceState.objects.bulk_create(
+            [
+                RoomSeasonPriceState(room_id=room_id, pricing_fingerprint=fingerprints[room_id], horizon_end=horizon_end)
+                for room_id in windows
+            ],
+            **upsert_options(
+                RoomSeasonPriceState, ['room'], ['pricing_fingerprint', 'horizon_end', 'materialized_at']
+            )
+        )
+        written_rooms = {room_id for room_id, _, _, _ in rows}
+        if written_rooms:
+            calendar_changed(written_rooms, date_from, horizon_end)
+    return len(windows), len(rows)
+
+
+def materialize(room_ids=None, full=False, create_missing=False, batch_size=BATCH_SIZE,
+                today=None, progress=None):
+    """
+    Reporter les saisons dans le calendrier des chambres (toutes par défaut).
+
+    full=True réécrit tout l'horizon de chaque chambre, même si ses saisons
+    n'ont pas changé. `progress(done, total)` est appelé après chaque lot.
+    Retourne rooms (chambres examinées), rooms_materialized, rows (nuits
+    écrites), seconds et rows_per_second.
+    """
+    if ranges_enabled():
+        raise ValueError(
+            "Le report des saisons n'est pas disponible avec le stockage par plages"
+        )
+    started = time.perf_counter()
+    if room_ids is None:
+        room_ids = list(Room.objects.order_by('id').values_list('id', flat=True))
+    else:
+        room_ids = list(Room.objects.filter(id__in=list(room_ids)).order_by('id').values_list('id', flat=True))
+
+    materialized = written = 0
+    for start in range(0, len(room_ids), batch_size):
+        rooms, rows = _materialize_batch(room_ids[start:start + batch_size], full, create_missing, today)
+        materialized += rooms
+        written += rows
+        if progress is not None:
+            progress(min(start + batch_size, len(room_ids)), len(room_ids))
+
+    seconds = time.perf_counter() - started
+    return {
+        'rooms': len(room_ids),
+        'rooms_materialized': materialized,
+        'rows': written,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(written / seconds) if seconds else written,
+    }
@@ -3,10 +3,23 @@ from .models import (
     PropertyType, PropertyCategory, PropertyAddress, Property,
     PropertyAmenity, PropertyAmenityLink, PropertyImage, PropertyDescription,
     RoomType, Room, RoomAmenity, RoomAmenityLink,
-    RoomAvailability, RoomPricing
+    RoomAvailability, RoomPricing, RoomAvailabilityRange
 )
 
 
+def annotated_count(obj, annotation, related_name):
+    """
+    Compteur annoté par le queryset du viewset (Count ou sous-requête).
+
+    Repli sur un COUNT par objet quand l'annotation est absente (objet
+    imbriqué, réponse d'une création ou d'une modification).
+    """
+    value = getattr(obj, annotation, None)
+    if value is None:
+        return getattr(obj, related_name).count()
+    return value
+
+
 # ============================================================================
 # PROPERTY TYPES
 # ============================================================================
@@ -21,7 +34,7 @@ class PropertyTypeSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_properties_count(self, obj):
-        return obj.properties.count()
+        return annotated_count(obj, 'properties_count', 'properties')
 
 
 # ============================================================================
@@ -38,7 +51,7 @@ class PropertyCategorySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_properties_count(self, obj):
-        return obj.properties.count()
+        return annotated_count(obj, 'properties_count', 'properties')
 
 
 # ============================================================================
@@ -58,7 +71,7 @@ class PropertyAddressSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_properties_count(self, obj):
-        return obj.properties.count()
+        return annotated_count(obj, 'properties_count', 'properties')
 
 
 # ============================================================================
@@ -75,7 +88,7 @@ class PropertyAmenitySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_properties_count(self, obj):
-        return obj.property_links.count()
+        return annotated_count(obj, 'properties_count', 'property_links')
 
 
 # ============================================================================
@@ -141,7 +154,7 @@ class RoomTypeSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_rooms_count(self, obj):
-        return obj.rooms.count()
+        return annotated_count(obj, 'rooms_count', 'rooms')
 
 
 # ============================================================================
@@ -158,7 +171,7 @@ class RoomAmenitySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_rooms_count(self, obj):
-        return obj.room_links.count()
+        return annotated_count(obj, 'rooms_count', 'room_links')
 
 
 # ============================================================================
@@ -189,9 +202,72 @@ class RoomAvailabilitySerializer(serializers.ModelSerializer):
         model = RoomAvailability
         fields = [
             'id', 'room', 'room_name', 'property_name', 'date',
-            'available', 'price', 'created_at', 'updated_at'
+            'available', 'price', 'price_from_season', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'price_from_season', 'created_at', 'updated_at']
+    
+    def update(self, instance, validated_data):
+        # Un prix saisi remplace le prix de saison (voir season_prices.py)
+        if 'price' in validated_data:
+            validated_data['price_from_season'] = False
+        return super().update(instance, validated_data)
+
+
+class RoomAvailabilityBulkRangeSerializer(serializers.Serializer):
+    """Plage de nuits [date_from, date_to] (incluses) appliquée à plusieurs chambres"""
+    room_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=500
+    )
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    available = serializers.BooleanField(required=False)
+    price = serializers.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        min_value=0,
+        required=False,
+        allow_null=True
+    )
+    
+    def validate(self, attrs):
+        if attrs['date_to'] < attrs['date_from']:
+            raise serializers.ValidationError('date_to doit être postérieure ou égale à date_from.')
+        if 'available' not in attrs and 'price' not in attrs:
+            raise serializers.ValidationError('available ou price est requis.')
+        attrs['room_ids'] = list(dict.fromkeys(attrs['room_ids']))
+        return attrs
+
+
+class RoomAvailabilityBulkUpsertSerializer(serializers.Serializer):
+    """Mise à jour en masse du calendrier (flux channel manager)"""
+    ranges = RoomAvailabilityBulkRangeSerializer(many=True, allow_empty=False)
+
+
+class RoomAvailabilityRangeSerializer(serializers.ModelSerializer):
+    """Serializer pour RoomAvailabilityRange"""
+    room_name = serializers.CharField(source='room.name', read_only=True)
+    property_name = serializers.CharField(source='room.property.name', read_only=True)
+    nights = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = RoomAvailabilityRange
+        fields = [
+            'id', 'room', 'room_name', 'property_name', 'start_date', 'end_date',
+            'nights', 'available', 'price', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    def get_nights(self, obj):
+        return (obj.end_date - obj.start_date).days
+    
+    def validate(self, attrs):
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date and end_date and end_date <= start_date:
+            raise serializers.ValidationError('end_date doit être après start_date (première nuit non incluse).')
+        return attrs
 
 
 # ============================================================================
@@ -239,10 +315,10 @@ class RoomSerializer(serializers.ModelSerializer):
         return [link.amenity.name for link in obj.amenity_links.all()]
     
     def get_availabilities_count(self, obj):
-        return obj.availabilities.count()
+        return annotated_count(obj, 'availabilities_count', 'availabilities')
     
     def get_pricings_count(self, obj):
-        return obj.pricings.count()
+        return annotated_count(obj, 'pricings_count', 'pricings')
 
 
 # ============================================================================
@@ -270,11 +346,15 @@ class PropertyListSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def get_main_image(self, obj):
-        main_image = obj.images.filter(image_type='main').first()
+        # Prefetch('images', to_attr='main_images') posé par PropertyViewSet
+        if hasattr(obj, 'main_images'):
+            main_image = obj.main_images[0] if obj.main_images else None
+        else:
+            main_image = obj.images.filter(image_type='main').first()
         return main_image.image_url if main_image else None
     
     def get_rooms_count(self, obj):
-        return obj.rooms.count()
+        return annotated_count(obj, 'rooms_count', 'rooms')
 
 
 class PropertyDetailSerializer(serializers.ModelSerializer):
@@ -299,7 +379,7 @@ class PropertyDetailSerializer(serializers.ModelSerializer):
     
     def get_amenities(self, obj):
         amenities = []
-        for link in obj.amenity_links.select_related('amenity').all():
+        for link in obj.amenity_links.all():
             amenities.append({
                 'id': link.amenity.id,
                 'name': link.amenity.name,
@@ -0,0 +1,324 @@
+"""
+Signaux de l'app accommodations.
+
+Les écritures sur Room, RoomAvailability et RoomAvailabilityRange sont
+répercutées sur l'index de disponibilités en mémoire (availability_index) à
+la validation de la transaction. Les écritures qui modifient
+le résultat de PropertyViewSet.search invalident le cache de recherche
+(search_cache). Les écritures sur les propriétés, leurs adresses, types,
+catégories et équipements périment l'index des facettes (facet_index) ;
+celles sur les propriétés, leurs adresses, descriptions et équipements sont
+réindexées dans l'index plein texte (text_index). Les écritures lues par la
+projection de recherche (search_projection) recalculent les propriétés
+touchées à la validation de la transaction, avant l'invalidation du cache de
+recherche. Le stock par type de chambre (inventory) des nuits touchées par
+les écritures sur les chambres, le calendrier et les saisons (anciennes et
+nouvelles dates) est recalculé à la validation de la transaction.
+"""
+from datetime import timedelta
+from functools import lru_cache
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import (
+    PropertyType, PropertyCategory, PropertyAddress, Property, PropertyAmenity,
+    PropertyAmenityLink, PropertyDescription, Room, RoomAvailability, RoomAvailabilityRange,
+    RoomPricing
+)
+from .availability_index import availability_index
+from .availability_ranges import ranges_enabled
+from .calendar_bulk import calendar_changed
+from .facet_index import property_facet_index
+from .text_index import property_text_index
+from .search_projection import schedule_refresh
+from . import inventory, search_cache
+
+
+# ============================================================================
+# INDEX DE DISPONIBILITÉS
+# ============================================================================
+
+# Appliqués à la validation de la transaction : une écriture annulée ne
+# laisse pas de nuit fantôme dans l'index.
+
+def _index_on_commit(update, *args):
+    def apply():
+        if availability_index.built_at is not None:
+            update(*args)
+    transaction.on_commit(apply)
+
+
+@receiver(post_save, sender=Room)
+def index_room_saved(sender, instance, **kwargs):
+    _index_on_commit(
+        availability_index.set_room, instance.id, instance.property_id, instance.max_guests, instance.status
+    )
+
+
+@receiver(post_delete, sender=Room)
+def index_room_deleted(sender, instance, **kwargs):
+    _index_on_commit(availability_index.remove_room, instance.id)
+
+
+@receiver(post_save, sender=RoomAvailability)
+def index_availability_saved(sender, instance, **kwargs):
+    if not ranges_enabled():
+        _index_on_commit(availability_index.set_night, instance.room_id, instance.date, instance.available)
+
+
+@receiver(post_delete, sender=RoomAvailability)
+def index_availability_deleted(sender, instance, **kwargs):
+    if not ranges_enabled():
+        _index_on_commit(availability_index.set_night, instance.room_id, instance.date, None)
+
+
+@receiver(post_save, sender=RoomAvailabilityRange)
+@receiver(post_delete, sender=RoomAvailabilityRange)
+def availability_range_changed(sender, instance, **kwargs):
+    # Index et cache de recherche (bulk_create de write_range : voir l'appelant)
+    calendar_changed([instance.room_id], instance.start_date, instance.end_date)
+
+
+# ============================================================================
+# PROJECTION DE RECHERCHE
+# ============================================================================
+# Receveurs enregistrés avant ceux du cache de recherche : la projection est
+# recalculée avant que les recherches en cache ne soient invalidées.
+
+@receiver(post_save, sender=Property)
+def projection_property_saved(sender, instance, **kwargs):
+    # Une propriété supprimée emporte sa ligne (cascade)
+    schedule_refresh([instance.pk])
+
+
+@receiver(post_save, sender=PropertyAddress)
+def projection_address_saved(sender, instance, created, **kwargs):
+    if not created:
+        schedule_refresh(instance.properties.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=PropertyAmenityLink)
+@receiver(post_delete, sender=PropertyAmenityLink)
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def projection_property_child_changed(sender, instance, **kwargs):
+    schedule_refresh([instance.property_id])
+
+
+@receiver(post_save, sender=RoomAvailability)
+@receiver(post_delete, sender=RoomAvailability)
+@receiver(post_save, sender=RoomPricing)
+@receiver(post_delete, sender=RoomPricing)
+def projection_room_calendar_changed(sender, instance, **kwargs):
+    schedule_refresh([_room_property_id(instance.room_id)])
+
+
+# ============================================================================
+# STOCK PAR TYPE DE CHAMBRE
+# ============================================================================
+
+@receiver(pre_save, sender=Room)
+def inventory_room_pre_save(sender, instance, **kwargs):
+    # Ancien couple (propriété, type) : il perd la chambre si le type change
+    instance._inventory_pair = None
+    if not instance._state.adding:
+        instance._inventory_pair = Room.objects.filter(pk=instance.pk).values_list(
+            'property_id', 'room_type_id'
+        ).first()
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def inventory_room_changed(sender, instance, **kwargs):
+    pairs = {(instance.property_id, instance.room_type_id)}
+    if getattr(instance, '_inventory_pair', None):
+        pairs.add(instance._inventory_pair)
+    inventory.schedule_refresh(pairs=pairs)
+
+
+@receiver(post_save, sender=RoomAvailability)
+@receiver(post_delete, sender=RoomAvailability)
+def inventory_availability_changed(sender, instance, **kwargs):
+    inventory.schedule_refresh([instance.room_id], instance.date, instance.date + timedelta(days=1))
+
+
+def _season_nights(room_id, start_date, end_date):
+    """(chambre, début, fin exclue) d'une saison ; None = bord de l'horizon"""
+    return room_id, start_date, end_date + timedelta(days=1) if end_date else None
+
+
+@receiver(pre_save, sender=RoomPricing)
+def inventory_pricing_pre_save(sender, instance, **kwargs):
+    # Anciennes dates de la saison : leurs nuits changent aussi de prix
+    instance._inventory_season = None
+    if not instance._state.adding:
+        previous = RoomPricing.objects.filter(pk=instance.pk).values_list(
+            'room_id', 'start_date', 'end_date'
+        ).first()
+        if previous:
+            instance._inventory_season = _season_nights(*previous)
+
+
+@receiver(post_save, sender=RoomPricing)
+@receiver(post_delete, sender=RoomPricing)
+def inventory_pricing_changed(sender, instance, **kwargs):
+    seasons = [_season_nights(instance.room_id, instance.start_date, instance.end_date)]
+    if getattr(instance, '_inventory_season', None):
+        seasons.append(instance._inventory_season)
+    for room_id, date_from, date_to in seasons:
+        inventory.schedule_refresh([room_id], date_from, date_to)
+
+
+# ============================================================================
+# CACHE DE RECHERCHE
+# ============================================================================
+# L'invalidation ne porte que sur le cache du processus (LocMem par défaut) ;
+# les lru_cache ci-dessous sont eux aussi propres à chaque worker. Les autres
+# processus voient une écriture au plus tard après le TIMEOUT du cache.
+
+@lru_cache(maxsize=10000)
+def _property_city(property_id):
+    """Ville d'une propriété (None si inconnue)"""
+    return Property.objects.filter(pk=property_id).values_list(
+        'address__city', flat=True
+    ).first()
+
+
+@lru_cache(maxsize=100000)
+def _room_property_id(room_id):
+    return Room.objects.filter(pk=room_id).values_list('property_id', flat=True).first()
+
+
+def _invalidate_property(property_id, dates=None):
+    # Ville inconnue (propriété supprimée, sans adresse) : tout invalider
+    search_cache.invalidate(_property_city(property_id), dates)
+
+
+@receiver(pre_save, sender=Property)
+def search_cache_property_pre_save(sender, instance, **kwargs):
+    if not instance._state.adding:
+        _invalidate_property(instance.pk)
+
+
+@receiver(post_save, sender=Property)
+def search_cache_property_saved(sender, instance, **kwargs):
+    _property_city.cache_clear()
+    _invalidate_property(instance.pk)
+
+
+@receiver(post_delete, sender=Property)
+def search_cache_property_deleted(sender, instance, **kwargs):
+    _property_city.cache_clear()
+    search_cache.invalidate(instance.address.city if instance.address_id else None)
+
+
+@receiver(post_save, sender=PropertyAddress)
+@receiver(post_delete, sender=PropertyAddress)
+def search_cache_address_changed(sender, instance, **kwargs):
+    # Une adresse peut changer de ville : l'ancienne n'est pas connue ici
+    _property_city.cache_clear()
+    search_cache.invalidate(None)
+
+
+@receiver(post_save, sender=PropertyAmenityLink)
+@receiver(post_delete, sender=PropertyAmenityLink)
+def search_cache_amenity_link_changed(sender, instance, **kwargs):
+    _invalidate_property(instance.property_id)
+
+
+@receiver(post_save, sender=PropertyDescription)
+@receiver(post_delete, sender=PropertyDescription)
+def search_cache_description_changed(sender, instance, **kwargs):
+    # Texte lu par le paramètre q
+    _invalidate_property(instance.property_id)
+
+
+@receiver(post_save, sender=PropertyAmenity)
+def search_cache_amenity_changed(sender, instance, created, **kwargs):
+    # Un équipement renommé change le résultat de q dans toutes les villes
+    if not created:
+        search_cache.invalidate(None)
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def search_cache_room_changed(sender, instance, **kwargs):
+    _room_property_id.cache_clear()
+    _invalidate_property(instance.property_id)
+
+
+@receiver(post_save, sender=RoomAvailability)
+@receiver(post_delete, sender=RoomAvailability)
+def search_cache_availability_changed(sender, instance, **kwargs):
+    property_id = _room_property_id(instance.room_id)
+    if property_id is None:
+        search_cache.invalidate(None)
+    else:
+        _invalidate_property(property_id, [instance.date])
+
+
+@receiver(post_save, sender=RoomPricing)
+@receiver(post_delete, sender=RoomPricing)
+def search_cache_pricing_changed(sender, instance, **kwargs):
+    # Prix de saison : ordering=price et prix d'appel, toutes dates confondues
+    property_id = _room_property_id(instance.room_id)
+    if property_id is None:
+        search_cache.invalidate(None)
+    else:
+        _invalidate_property(property_id)
+
+
+# ============================================================================
+# INDEX DES FACETTES
+# ============================================================================
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+@receiver(post_save, sender=PropertyAddress)
+@receiver(post_delete, sender=PropertyAddress)
+@receiver(post_save, sender=PropertyType)
+@receiver(post_delete, sender=PropertyType)
+@receiver(post_save, sender=PropertyCategory)
+@receiver(post_delete, sender=PropertyCategory)
+@receiver(post_save, sender=PropertyAmenity)
+@receiver(post_delete, sender=PropertyAmenity)
+@receiver(post_save, sender=PropertyAmenityLink)
+@receiver(post_delete, sender=PropertyAmenityLink)
+def facet_index_changed(sender, **kwargs):
+    property_facet_index.dirty = True
+
+
+# ============================================================================
+# INDEX PLEIN TEXTE
+# ============================================================================
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def text_index_property_changed(sender, instance, **kwargs):
+    property_text_index.reindex_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=PropertyDescription)
+@receiver(post_delete, sender=PropertyDescription)
+@receiver(post_save, sender=PropertyAmenityLink)
+@receiver(post_delete, sender=PropertyAmenityLink)
+def text_index_property_text_changed(sender, instance, **kwargs):
+    property_text_index.reindex_on_commit([instance.property_id])
+
+
+@receiver(post_save, sender=PropertyAddress)
+def text_index_address_changed(sender, instance, created, **kwargs):
+    if not created and property_text_index.built_at is not None:
+        property_text_index.reindex_on_commit(
+            instance.properties.values_list('id', flat=True)
+        )
+
+
+@receiver(post_save, sender=PropertyAmenity)
+def text_index_amenity_changed(sender, instance, created, **kwargs):
+    if not created and property_text_index.built_at is not None:
+        property_text_index.reindex_on_commit(
+            instance.property_links.values_list('property_id', flat=True)
+        )
@@ -1,3 +1,1032 @@
-from django.test import TestCase
+import json
+import uuid
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from bookings.models import Booking, BookingItem, BookingRoom, BookingStatus
+from nomade_api.geo import GeoIndex, nearby
+
+from .models import (
+    PropertyType, PropertyCategory, PropertyAddress, Property,
+    PropertyAmenity, PropertyAmenityLink, PropertyImage, PropertyDescription,
+    RoomType, Room, RoomAmenity, RoomAmenityLink, RoomAvailability, RoomAvailabilityRange,
+    RoomPricing, PropertySearchProjection, RoomTypeInventory
+)
+from .availability_index import RoomAvailabilityIndex
+from .availability_ranges import write_range
+from .facet_index import PropertyFacetIndex
+from .search_cache import (
+    get_cache as get_search_cache, invalidate as invalidate_searches, make_key as search_cache_key
+)
+from .search_projection import refresh_all
+from .party_allocation import allocate
+from .pricing import quote_properties, quote_rooms
+from .season_prices import compile_seasons, materialize
+from .text_index import PropertyTextIndex, query_terms
+from .views import RoomAvailabilityViewSet
+
+
+# ============================================================================
+# DISPONIBILITÉ D'UN SÉJOUR
+# ============================================================================
+
+class StayAvailabilityTests(TestCase):
+    """Une nuit n'est réservable qu'avec une ligne available=True"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.night = date(2027, 3, 1)
+        property_obj = Property.objects.create(name='Hôtel')
+        self.open_room = Room.objects.create(property=property_obj, name='Ouverte')
+        self.partial_room = Room.objects.create(property=property_obj, name='Sans ligne')
+        self.closed_room = Room.objects.create(property=property_obj, name='Fermée')
+        for offset in range(2):
+            night = self.night + timedelta(days=offset)
+            RoomAvailability.objects.create(room=self.open_room, date=night)
+            RoomAvailability.objects.create(room=self.closed_room, date=night, available=offset == 1)
+        RoomAvailability.objects.create(room=self.partial_room, date=self.night)
+
+    def test_batch_reports_closed_and_missing_nights(self):
+        rooms = [self.open_room, self.partial_room, self.closed_room]
+        response = self.client.get('/api/accommodations/room-availability/check_availability_batch/', {
+            'room_ids': ','.join(str(room.id) for room in rooms),
+            'check_in': '2027-03-01',
+            'check_out': '2027-03-03',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {item['room_id']: (item['available'], item['unavailable_dates']) for item in response.data['rooms']},
+            {
+                str(self.open_room.id): (True, []),
+                str(self.partial_room.id): (False, ['2027-03-02']),
+                str(self.closed_room.id): (False, ['2027-03-01']),
+            }
+        )
+
+    def test_batch_rejects_too_many_rooms(self):
+        room_ids = [str(self.open_room.id)] * (RoomAvailabilityViewSet.MAX_BATCH_ROOMS + 1)
+        response = self.client.get('/api/accommodations/room-availability/check_availability_batch/', {
+            'room_ids': ','.join(room_ids), 'check_in': '2027-03-01', 'check_out': '2027-03-03',
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+# ============================================================================
+# RECHERCHE PAR NUIT DU SÉJOUR
+# ============================================================================
+
+class StaySearchTests(TestCase):
+    """La recherche ne garde que les chambres ouvertes toutes les nuits du séjour"""
+
+    def setUp(self):
+        self.client = APIClient()
+        get_search_cache().clear()
+        self.check_in = date(2027, 4, 1)
+
+    def create_property(self, name, nights, max_guests=2, closed=()):
+        address = PropertyAddress.objects.create(city='Cannes', country='France')
+        property_obj = Property.objects.create(name=name, address=address)
+        room = Room.objects.create(property=property_obj, name='Chambre', max_guests=max_guests)
+        for offset in nights:
+            RoomAvailability.objects.create(
+                room=room, date=self.check_in + timedelta(days=offset), available=offset not in closed
+            )
+        return property_obj
+
+    def test_every_night_must_be_open(self):
+        self.create_property('Complet', nights=[0, 1, 2])
+        self.create_property('Nuit manquante', nights=[0, 2])
+        self.create_property('Nuit fermée', nights=[0, 1, 2], closed=[1])
+        self.create_property('Trop petit', nights=[0, 1, 2], max_guests=1)
+        refresh_all()
+
+        response = self.client.get('/api/accommodations/properties/search/', {
+            'city': 'cannes', 'check_in': '2027-04-01', 'check_out': '2027-04-04', 'guests': 2
+        })
+        self.assertEqual([item['name'] for item in response.data['results']], ['Complet'])
+
+        # Le séjour d'une nuit ne dépend que de la première nuit
+        response = self.client.get('/api/accommodations/properties/search/', {
+            'city': 'cannes', 'check_in': '2027-04-01', 'check_out': '2027-04-02', 'guests': 2, 'ordering': 'name'
+        })
+        self.assertEqual(
+            [item['name'] for item in response.data['results']], ['Complet', 'Nuit fermée', 'Nuit manquante']
+        )
+
+
+# ============================================================================
+# INDEX DE DISPONIBILITÉS EN MÉMOIRE
+# ============================================================================
+
+class AvailabilityIndexTests(TestCase):
+    """Bitmaps par chambre : masque du séjour, nuits ouvertes et écritures validées"""
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.property = Property.objects.create(name='Hôtel')
+        self.room = Room.objects.create(property=self.property, name='Chambre', max_guests=2)
+        for offset in (1, 2, 3):
+            RoomAvailability.objects.create(room=self.room, date=self.today + timedelta(days=offset))
+        self.index = RoomAvailabilityIndex(horizon_days=30)
+        self.index.rebuild()
+
+    def night(self, offset):
+        return self.today + timedelta(days=offset)
+
+    def test_stay_mask(self):
+        self.assertEqual(self.index.stay_mask(self.night(1), self.night(3)), 0b110)
+        self.assertEqual(self.index.stay_mask(self.today, self.night(1)), 0b1)
+        self.assertIsNone(self.index.stay_mask(self.night(-1), self.night(1)))
+        self.assertIsNone(self.index.stay_mask(self.night(29), self.night(31)))
+
+    def test_available_property_ids_and_set_night(self):
+        stay = (self.night(1), self.night(4))
+        self.assertEqual(self.index.available_property_ids(*stay), [self.property.id])
+        self.assertEqual(self.index.available_property_ids(*stay, guests=3), [])
+        self.assertEqual(self.index.available_property_ids(self.today, self.night(2)), [])
+
+        self.index.set_night(self.room.id, self.night(2), False)
+        self.assertEqual(self.index.available_property_ids(*stay), [])
+        self.assertEqual(self.index.unavailable_dates(self.room.id, *stay), [self.night(2)])
+        self.index.set_night(self.room.id, self.night(2), None)
+        self.assertEqual(self.index.available_property_ids(*stay), [])
+        self.index.set_night(self.room.id, str(self.night(2)), True)
+        self.assertEqual(self.index.available_property_ids(*stay), [self.property.id])
+
+    def test_signals_apply_only_committed_writes(self):
+        stay = (self.night(4), self.night(5))
+        with mock.patch('accommodations.signals.availability_index', self.index):
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        RoomAvailability.objects.create(room=self.room, date=self.night(4))
+                        raise IntegrityError
+                except IntegrityError:
+                    pass
+            self.assertEqual(self.index.available_property_ids(*stay), [])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                RoomAvailability.objects.create(room=self.room, date=self.night(4))
+            self.assertEqual(self.index.available_property_ids(*stay), [self.property.id])
+
+
+# ============================================================================
+# CACHE DE LA RECHERCHE
+# ============================================================================
+
+class SearchCacheTests(TestCase):
+    """Une écriture n'invalide que les recherches de sa ville (et de ses mois)"""
+
+    def setUp(self):
+        self.client = APIClient()
+        get_search_cache().clear()
+
+    def invalidate(self, city, dates=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_searches(city, dates)
+
+    def test_invalidation_scopes(self):
+        params = {'city': 'nice', 'check_in': '2027-05-01', 'check_out': '2027-05-03'}
+        key = search_cache_key(params)
+
+        self.invalidate('Lyon')
+        self.invalidate('Nice', [date(2027, 6, 1)])
+        self.assertEqual(search_cache_key(params), key)
+
+        self.invalidate('NICE', [date(2027, 5, 2)])
+        key, previous = search_cache_key(params), key
+        self.assertNotEqual(key, previous)
+
+        self.invalidate('Nice')
+        key, previous = search_cache_key(params), key
+        self.assertNotEqual(key, previous)
+
+        self.invalidate(None)
+        self.assertNotEqual(search_cache_key(params), key)
+
+    def test_season_price_change_invalidates_price_ordering(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, price in (('A', 100), ('B', 200)):
+                address = PropertyAddress.objects.create(city='Arles', country='France')
+                property_obj = Property.objects.create(name=name, address=address)
+                room = Room.objects.create(property=property_obj, name='Chambre')
+                RoomPricing.objects.create(room=room, base_price=price)
+        params = {'city': 'arles', 'ordering': 'price'}
+        response = self.client.get('/api/accommodations/properties/search/', params)
+        self.assertEqual([item['name'] for item in response.data['results']], ['A', 'B'])
+
+        season = RoomPricing.objects.get(room__property__name='A')
+        season.base_price = 300
+        with self.captureOnCommitCallbacks(execute=True):
+            season.save()
+        response = self.client.get('/api/accommodations/properties/search/', params)
+        self.assertEqual([item['name'] for item in response.data['results']], ['B', 'A'])
+
+
+# ============================================================================
+# RECHERCHE DE PROXIMITÉ
+# ============================================================================
+
+class NearbyTests(TestCase):
+    """Distances de haversine sur l'index géographique partagé"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def create_address(self, city, latitude, longitude):
+        return PropertyAddress.objects.create(city=city, country='France', latitude=latitude, longitude=longitude)
+
+    def test_nearby_orders_by_distance_within_radius(self):
+        self.create_address('Versailles', '48.8049', '2.1204')
+        self.create_address('Paris', '48.8566', '2.3522')
+        self.create_address('Lyon', '45.7640', '4.8357')
+        self.create_address('Sans coordonnées', None, None)
+
+        response = self.client.get('/api/accommodations/property-addresses/nearby/', {
+            'latitude': 48.85, 'longitude': 2.35, 'radius': 25
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['city'] for item in response.data], ['Paris', 'Versailles'])
+        self.assertLess(response.data[0]['distance_km'], 1)
+        self.assertAlmostEqual(response.data[1]['distance_km'], 17.4, delta=0.5)
+
+        results = nearby(PropertyAddress.objects.exclude(city='Paris'), 48.85, 2.35, 25, limit=1)
+        self.assertEqual([address.city for address, _ in results], ['Versailles'])
+
+    def test_antimeridian_and_snapshot(self):
+        east = self.create_address('Est', '0', '179.95')
+        west = self.create_address('Ouest', '0', '-179.95')
+        index = GeoIndex(PropertyAddress).rebuild()
+
+        self.assertEqual([pk for pk, _ in index.query(0, 179.99, 20)], [east.pk, west.pk])
+        pks, lats, lons, cos_lats = index.points
+        self.assertEqual((len(pks), len(lats), len(lons), len(cos_lats)), (2, 2, 2, 2))
+
+
+# ============================================================================
+# MISE À JOUR DU CALENDRIER EN MASSE
+# ============================================================================
+
+class CalendarBulkUpsertTests(TestCase):
+    """bulk_upsert crée les nuits absentes et ne modifie que les champs fournis"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(email='manager@example.com', password='secret')
+        )
+        self.room = Room.objects.create(property=Property.objects.create(name='Hôtel'), name='Chambre')
+        self.first = date(2027, 6, 1)
+
+    def night(self, offset):
+        return RoomAvailability.objects.get(room=self.room, date=self.first + timedelta(days=offset))
+
+    def upsert(self, date_from, date_to, **values):
+        return self.client.post('/api/accommodations/room-availability/bulk_upsert/', {'ranges': [{
+            'room_ids': [str(self.room.id)], 'date_from': str(date_from), 'date_to': str(date_to), **values
+        }]}, format='json')
+
+    def test_upsert_over_existing_nights(self):
+        RoomAvailability.objects.create(room=self.room, date=self.first, price=100)
+        RoomAvailability.objects.create(
+            room=self.room, date=self.first + timedelta(days=1), price=80, price_from_season=True
+        )
+        RoomAvailability.objects.create(room=self.room, date=self.first + timedelta(days=2), available=False)
+
+        response = self.upsert(self.first, self.first + timedelta(days=3), price=150)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 3))
+        self.assertEqual(
+            [(self.night(i).available, self.night(i).price, self.night(i).price_from_season) for i in range(4)],
+            [(True, 150, False), (True, 150, False), (False, 150, False), (True, 150, False)]
+        )
+
+        response = self.upsert(self.first, self.first + timedelta(days=1), available=False)
+        self.assertEqual((response.data['created'], response.data['updated']), (0, 2))
+        self.assertEqual(
+            [(self.night(i).available, self.night(i).price) for i in range(3)],
+            [(False, 150), (False, 150), (False, 150)]
+        )
+        self.assertEqual(RoomAvailability.objects.filter(room=self.room).count(), 4)
+
+    def test_too_many_nights_are_rejected(self):
+        with mock.patch.object(RoomAvailabilityViewSet, 'MAX_BULK_NIGHTS', 3):
+            response = self.upsert(self.first, self.first + timedelta(days=3), available=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Maximum 3 nuits', response.data['error'])
+        self.assertFalse(RoomAvailability.objects.exists())
+
+
+# ============================================================================
+# STOCKAGE DU CALENDRIER PAR PLAGES
+# ============================================================================
+
+@override_settings(ROOM_AVAILABILITY_STORAGE='ranges')
+class AvailabilityRangeTests(TestCase):
+    """Découpage et fusion des plages, nuits développées et écritures par nuit refusées"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.room = Room.objects.create(property=Property.objects.create(name='Hôtel'), name='Chambre')
+        self.first = date(2027, 7, 1)
+
+    def day(self, offset):
+        return self.first + timedelta(days=offset)
+
+    def ranges(self):
+        return list(RoomAvailabilityRange.objects.filter(room=self.room).order_by('start_date').values_list(
+            'start_date', 'end_date', 'available', 'price'
+        ))
+
+    def test_write_range_splits_and_merges(self):
+        write_range(self.room.id, self.day(0), self.day(9), price=100)
+        write_range(self.room.id, self.day(3), self.day(5), price=120)
+        self.assertEqual(self.ranges(), [
+            (self.day(0), self.day(3), True, 100),
+            (self.day(3), self.day(5), True, 120),
+            (self.day(5), self.day(9), True, 100),
+        ])
+
+        write_range(self.room.id, self.day(3), self.day(5), price=100)
+        self.assertEqual(self.ranges(), [(self.day(0), self.day(9), True, 100)])
+
+        write_range(self.room.id, self.day(8), self.day(9), clear=True)
+        self.assertEqual(self.ranges(), [(self.day(0), self.day(8), True, 100)])
+
+    def test_nights_have_stable_unique_uuids(self):
+        write_range(self.room.id, self.day(0), self.day(3), price=100)
+        params = {'room_id': str(self.room.id), 'date_from': str(self.day(0)), 'date_to': str(self.day(2))}
+
+        response = self.client.get('/api/accommodations/room-availability-ranges/nights/', params)
+        nights = response.data['results'] if isinstance(response.data, dict) else response.data
+        ids = [night['id'] for night in nights]
+        self.assertEqual([night['date'] for night in nights], [str(self.day(i)) for i in range(3)])
+        self.assertEqual(len(set(ids)), 3)
+        for night_id in ids:
+            uuid.UUID(str(night_id))
+
+        response = self.client.get('/api/accommodations/room-availability-ranges/nights/', params)
+        nights = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([night['id'] for night in nights], ids)
+
+    def test_daily_writes_are_refused(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(email='manager@example.com', password='secret')
+        )
+        response = self.client.post('/api/accommodations/room-availability/', {
+            'room': str(self.room.id), 'date': str(self.day(0)), 'available': True
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(RoomAvailability.objects.exists())
+
+
+# ============================================================================
+# CALCUL DES DEVIS
+# ============================================================================
+
+class QuoteTests(TestCase):
+    """Prix par nuit (calendrier puis saison), devise de la saison retenue et devis par lot"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.check_in = date(2027, 3, 1)
+        self.check_out = date(2027, 3, 4)
+        self.property = Property.objects.create(name='Hôtel', status='active')
+        self.room = Room.objects.create(property=self.property, name='Double', max_guests=2)
+        self.suite = Room.objects.create(property=self.property, name='Suite', max_guests=2)
+        for room in (self.room, self.suite):
+            for night in range(3):
+                RoomAvailability.objects.create(room=room, date=self.check_in + timedelta(night))
+        RoomPricing.objects.create(room=self.room, base_price=100, currency='EUR', season_type='low')
+        RoomPricing.objects.create(room=self.suite, base_price=200, currency='EUR', season_type='low')
+
+    def test_quote_rooms_prefers_calendar_price_then_season(self):
+        RoomAvailability.objects.filter(room=self.room, date=self.check_in).update(price=80)
+        RoomPricing.objects.create(
+            room=self.room, base_price=150, currency='EUR', season_type='high',
+            start_date=self.check_in + timedelta(2), end_date=self.check_in + timedelta(2)
+        )
+
+        quote = quote_rooms([self.room], self.check_in, self.check_out)[self.room.id]
+        self.assertEqual([night['price'] for night in quote['nights']], [80, 100, 150])
+        self.assertEqual([night['source'] for night in quote['nights']], ['night', 'season', 'season'])
+        self.assertEqual((quote['total'], quote['currency']), (330, 'EUR'))
+        self.assertTrue(quote['complete'] and quote['available'])
+
+    def test_currency_comes_from_the_winning_season(self):
+        RoomPricing.objects.filter(room=self.room).update(currency='USD')
+        RoomPricing.objects.create(room=self.room, base_price=90, currency='EUR', season_type='high')
+
+        quote = quote_rooms([self.room], self.check_in, self.check_out)[self.room.id]
+        self.assertEqual((quote['total'], quote['currency']), (270, 'EUR'))
+        self.assertFalse(quote['mixed_currencies'])
+
+    def test_mixed_currencies_are_flagged_and_skipped(self):
+        RoomPricing.objects.create(
+            room=self.room, base_price=120, currency='USD', season_type='high',
+            start_date=self.check_in, end_date=self.check_in
+        )
+
+        quote = quote_rooms([self.room], self.check_in, self.check_out)[self.room.id]
+        self.assertTrue(quote['mixed_currencies'])
+        self.assertIsNone(quote['currency'])
+        self.assertFalse(quote['complete'])
+        best = quote_properties([self.property.id], self.check_in, self.check_out)[self.property.id]
+        self.assertEqual(best['room_id'], str(self.suite.id))
+
+    def test_quote_properties_picks_cheapest_bookable_room(self):
+        RoomAvailability.objects.filter(room=self.room, date=self.check_in).update(available=False)
+        other = Property.objects.create(name='Sans chambre', status='active')
+
+        best = quote_properties([self.property.id, other.id], self.check_in, self.check_out, guests=2)
+        self.assertEqual((best[self.property.id]['room_id'], best[self.property.id]['total']), (str(self.suite.id), 600))
+        self.assertIsNone(best[other.id])
+        self.assertIsNone(quote_properties([self.property.id], self.check_in, self.check_out, guests=3)[self.property.id])
+
+    def test_quote_batch(self):
+        response = self.client.get('/api/accommodations/properties/quote_batch/', {
+            'property_ids': str(self.property.id), 'check_in': str(self.check_in),
+            'check_out': str(self.check_out), 'include_nights': 'false'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['nights'], 3)
+        [result] = response.data['results']
+        quote = result['quote']
+        self.assertEqual(result['property_id'], str(self.property.id))
+        self.assertEqual((quote['room_id'], quote['total'], quote['currency']), (str(self.room.id), 300, 'EUR'))
+        self.assertNotIn('nights', quote)
+
+        response = self.client.get('/api/accommodations/properties/quote_batch/', {
+            'property_ids': str(self.property.id), 'check_in': str(self.check_out), 'check_out': str(self.check_in)
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+# ============================================================================
+# NOMBRE DE REQUÊTES DES LISTES ET DÉTAILS
+# ============================================================================
+
+class QueryCountTests(TestCase):
+    """Le nombre de requêtes d'une réponse ne dépend pas du nombre d'objets"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.property_type = PropertyType.objects.create(name='Hôtel')
+        cls.property_category = PropertyCategory.objects.create(name='Luxe')
+        cls.room_type = RoomType.objects.create(name='Double')
+        cls.property_amenity = PropertyAmenity.objects.create(name='Piscine')
+        cls.room_amenity = RoomAmenity.objects.create(name='Wifi')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def create_properties(self, count, rooms_per_property=2):
+        properties = []
+        for i in range(count):
+            address = PropertyAddress.objects.create(city=f'Ville {i}', country='France')
+            property_obj = Property.objects.create(
+                name=f'Propriété {i}',
+                property_type=self.property_type,
+                property_category=self.property_category,
+                address=address
+            )
+            PropertyImage.objects.create(
+                property=property_obj, image_url=f'https://img/{i}/gallery.jpg', image_type='gallery'
+            )
+            PropertyImage.objects.create(
+                property=property_obj, image_url=f'https://img/{i}/main.jpg', image_type='main'
+            )
+            PropertyDescription.objects.create(property=property_obj, language='fr', title='Titre')
+            PropertyAmenityLink.objects.create(property=property_obj, amenity=self.property_amenity)
+            for j in range(rooms_per_property):
+                room = Room.objects.create(
+                    property=property_obj, room_type=self.room_type, name=f'Chambre {j}'
+                )
+                RoomAmenityLink.objects.create(room=room, amenity=self.room_amenity)
+                RoomPricing.objects.create(room=room, base_price=100)
+                for night in range(3):
+                    RoomAvailability.objects.create(room=room, date=date(2027, 1, 1) + timedelta(night))
+            properties.append(property_obj)
+        # Les signaux recalculent la projection à la validation, jamais
+        # atteinte dans un TestCase
+        refresh_all()
+        return properties
+
+    def test_property_list_query_count(self):
+        self.create_properties(20)
+        # COUNT et identifiants de la page sur la projection, propriétés (avec
+        # rooms_count), images principales
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/accommodations/properties/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 20)
+        first = response.data['results'][0]
+        self.assertTrue(first['main_image'].endswith('/main.jpg'))
+        self.assertEqual(first['rooms_count'], 2)
+
+    def test_property_list_query_count_with_amenity_filter(self):
+        self.create_properties(5)
+        # + bit de l'équipement
+        with self.assertNumQueries(5):
+            response = self.client.get(
+                '/api/accommodations/properties/', {'amenity_id': str(self.property_amenity.id)}
+            )
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(
+            {item['rooms_count'] for item in response.data['results']}, {2}
+        )
+
+    def test_property_detail_query_count(self):
+        property_obj = self.create_properties(1, rooms_per_property=10)[0]
+        # Propriété, 3 compteurs des objets imbriqués (type, catégorie,
+        # adresse), images, descriptions, équipements (liens + équipements),
+        # chambres (avec compteurs), équipements des chambres (liens + équipements)
+        with self.assertNumQueries(11):
+            response = self.client.get(f'/api/accommodations/properties/{property_obj.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['rooms']), 10)
+        room = response.data['rooms'][0]
+        self.assertEqual(room['amenities'], ['Wifi'])
+        self.assertEqual(room['availabilities_count'], 3)
+        self.assertEqual(room['pricings_count'], 1)
+        self.assertEqual(response.data['amenities'][0]['name'], 'Piscine')
+
+    def test_property_rooms_query_count(self):
+        property_obj = self.create_properties(1, rooms_per_property=10)[0]
+        with self.assertNumQueries(5):
+            response = self.client.get(f'/api/accommodations/properties/{property_obj.id}/rooms/')
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(response.data[0]['property_name'], property_obj.name)
+
+    def test_property_availability_query_count(self):
+        property_obj = self.create_properties(1, rooms_per_property=10)[0]
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                f'/api/accommodations/properties/{property_obj.id}/availability/',
+                {'date_from': '2027-01-02', 'date_to': '2027-01-03'}
+            )
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(len(response.data[0]['availabilities']), 2)
+
+    def test_room_list_query_count(self):
+        self.create_properties(10)
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/accommodations/rooms/')
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(response.data['results'][0]['availabilities_count'], 3)
+
+    def test_count_serializers_use_annotations(self):
+        self.create_properties(5)
+        for url, field, expected in [
+            ('/api/accommodations/property-types/', 'properties_count', 5),
+            ('/api/accommodations/property-categories/', 'properties_count', 5),
+            ('/api/accommodations/property-amenities/', 'properties_count', 5),
+            ('/api/accommodations/room-types/', 'rooms_count', 10),
+            ('/api/accommodations/room-amenities/', 'rooms_count', 10),
+        ]:
+            with self.subTest(url=url), self.assertNumQueries(2):
+                response = self.client.get(url)
+                self.assertEqual(response.data['results'][0][field], expected)
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/accommodations/property-addresses/')
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual({item['properties_count'] for item in response.data['results']}, {1})
+
+
+# ============================================================================
+# MATRICE DE DISPONIBILITÉS
+# ============================================================================
+
+class AvailabilityMatrixTests(TestCase):
+    """Chaque nuit du flux trié arrive dans la ligne de sa chambre"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.first = date(2027, 5, 1)
+        self.property = Property.objects.create(name='Hôtel')
+        self.room_type = RoomType.objects.create(name='Double')
+        self.rooms = sorted(
+            [Room.objects.create(property=self.property, name=f'Chambre {i}', room_type=self.room_type) for i in range(3)],
+            key=lambda room: room.id
+        )
+        # Première chambre : aucune nuit ; deuxième : nuits désordonnées ;
+        # troisième : une nuit hors période
+        RoomAvailability.objects.create(room=self.rooms[1], date=self.first + timedelta(2), available=False)
+        RoomAvailability.objects.create(room=self.rooms[1], date=self.first, price=90)
+        RoomAvailability.objects.create(room=self.rooms[2], date=self.first + timedelta(1), price=110)
+        RoomAvailability.objects.create(room=self.rooms[2], date=self.first + timedelta(5), price=500)
+
+    def matrix(self, **params):
+        response = self.client.get(f'/api/accommodations/properties/{self.property.id}/availability_matrix/', {
+            'date_from': str(self.first), 'date_to': str(self.first + timedelta(2)), **params
+        })
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_nights_are_merged_into_their_room_rows(self):
+        matrix = self.matrix()
+        self.assertEqual(matrix['dates'], [str(self.first + timedelta(i)) for i in range(3)])
+        self.assertEqual([row['room_id'] for row in matrix['rooms']], [str(room.id) for room in self.rooms])
+        self.assertEqual(
+            [(row['available'], row['prices']) for row in matrix['rooms']],
+            [
+                ([None, None, None], [None, None, None]),
+                ([1, None, 0], [90.0, None, None]),
+                ([None, 1, None], [None, 110.0, None]),
+            ]
+        )
+
+    def test_room_type_filter_and_invalid_period(self):
+        other = Room.objects.create(property=self.property, name='Suite')
+        RoomAvailability.objects.create(room=other, date=self.first, price=300)
+        matrix = self.matrix(room_type_id=str(self.room_type.id))
+        self.assertNotIn(str(other.id), [row['room_id'] for row in matrix['rooms']])
+
+        response = self.client.get(f'/api/accommodations/properties/{self.property.id}/availability_matrix/', {
+            'date_from': str(self.first), 'date_to': str(self.first + timedelta(400))
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+# ============================================================================
+# FACETTES DE LA RECHERCHE
+# ============================================================================
+
+class FacetIndexTests(TestCase):
+    """Compteurs de facettes d'une liste d'identifiants, sans requête SQL"""
+
+    @classmethod
+    def setUpTestData(cls):
+        hotel = PropertyType.objects.create(name='Hôtel')
+        camping = PropertyType.objects.create(name='Camping')
+        cls.pool = PropertyAmenity.objects.create(name='Piscine')
+        cls.wifi = PropertyAmenity.objects.create(name='Wifi')
+        nice = PropertyAddress.objects.create(city='Nice', country='FR')
+        lyon = PropertyAddress.objects.create(city='Lyon', country='FR')
+        cls.properties = [
+            Property.objects.create(name='A', property_type=hotel, address=nice, rating=4.6),
+            Property.objects.create(name='B', property_type=hotel, address=nice, rating=3.5),
+            Property.objects.create(name='C', property_type=camping, address=lyon, rating=2),
+            Property.objects.create(name='D', address=lyon),
+        ]
+        for property_obj, amenities in zip(cls.properties, [[cls.pool, cls.wifi], [cls.wifi], [cls.pool], []]):
+            for amenity in amenities:
+                PropertyAmenityLink.objects.create(property=property_obj, amenity=amenity)
+
+    def counts(self, properties):
+        index = PropertyFacetIndex().rebuild()
+        with self.assertNumQueries(0):
+            return index.counts([str(property_obj.id) for property_obj in properties] + [str(uuid.uuid4())])
+
+    def amenity_counts(self, facets):
+        return {facet['name']: facet['count'] for facet in facets['amenities']}
+
+    def test_counts_of_a_small_selection(self):
+        facets = self.counts(self.properties[1:2])
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(self.amenity_counts(facets), {'Wifi': 1})
+        self.assertEqual(facets['cities'], [{'city': 'Nice', 'count': 1}])
+
+    def test_counts_of_a_large_selection(self):
+        # Plus de la moitié des propriétés : les équipements sont comptés par complément
+        facets = self.counts(self.properties[:3] + self.properties[:1])
+        self.assertEqual(facets['total'], 3)
+        self.assertEqual(self.amenity_counts(facets), {'Piscine': 2, 'Wifi': 2})
+        self.assertEqual(
+            [(facet['name'], facet['count']) for facet in facets['property_types']],
+            [('Hôtel', 2), ('Camping', 1)]
+        )
+        self.assertEqual(facets['cities'], [{'city': 'Nice', 'count': 2}, {'city': 'Lyon', 'count': 1}])
+        self.assertEqual(
+            {facet['min_rating']: facet['count'] for facet in facets['rating']},
+            {4.5: 1, 4: 1, 3: 2, 2: 3, 1: 3}
+        )
+
+
+# ============================================================================
+# RECHERCHE PLEIN TEXTE
+# ============================================================================
+
+class TextIndexTests(TestCase):
+    """Tous les termes sont requis ; accents, casse et pluriels sont repliés"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.chateau = Property.objects.create(
+            name='Château de la Mer', address=PropertyAddress.objects.create(city='Nice', country='FR')
+        )
+        PropertyAmenityLink.objects.create(
+            property=cls.chateau, amenity=PropertyAmenity.objects.create(name='Piscine')
+        )
+        PropertyDescription.objects.create(
+            property=cls.chateau, language='fr', description='Des chambres avec vue sur la Côte d\'Azur'
+        )
+        cls.hotel = Property.objects.create(
+            name='Hôtel Œuvre', address=PropertyAddress.objects.create(city='Montréal', country='CA')
+        )
+
+    def search(self, query):
+        return set(PropertyTextIndex().rebuild().search(query_terms(query)))
+
+    def test_accents_case_and_plurals_are_folded(self):
+        self.assertEqual(self.search('CHATEAUX'), {self.chateau.id})
+        self.assertEqual(self.search('cote azur chambre'), {self.chateau.id})
+        self.assertEqual(self.search('hotel oeuvre montreal'), {self.hotel.id})
+
+    def test_every_term_is_required(self):
+        self.assertEqual(self.search('piscine nice'), {self.chateau.id})
+        self.assertEqual(self.search('piscine montreal'), set())
+        self.assertEqual(self.search('la de'), set())
+
+
+# ============================================================================
+# PROJECTION DE RECHERCHE
+# ============================================================================
+
+class SearchProjectionTests(TestCase):
+    """La liste et la recherche filtrent et trient sur la projection"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pool = PropertyAmenity.objects.create(name='Piscine')
+        cls.spa = PropertyAmenity.objects.create(name='Spa')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def create_property(self, name, city, price=None, rating=0, amenities=()):
+        address = PropertyAddress.objects.create(city=city, country='France')
+        property_obj = Property.objects.create(name=name, address=address, rating=rating)
+        for amenity in amenities:
+            PropertyAmenityLink.objects.create(property=property_obj, amenity=amenity)
+        room = Room.objects.create(property=property_obj, name='Chambre', max_guests=4)
+        if price is not None:
+            RoomPricing.objects.create(room=room, base_price=price)
+        return property_obj
+
+    def names(self, response):
+        return [item['name'] for item in response.data['results']]
+
+    def test_signals_refresh_projection_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            property_obj = self.create_property('Hôtel du Lac', 'Évian', price=120, amenities=[self.spa])
+        projection = PropertySearchProjection.objects.get(property=property_obj)
+        self.assertEqual(projection.city, 'evian')
+        self.assertEqual(projection.max_guests, 4)
+        self.assertEqual(projection.from_price, 120)
+        self.assertNotEqual(projection.amenity_mask, 0)
+
+        room = property_obj.rooms.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            RoomAvailability.objects.create(room=room, date=date.today() + timedelta(days=3), price=80)
+        projection.refresh_from_db()
+        self.assertEqual(projection.from_price, 80)
+
+    def test_list_filters_and_orders_by_price(self):
+        self.create_property('A', 'Nice', price=200, amenities=[self.pool])
+        self.create_property('B', 'Nice', price=90, amenities=[self.pool, self.spa])
+        self.create_property('C', 'Lyon', price=150, amenities=[self.spa])
+        self.create_property('D', 'Nice')
+        refresh_all()
+
+        response = self.client.get('/api/accommodations/properties/', {'ordering': 'price'})
+        self.assertEqual(self.names(response), ['B', 'C', 'A', 'D'])
+        response = self.client.get('/api/accommodations/properties/', {'ordering': '-price', 'city': 'NICE'})
+        self.assertEqual(self.names(response), ['A', 'B', 'D'])
+        response = self.client.get(
+            '/api/accommodations/properties/', {'amenity_id': str(self.spa.id), 'ordering': 'name'}
+        )
+        self.assertEqual(self.names(response), ['B', 'C'])
+
+    def test_search_orders_by_price(self):
+        self.create_property('A', 'Nice', price=200, rating=5)
+        self.create_property('B', 'Nice', price=90, rating=3)
+        refresh_all()
+
+        response = self.client.get('/api/accommodations/properties/search/', {'city': 'nice'})
+        self.assertEqual(self.names(response), ['A', 'B'])
+        response = self.client.get('/api/accommodations/properties/search/', {'city': 'nice', 'ordering': 'price'})
+        self.assertEqual(self.names(response), ['B', 'A'])
+
+    def test_accented_city_write_invalidates_cached_search(self):
+        get_search_cache().clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_property('A', 'Montréal', price=100, rating=4)
+            other = self.create_property('B', 'Montréal', price=100, rating=3)
+        response = self.client.get('/api/accommodations/properties/search/', {'city': 'Montreal'})
+        self.assertEqual(self.names(response), ['A', 'B'])
+
+        # La recherche « Montreal » est en cache : une écriture à « Montréal » l'invalide
+        other.rating = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            other.save()
+        response = self.client.get('/api/accommodations/properties/search/', {'city': 'Montreal'})
+        self.assertEqual(self.names(response), ['B', 'A'])
+
+
+# ============================================================================
+# RÉPARTITION D'UN GROUPE DANS PLUSIEURS CHAMBRES
+# ============================================================================
+
+class PartyAllocationTests(SimpleTestCase):
+    """Combinaison de chambres la moins chère pour un groupe"""
+
+    rooms = [('a', 2, 100), ('b', 2, 100), ('c', 4, 150), ('d', 6, 400), ('e', 3, None)]
+
+    def test_minimum_number_of_rooms(self):
+        self.assertEqual(allocate(self.rooms, 6), ['d'])
+        self.assertEqual(sorted(allocate(self.rooms, 12)), ['a', 'c', 'd'])
+
+    def test_requested_number_of_rooms(self):
+        self.assertEqual(sorted(allocate(self.rooms, 6, 2)), ['a', 'c'])
+        self.assertEqual(sorted(allocate(self.rooms, 6, 3)), ['a', 'b', 'c'])
+        self.assertIsNone(allocate(self.rooms, 7, 1))
+
+    def test_unpriced_rooms_only_when_needed(self):
+        self.assertEqual(sorted(allocate(self.rooms, 17)), ['a', 'b', 'c', 'd', 'e'])
+        self.assertIsNone(allocate(self.rooms, 18))
+
+
+# ============================================================================
+# STOCK PAR TYPE DE CHAMBRE
+# ============================================================================
+
+class RoomTypeInventoryTests(TestCase):
+    """Le stock suit le calendrier et les saisons à la validation, les réservations dans leur transaction"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.double = RoomType.objects.create(name='Double')
+        cls.user = get_user_model().objects.create_user(email='client@example.com', password='secret')
+        cls.confirmed = BookingStatus.objects.create(name='confirmed')
+        cls.cancelled = BookingStatus.objects.create(name='cancelled')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.night = timezone.localdate() + timedelta(days=10)
+
+    def create_property(self, name, rooms, price=100, nights=()):
+        address = PropertyAddress.objects.create(city='Nice', country='France')
+        property_obj = Property.objects.create(name=name, address=address, rating=4)
+        for i in range(rooms):
+            room = Room.objects.create(property=property_obj, room_type=self.double, name=f'Chambre {i}')
+            RoomPricing.objects.create(room=room, base_price=price + i * 10)
+            for night in nights:
+                RoomAvailability.objects.create(room=room, date=night)
+        return property_obj
+
+    def book(self, room, status):
+        booking = Booking.objects.create(
+            user=self.user, booking_reference=f'REF-{room.id}', status=status, total_amount=100
+        )
+        item = BookingItem.objects.create(
+            booking=booking, item_type='hotel', item_id=str(room.id), unit_price=100, total_price=100
+        )
+        BookingRoom.objects.create(
+            booking_item=item, room=room, check_in=self.night, check_out=self.night + timedelta(days=1)
+        )
+        return booking
+
+    def stock(self, property_obj):
+        return RoomTypeInventory.objects.get(property=property_obj, room_type=self.double, date=self.night)
+
+    def test_stock_follows_calendar_and_bookings(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            property_obj = self.create_property('Hôtel', rooms=3, nights=[self.night])
+        rooms = list(property_obj.rooms.order_by('name'))
+        stock = self.stock(property_obj)
+        self.assertEqual((stock.rooms_total, stock.rooms_available, stock.min_price), (3, 3, 100))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            closed = RoomAvailability.objects.get(room=rooms[0], date=self.night)
+            closed.available = False
+            closed.save()
+        booking = self.book(rooms[1], self.confirmed)
+        stock = self.stock(property_obj)
+        self.assertEqual((stock.rooms_available, stock.min_price), (1, 120))
+
+        booking.status = self.cancelled
+        booking.save()
+        stock = self.stock(property_obj)
+        self.assertEqual((stock.rooms_available, stock.min_price), (2, 110))
+
+    def test_night_without_calendar_row_is_not_available(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            property_obj = self.create_property('Hôtel', rooms=2)
+            opened = property_obj.rooms.order_by('name').last()
+            RoomAvailability.objects.create(room=opened, date=self.night)
+        closed = property_obj.rooms.order_by('name').first()
+        stay = (self.night, self.night + timedelta(days=1))
+
+        stock = self.stock(property_obj)
+        self.assertEqual((stock.rooms_available, stock.min_price), (1, 110))
+        self.assertEqual(
+            {room_id: quote['available'] for room_id, quote in quote_rooms([closed, opened], *stay).items()},
+            {closed.id: False, opened.id: True}
+        )
+        self.assertEqual(quote_properties([property_obj.id], *stay)[property_obj.id]['room_id'], str(opened.id))
+
+        response = self.client.get('/api/accommodations/room-availability/check_availability/', {
+            'room_id': str(closed.id), 'check_in': str(stay[0]), 'check_out': str(stay[1])
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['unavailable_dates'], [str(self.night)])
+
+    def test_moved_season_refreshes_old_and_new_nights(self):
+        later = self.night + timedelta(days=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            property_obj = self.create_property('Hôtel', rooms=1, nights=[self.night, later])
+            season = RoomPricing.objects.create(
+                room=property_obj.rooms.get(), base_price=200, season_type='high',
+                start_date=self.night, end_date=self.night
+            )
+        self.assertEqual(self.stock(property_obj).min_price, 200)
+
+        season.start_date = season.end_date = later
+        with self.captureOnCommitCallbacks(execute=True):
+            season.save()
+        self.assertEqual(self.stock(property_obj).min_price, 100)
+        self.assertEqual(
+            RoomTypeInventory.objects.get(property=property_obj, date=later).min_price, 200
+        )
+
+    def test_rooms_left_in_rooms_action_and_search(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            small = self.create_property('Petit', rooms=1)
+            large = self.create_property('Grand', rooms=3)
+            for room in Room.objects.filter(property__in=[small, large]):
+                RoomAvailability.objects.create(room=room, date=self.night)
+        self.book(large.rooms.order_by('name').first(), self.confirmed)
+        refresh_all()
+        stay = {'check_in': str(self.night), 'check_out': str(self.night + timedelta(days=1))}
+
+        response = self.client.get(f'/api/accommodations/properties/{large.id}/rooms/', stay)
+        self.assertEqual({room['rooms_left'] for room in response.data}, {2})
+
+        response = self.client.get(
+            '/api/accommodations/properties/search/', {**stay, 'city': 'nice', 'ordering': 'rooms_left'}
+        )
+        self.assertEqual([item['name'] for item in response.data['results']], ['Petit', 'Grand'])
+        self.assertEqual([item['rooms_left'] for item in response.data['results']], [1, 2])
+        response = self.client.get(
+            '/api/accommodations/properties/search/', {**stay, 'city': 'nice', 'ordering': '-rooms_left'}
+        )
+        self.assertEqual([item['name'] for item in response.data['results']], ['Grand', 'Petit'])
+
+
+# ============================================================================
+# REPORT DES SAISONS DANS LE CALENDRIER
+# ============================================================================
+
+class SeasonPriceTests(TestCase):
+    """Les prix de saison sont reportés sur les nuits sans prix saisi"""
+
+    def setUp(self):
+        self.today = date(2027, 1, 1)
+        property_obj = Property.objects.create(name='Hôtel')
+        self.room = Room.objects.create(property=property_obj, name='Chambre')
+
+    def test_compile_seasons_resolves_precedence(self):
+        pricings = [
+            (1, 100, 'EUR', 'low', None, None),
+            (2, 150, 'EUR', 'high', date(2027, 1, 3), date(2027, 1, 6)),
+            (3, 200, 'EUR', 'peak', date(2027, 1, 5), date(2027, 1, 5)),
+            (4, 120, 'EUR', 'high', date(2027, 1, 1), date(2027, 1, 10)),
+        ]
+        self.assertEqual(compile_seasons(pricings, date(2027, 1, 1), date(2027, 1, 12)), [
+            (date(2027, 1, 1), date(2027, 1, 3), 120),
+            (date(2027, 1, 3), date(2027, 1, 5), 150),
+            (date(2027, 1, 5), date(2027, 1, 6), 200),
+            (date(2027, 1, 6), date(2027, 1, 7), 150),
+            (date(2027, 1, 7), date(2027, 1, 11), 120),
+            (date(2027, 1, 11), date(2027, 1, 12), 100),
+        ])
+
+    def test_materialize_is_incremental_and_keeps_manual_prices(self):
+        for night in range(3):
+            RoomAvailability.objects.create(room=self.room, date=self.today + timedelta(night))
+        RoomAvailability.objects.filter(date=self.today).update(price=80)
+        season = RoomPricing.objects.create(room=self.room, base_price=100, season_type='medium')
+
+        report = materialize(today=self.today)
+        self.assertEqual(report['rows'], 2)
+        prices = dict(RoomAvailability.objects.values_list('date', 'price'))
+        self.assertEqual(list(prices.values()), [80, 100, 100])
+
+        self.assertEqual(materialize(today=self.today)['rooms_materialized'], 0)
+        season.base_price = 110
+        season.save()
+        self.assertEqual(materialize(today=self.today)['rows'], 2)
+        season.delete()
+        materialize(today=self.today)
+        self.assertEqual(
+            list(RoomAvailability.objects.values_list('price', 'price_from_season')),
+            [(80, False), (None, False), (None, False)]
+        )
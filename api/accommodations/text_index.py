@@ -0,0 +1,256 @@
+"""
+Index plein texte en mémoire des propriétés (paramètre q de la recherche).
+
+Chaque propriété est un document composé de son nom, de sa ville, des noms de
+ses équipements et de ses descriptions (toutes langues). Le texte est
+normalisé avant indexation et à la recherche :
+- repli des accents et de la casse (« Hôtel » → « hotel », « œ » → « oe ») ;
+- élisions et mots vides retirés selon la langue de la description
+  (fr, en, es ; toutes les listes pour le nom, la ville et la requête) ;
+- pluriel réduit (« chambres » → « chambre », « châteaux » → « chateau »).
+
+Un terme pèse selon le champ où il apparaît (nom > titre, ville > équipements
+> descriptions), avec une saturation de type BM25 sur sa fréquence. Une
+recherche retient les propriétés qui contiennent tous les termes de la
+requête et les classe par somme des poids × idf.
+
+L'index est propre au processus. Les écritures du processus sont réindexées
+propriété par propriété à la validation de la transaction (signaux, voir
+signals.py) ; l'index est reconstruit après PROPERTY_TEXT_INDEX_MAX_AGE
+secondes pour rattraper les écritures des autres processus.
+"""
+import math
+import re
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Property, PropertyDescription, PropertyAmenityLink
+
+
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'title': 2.0,
+    'city': 2.0,
+    'amenity': 1.5,
+    'short_description': 1.0,
+    'description': 0.5,
+}
+K1 = 1.2
+
+STOPWORDS = {
+    'fr': {
+        'au', 'aux', 'avec', 'ce', 'ces', 'dans', 'de', 'des', 'du', 'elle', 'en', 'et',
+        'il', 'la', 'le', 'les', 'leur', 'lui', 'ma', 'mais', 'me', 'mes', 'mon', 'ne',
+        'nos', 'notre', 'nous', 'on', 'ou', 'par', 'pas', 'pour', 'qu', 'que', 'qui',
+        'sa', 'se', 'ses', 'son', 'sur', 'ta', 'te', 'tes', 'ton', 'tu', 'un', 'une',
+        'vos', 'votre', 'vous', 'est', 'sont', 'a', 'y',
+    },
+    'en': {
+        'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'in',
+        'is', 'it', 'its', 'of', 'on', 'or', 'our', 'that', 'the', 'this', 'to', 'was',
+        'with', 'you', 'your',
+    },
+    'es': {
+        'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los', 'para',
+        'por', 'su', 'sus', 'un', 'una', 'y',
+    },
+}
+ALL_STOPWORDS = set().union(*STOPWORDS.values())
+TOKEN_RE = re.compile(r'\w+')
+
+
+def fold(text):
+    """Texte sans accents ni casse (« Œuvre d'Été » → « oeuvre d'ete »)"""
+    text = unicodedata.normalize('NFKD', text.replace('œ', 'oe').replace('Œ', 'OE').replace('æ', 'ae'))
+    return ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+
+
+def _stem(token):
+    # Pluriels réguliers fr / en / es : « chambres », « châteaux »
+    if len(token) > 3 and token[-1] in 'sx' and token[-2] != 's':
+        return token[:-1]
+    return token
+
+
+def tokenize(text, language=None):
+    """Termes normalisés d'un texte ; `language` choisit la liste de mots vides"""
+    if not text:
+        return []
+    stopwords = STOPWORDS.get((language or '')[:2].lower(), ALL_STOPWORDS)
+    return [
+        _stem(token)
+        for token in TOKEN_RE.findall(fold(text))
+        # Les lettres isolées sont des élisions (l', d', j') ou du bruit
+        if len(token) > 1 and token not in stopwords
+    ]
+
+
+def query_terms(query):
+    """Termes distincts et triés d'une requête (forme utilisée par le cache)"""
+    return sorted(set(tokenize(query)))
+
+
+def _document_terms(fields):
+    """{terme: poids} d'un document à partir de (champ, texte, langue)"""
+    frequencies = {}
+    for field, text, language in fields:
+        weight = FIELD_WEIGHTS[field]
+        for term in tokenize(text, language):
+            frequencies[term] = frequencies.get(term, 0.0) + weight
+    return {
+        term: frequency * (K1 + 1) / (frequency + K1)
+        for term, frequency in frequencies.items()
+    }
+
+
+class PropertyTextIndex:
+    """Index inversé terme → {property_id: poids}"""
+
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+        self.built_at = None
+        self.build_seconds = None
+        self._lock = threading.RLock()
+        # Une seule reconstruction à la fois ; les recherches continuent sur
+        # l'ancien index pendant la lecture de la base
+        self._build_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    def rebuild(self):
+        """Reconstruire tout l'index depuis la base (trois requêtes en flux)"""
+        started = time.perf_counter()
+        documents = self._load_documents()
+        postings = {}
+        for property_id, terms in documents.items():
+            for term, weight in terms.items():
+                postings.setdefault(term, {})[property_id] = weight
+
+        with self._lock:
+            self.documents = documents
+            self.postings = postings
+            self.built_at = time.monotonic()
+            self.build_seconds = time.perf_counter() - started
+        return self
+
+    @staticmethod
+    def _load_documents(property_ids=None):
+        """{property_id: {terme: poids}} des propriétés (toutes si property_ids est None)"""
+        properties = Property.objects.order_by()
+        descriptions = PropertyDescription.objects.order_by()
+        links = PropertyAmenityLink.objects.order_by()
+        if property_ids is not None:
+            properties = properties.filter(id__in=property_ids)
+            descriptions = descriptions.filter(property_id__in=property_ids)
+            links = links.filter(property_id__in=property_ids)
+
+        fields = {}
+        for property_id, name, city in properties.values_list(
+            'id', 'name', 'address__city'
+        ).iterator(chunk_size=10000):
+            fields[property_id] = [('name', name, None), ('city', city, None)]
+        for property_id, language, title, short_description, description in descriptions.values_list(
+            'property_id', 'language', 'title', 'short_description', 'description'
+        ).iterator(chunk_size=2000):
+            if property_id in fields:
+                fields[property_id] += [
+                    ('title', title, language),
+                    ('short_description', short_description, language),
+                    ('description', description, language),
+                ]
+        for property_id, amenity in links.values_list('property_id', 'amenity__name').iterator(chunk_size=10000):
+            if property_id in fields:
+                fields[property_id].append(('amenity', amenity, None))
+
+        return {property_id: _document_terms(values) for property_id, values in fields.items()}
+
+    def ensure_fresh(self):
+        max_age = getattr(settings, 'PROPERTY_TEXT_INDEX_MAX_AGE', 600)
+        if self.built_at is None or time.monotonic() - self.built_at > max_age:
+            with self._build_lock:
+                if self.built_at is None or time.monotonic() - self.built_at > max_age:
+                    self.rebuild()
+        return self
+
+    # ------------------------------------------------------------------
+    # Mises à jour incrémentales
+    # ------------------------------------------------------------------
+
+    def reindex(self, property_ids):
+        """Relire les documents de ces propriétés (supprimées : retirées de l'index)"""
+        property_ids = set(property_ids)
+        documents = self._load_documents(property_ids)
+        with self._lock:
+            for property_id in property_ids:
+                for term in self.documents.pop(property_id, {}):
+                    posting = self.postings.get(term)
+                    if posting is not None:
+                        posting.pop(property_id, None)
+                        if not posting:
+                            del self.postings[term]
+                terms = documents.get(property_id)
+                if terms is None:
+                    continue
+                self.documents[property_id] = terms
+                for term, weight in terms.items():
+                    self.postings.setdefault(term, {})[property_id] = weight
+
+    def reindex_on_commit(self, property_ids):
+        """Réindexer à la validation de la transaction, si l'index est construit"""
+        if self.built_at is None:
+            return
+        property_ids = list(property_ids)
+        transaction.on_commit(lambda: self.reindex(property_ids))
+
+    # ------------------------------------------------------------------
+    # Recherche
+    # ------------------------------------------------------------------
+
+    def search(self, terms):
+        """
+        {property_id: score} des propriétés contenant tous les `terms`
+        (termes normalisés, voir query_terms).
+        """
+        if not terms:
+            return {}
+        with self._lock:
+            postings = [self.postings.get(term) for term in set(terms)]
+            if not all(postings):
+                return {}
+            total = len(self.documents)
+            postings.sort(key=len)
+            # Intersection en partant de la liste la plus courte
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    return {}
+            scores = dict.fromkeys(candidates, 0.0)
+            for posting in postings:
+                idf = math.log(1 + (total - len(posting) + 0.5) / (len(posting) + 0.5))
+                for property_id in candidates:
+                    scores[property_id] += posting[property_id] * idf
+        return scores
+
+    def stats(self):
+        with self._lock:
+            return {
+                'documents': len(self.documents),
+                'terms': len(self.postings),
+                'postings': sum(len(posting) for posting in self.postings.values()),
+                'build_seconds': round(self.build_seconds, 3) if self.build_seconds is not None else None,
+            }
+
+
+property_text_index = PropertyTextIndex()
+
+
+def get_property_text_index():
+    return property_text_index.ensure_fresh()
@@ -5,7 +5,7 @@ from .views import (
     PropertyViewSet, PropertyAmenityViewSet, PropertyAmenityLinkViewSet,
     PropertyImageViewSet, PropertyDescriptionViewSet,
     RoomTypeViewSet, RoomViewSet, RoomAmenityViewSet, RoomAmenityLinkViewSet,
-    RoomAvailabilityViewSet, RoomPricingViewSet
+    RoomAvailabilityViewSet, RoomAvailabilityRangeViewSet, RoomPricingViewSet
 )
 
 router = DefaultRouter()
@@ -22,6 +22,7 @@ router.register(r'rooms', RoomViewSet, basename='room')
 router.register(r'room-amenities', RoomAmenityViewSet, basename='room-amenity')
 router.register(r'room-amenity-links', RoomAmenityLinkViewSet, basename='room-amenity-link')
 router.register(r'room-availability', RoomAvailabilityViewSet, basename='room-availability')
+router.register(r'room-availability-ranges', RoomAvailabilityRangeViewSet, basename='room-availability-range')
 router.register(r'room-pricing', RoomPricingViewSet, basename='room-pricing')
 
 urlpatterns = [
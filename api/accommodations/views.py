@@ -1,15 +1,21 @@
 from rest_framework import viewsets, status, permissions, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q, Count, Avg
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.db.models import Q, F, Count, Avg, Prefetch, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import datetime, timedelta
+import uuid
+
+from nomade_api.geo import parse_point, nearby, serialize_with_distance
 
 from .models import (
     PropertyType, PropertyCategory, PropertyAddress, Property,
     PropertyAmenity, PropertyAmenityLink, PropertyImage, PropertyDescription,
     RoomType, Room, RoomAmenity, RoomAmenityLink,
-    RoomAvailability, RoomPricing
+    RoomAvailability, RoomPricing, RoomAvailabilityRange, PropertySearchProjection
 )
 from .serializers import (
     PropertyTypeSerializer, PropertyCategorySerializer, PropertyAddressSerializer,
@@ -17,8 +23,46 @@ from .serializers import (
     PropertyAmenitySerializer, PropertyAmenityLinkSerializer,
     PropertyImageSerializer, PropertyDescriptionSerializer,
     RoomTypeSerializer, RoomSerializer, RoomAmenitySerializer,
-    RoomAmenityLinkSerializer, RoomAvailabilitySerializer, RoomPricingSerializer
+    RoomAmenityLinkSerializer, RoomAvailabilitySerializer, RoomPricingSerializer,
+    RoomAvailabilityBulkUpsertSerializer, RoomAvailabilityRangeSerializer
+)
+from .availability import (
+    parse_stay, get_stay_calendar, properties_available_for_stay, rooms_available_for_stay
+)
+from .availability_index import availability_index, get_availability_index, to_room_key
+from .availability_ranges import (
+    ranges_enabled, overlapping_ranges, as_daily_rows, daily_rows_for_rooms, write_range
 )
+from .calendar_bulk import upsert_ranges, calendar_changed
+from .pricing import quote_rooms, quote_properties
+from .availability_matrix import iter_matrix_json
+from .party_allocation import MAX_PARTY_ROOMS, can_host, party_allocations
+from .inventory import rooms_left_by_type, rooms_left_by_property
+from .facet_index import get_property_facet_index
+from .text_index import get_property_text_index, query_terms, fold
+from . import search_cache, search_projection
+
+
+def count_subquery(model, field):
+    """
+    Nombre de lignes de `model` dont la clé `field` pointe vers l'objet courant.
+
+    Sous-requête corrélée plutôt que Count() : le compte reste juste quand le
+    queryset fait d'autres jointures (filtres, autres compteurs).
+    """
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+            count=Count('*')
+        ).values('count')
+    ), 0)
+
+
+def with_room_relations(queryset):
+    """Chambres prêtes pour RoomSerializer : équipements et compteurs en 2 requêtes"""
+    return queryset.prefetch_related('amenity_links__amenity').annotate(
+        availabilities_count=count_subquery(RoomAvailability, 'room'),
+        pricings_count=count_subquery(RoomPricing, 'room')
+    )
 
 
 # ============================================================================
@@ -76,7 +120,6 @@ class PropertyAddressViewSet(viewsets.ModelViewSet):
         """Rechercher des adresses proches d'un point GPS"""
         latitude = request.query_params.get('latitude')
         longitude = request.query_params.get('longitude')
-        radius_km = float(request.query_params.get('radius', 10))
         
         if not latitude or not longitude:
             return Response(
@@ -84,19 +127,18 @@ class PropertyAddressViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Approximation simple (pour une vraie app, utiliser PostGIS)
-        lat = float(latitude)
-        lon = float(longitude)
-        lat_range = radius_km / 111.0  # ~111 km par degré de latitude
-        lon_range = radius_km / (111.0 * abs(lat))
-        
-        queryset = self.queryset.filter(
-            latitude__range=(lat - lat_range, lat + lat_range),
-            longitude__range=(lon - lon_range, lon + lon_range)
-        )
+        try:
+            lat, lon, radius_km, limit = parse_point(
+                latitude, longitude,
+                request.query_params.get('radius', 10),
+                request.query_params.get('limit')
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        # Distances de haversine, du plus proche au plus lointain
+        results = nearby(self.get_queryset(), lat, lon, radius_km, limit)
+        return Response(serialize_with_distance(self.get_serializer, results))
 
 
 # ============================================================================
@@ -266,6 +308,26 @@ class RoomAvailabilityViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['date', 'price', 'created_at']
     ordering = ['date']
+    MAX_BATCH_ROOMS = 500
+    MAX_BULK_NIGHTS = 200000
+    
+    def create(self, request, *args, **kwargs):
+        return self._daily_write(super().create, request, *args, **kwargs)
+    
+    def update(self, request, *args, **kwargs):
+        return self._daily_write(super().update, request, *args, **kwargs)
+    
+    def destroy(self, request, *args, **kwargs):
+        return self._daily_write(super().destroy, request, *args, **kwargs)
+    
+    def _daily_write(self, write, request, *args, **kwargs):
+        """Écriture dans room_availability, refusée avec le stockage par plages (elle ne serait jamais lue)"""
+        if ranges_enabled():
+            return Response(
+                {'error': 'Le calendrier est stocké par plages : utilisez /room-availability-ranges/ ou bulk_upsert'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return write(request, *args, **kwargs)
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -298,45 +360,324 @@ class RoomAvailabilityViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            check_in_date = datetime.strptime(check_in, '%Y-%m-%d').date()
-            check_out_date = datetime.strptime(check_out, '%Y-%m-%d').date()
-        except ValueError:
+        room_ids, error_response = self._parse_room_ids([room_id])
+        if error_response:
+            return error_response
+        
+        stay, error_response = self._parse_stay(check_in, check_out)
+        if error_response:
+            return error_response
+        
+        if not self._include_nights(request):
+            index = get_availability_index()
+            if index is not None and index.covers(*stay):
+                # Réponse servie par l'index en mémoire, sans requête SQL
+                unavailable_dates = [
+                    str(date) for date in index.unavailable_dates(to_room_key(room_ids[0]), *stay)
+                ]
+                return Response({
+                    'available': not unavailable_dates,
+                    'unavailable_dates': unavailable_dates,
+                    'check_in': check_in,
+                    'check_out': check_out
+                })
+        
+        # Une seule requête pour toutes les nuits du séjour
+        calendar = get_stay_calendar(room_ids, *stay)[room_ids[0]]
+        
+        return Response({
+            'available': calendar['available'],
+            'unavailable_dates': calendar['unavailable_dates'],
+            'nights': calendar['nights'],
+            'check_in': check_in,
+            'check_out': check_out
+        })
+    
+    @action(detail=False, methods=['get'])
+    def check_availability_batch(self, request):
+        """Vérifier la disponibilité de plusieurs chambres pour une même période"""
+        room_ids = [
+            room_id.strip()
+            for room_id in request.query_params.get('room_ids', '').split(',')
+            if room_id.strip()
+        ]
+        check_in = request.query_params.get('check_in')
+        check_out = request.query_params.get('check_out')
+        
+        if not all([room_ids, check_in, check_out]):
             return Response(
-                {'error': 'Format de date invalide. Utilisez YYYY-MM-DD'},
+                {'error': 'room_ids, check_in et check_out sont requis'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if check_in_date >= check_out_date:
+        if len(room_ids) > self.MAX_BATCH_ROOMS:
             return Response(
-                {'error': 'check_out doit être après check_in'},
+                {'error': f'Maximum {self.MAX_BATCH_ROOMS} chambres par requête'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Vérifier toutes les dates dans la période
-        current_date = check_in_date
-        unavailable_dates = []
+        room_ids, error_response = self._parse_room_ids(room_ids)
+        if error_response:
+            return error_response
+        
+        stay, error_response = self._parse_stay(check_in, check_out)
+        if error_response:
+            return error_response
         
-        while current_date < check_out_date:
-            availability = RoomAvailability.objects.filter(
-                room_id=room_id,
-                date=current_date,
-                available=False
-            ).first()
-            
-            if availability:
-                unavailable_dates.append(str(current_date))
-            
-            current_date += timedelta(days=1)
+        if not self._include_nights(request):
+            index = get_availability_index()
+            if index is not None and index.covers(*stay):
+                rooms = []
+                for room_id in room_ids:
+                    unavailable_dates = [
+                        str(date) for date in index.unavailable_dates(to_room_key(room_id), *stay)
+                    ]
+                    rooms.append({
+                        'room_id': room_id,
+                        'available': not unavailable_dates,
+                        'unavailable_dates': unavailable_dates,
+                    })
+                return Response({
+                    'check_in': check_in,
+                    'check_out': check_out,
+                    'rooms': rooms
+                })
         
-        is_available = len(unavailable_dates) == 0
+        calendar = get_stay_calendar(room_ids, *stay)
         
         return Response({
-            'available': is_available,
-            'unavailable_dates': unavailable_dates,
             'check_in': check_in,
-            'check_out': check_out
+            'check_out': check_out,
+            'rooms': [
+                {'room_id': room_id, **calendar[room_id]}
+                for room_id in calendar
+            ]
         })
+    
+    @action(detail=False, methods=['get', 'post'], permission_classes=[permissions.IsAuthenticated])
+    def index_status(self, request):
+        """
+        État de l'index de disponibilités en mémoire de ce processus (staff seulement).
+        
+        GET : empreinte mémoire (et cohérence avec la base si ?check=true)
+        POST : reconstruction complète de l'index
+        """
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Seuls les administrateurs peuvent consulter l\'index de disponibilités'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        if request.method == 'POST':
+            availability_index.rebuild()
+        elif availability_index.built_at is None:
+            return Response(
+                {'error': 'L\'index n\'est pas construit dans ce processus'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        data = availability_index.memory_footprint()
+        if request.query_params.get('check', '').lower() == 'true':
+            data['consistency'] = availability_index.check_consistency()
+        return Response(data)
+    
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def bulk_upsert(self, request):
+        """
+        Mettre à jour le calendrier par plages de dates (flux channel manager).
+        
+        Corps : {"ranges": [{"room_ids": [...], "date_from": "2026-12-20",
+        "date_to": "2027-01-05", "available": false, "price": 180}]}
+        Les deux bornes sont incluses ; toutes les plages sont appliquées dans
+        une seule transaction.
+        """
+        serializer = RoomAvailabilityBulkUpsertSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ranges = serializer.validated_data['ranges']
+        
+        total_nights = sum(
+            len(data['room_ids']) * ((data['date_to'] - data['date_from']).days + 1)
+            for data in ranges
+        )
+        if total_nights > self.MAX_BULK_NIGHTS:
+            return Response(
+                {'error': f'Maximum {self.MAX_BULK_NIGHTS} nuits par requête ({total_nights} demandées)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        room_ids = {room_id for data in ranges for room_id in data['room_ids']}
+        found = set(Room.objects.filter(id__in=room_ids).values_list('id', flat=True))
+        missing = room_ids - found
+        if missing:
+            return Response(
+                {'error': 'Chambres introuvables', 'room_ids': sorted(str(room_id) for room_id in missing)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = upsert_ranges(ranges)
+        return Response({
+            'ranges': results,
+            'nights': total_nights,
+            'created': sum(result['created'] for result in results),
+            'updated': sum(result['updated'] for result in results),
+        })
+    
+    def _include_nights(self, request):
+        """Le détail par nuit (prix) est inclus sauf si include_nights=false"""
+        return request.query_params.get('include_nights', 'true').lower() != 'false'
+    
+    def _parse_room_ids(self, room_ids):
+        """Retourne (identifiants normalisés, None) ou (None, réponse 400)"""
+        parsed = []
+        for room_id in room_ids:
+            try:
+                parsed.append(str(uuid.UUID(str(room_id))))
+            except ValueError:
+                return None, Response(
+                    {'error': f'Identifiant de chambre invalide: {room_id}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        return list(dict.fromkeys(parsed)), None
+    
+    def _parse_stay(self, check_in, check_out):
+        """Retourne (période, None) ou (None, réponse 400)"""
+        try:
+            return parse_stay(check_in, check_out), None
+        except ValueError as e:
+            return None, Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+
+# ============================================================================
+# ROOM AVAILABILITY RANGES
+# ============================================================================
+
+class RoomAvailabilityRangeViewSet(viewsets.ModelViewSet):
+    """
+    ViewSet pour RoomAvailabilityRange (stockage du calendrier par plages).
+    
+    Les écritures passent par availability_ranges.write_range : une plage
+    créée ou modifiée découpe les plages qu'elle recouvre et fusionne avec ses
+    voisines identiques ; la réponse contient les plages qui en résultent.
+    """
+    queryset = RoomAvailabilityRange.objects.select_related('room', 'room__property').all()
+    serializer_class = RoomAvailabilityRangeSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['start_date', 'price', 'created_at']
+    ordering = ['room', 'start_date']
+    MAX_NIGHTS_DAYS = 731
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        room_id = self.request.query_params.get('room_id')
+        date_from = self.request.query_params.get('date_from')
+        date_to = self.request.query_params.get('date_to')
+        available = self.request.query_params.get('available')
+        
+        if room_id:
+            queryset = queryset.filter(room_id=room_id)
+        # Plages qui recouvrent au moins une nuit de [date_from, date_to]
+        if date_from:
+            queryset = queryset.filter(end_date__gt=date_from)
+        if date_to:
+            queryset = queryset.filter(start_date__lte=date_to)
+        if available is not None:
+            queryset = queryset.filter(available=available.lower() == 'true')
+        
+        return queryset
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        ranges = self._write(data['room'].id, data['start_date'], data['end_date'], data)
+        return Response(
+            RoomAvailabilityRangeSerializer(ranges, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
+    
+    def update(self, request, *args, **kwargs):
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=kwargs.pop('partial', False))
+        serializer.is_valid(raise_exception=True)
+        data = {
+            'available': instance.available,
+            'price': instance.price,
+            **serializer.validated_data
+        }
+        room_id = data['room'].id if 'room' in data else instance.room_id
+        with transaction.atomic():
+            write_range(instance.room_id, instance.start_date, instance.end_date, clear=True)
+            calendar_changed([instance.room_id], instance.start_date, instance.end_date)
+            ranges = self._write(
+                room_id,
+                data.get('start_date', instance.start_date),
+                data.get('end_date', instance.end_date),
+                data
+            )
+        return Response(RoomAvailabilityRangeSerializer(ranges, many=True).data)
+    
+    def perform_destroy(self, instance):
+        write_range(instance.room_id, instance.start_date, instance.end_date, clear=True)
+        calendar_changed([instance.room_id], instance.start_date, instance.end_date)
+    
+    def _write(self, room_id, start_date, end_date, data):
+        values = {field: data[field] for field in ('available', 'price') if field in data}
+        ranges = write_range(room_id, start_date, end_date, **values)
+        calendar_changed([room_id], start_date, end_date)
+        return RoomAvailabilityRange.objects.select_related('room', 'room__property').filter(
+            id__in=[availability_range.id for availability_range in ranges]
+        ).order_by('start_date')
+    
+    @action(detail=False, methods=['get'])
+    def nights(self, request):
+        """
+        Développer les plages en nuits (même format que /room-availability/).
+        
+        Paramètres : room_id, date_from et date_to (inclus, au plus
+        MAX_NIGHTS_DAYS jours).
+        """
+        room_id = request.query_params.get('room_id')
+        date_from = request.query_params.get('date_from')
+        date_to = request.query_params.get('date_to')
+        
+        if not all([room_id, date_from, date_to]):
+            return Response(
+                {'error': 'room_id, date_from et date_to sont requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            room_id = to_room_key(room_id)
+            start = datetime.strptime(date_from, '%Y-%m-%d').date()
+            end = datetime.strptime(date_to, '%Y-%m-%d').date() + timedelta(days=1)
+        except ValueError:
+            return Response(
+                {'error': 'room_id invalide ou format de date invalide. Utilisez YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if end <= start:
+            return Response(
+                {'error': 'date_to doit être postérieure ou égale à date_from'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (end - start).days > self.MAX_NIGHTS_DAYS:
+            return Response(
+                {'error': f'Période limitée à {self.MAX_NIGHTS_DAYS} jours'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ranges = overlapping_ranges([room_id], start, end).select_related(
+            'room', 'room__property'
+        ).order_by('start_date')
+        rows = as_daily_rows(ranges, start, end)
+        
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(RoomAvailabilitySerializer(page, many=True).data)
+        return Response(RoomAvailabilitySerializer(rows, many=True).data)
 
 
 # ============================================================================
@@ -377,9 +718,7 @@ class RoomPricingViewSet(viewsets.ModelViewSet):
 
 class RoomViewSet(viewsets.ModelViewSet):
     """ViewSet pour Room"""
-    queryset = Room.objects.select_related('property', 'room_type').prefetch_related(
-        'amenity_links__amenity'
-    ).all()
+    queryset = with_room_relations(Room.objects.select_related('property', 'room_type'))
     serializer_class = RoomSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -419,8 +758,6 @@ class PropertyViewSet(viewsets.ModelViewSet):
     """ViewSet pour Property"""
     queryset = Property.objects.select_related(
         'property_type', 'property_category', 'address'
-    ).prefetch_related(
-        'images', 'descriptions', 'amenity_links__amenity', 'rooms'
     ).all()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -436,7 +773,7 @@ class PropertyViewSet(viewsets.ModelViewSet):
         return PropertySerializer
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = self._with_relations(super().get_queryset())
         
         # Filtres
         property_type_id = self.request.query_params.get('property_type_id')
@@ -464,74 +801,506 @@ class PropertyViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    # Tris de la liste et de la recherche : paramètre ordering -> champ de la projection
+    PROJECTION_ORDERING = {
+        'name': 'name',
+        'rating': 'rating',
+        'created_at': 'created_at',
+        'total_reviews': 'total_reviews',
+        'price': 'from_price',
+    }
+    SEARCH_ORDERING = ['-rating', '-total_reviews']
+
+    def list(self, request, *args, **kwargs):
+        """
+        Liste des propriétés.
+
+        Filtres, recherche par nom et tri (dont ordering=price, prix d'appel)
+        portent sur la seule table de projection ; seules les propriétés de
+        la page sont chargées ensuite.
+        """
+        if not search_projection.projection_enabled():
+            return super().list(request, *args, **kwargs)
+
+        queryset = self._projection_queryset(request.query_params)
+        for term in filters.SearchFilter().get_search_terms(request):
+            queryset = queryset.filter(name__icontains=term)
+        queryset = queryset.order_by(
+            *self._projection_ordering(request.query_params.get('ordering'), self.ordering)
+        )
+        property_ids = queryset.values_list('property_id', flat=True)
+
+        page = self.paginate_queryset(property_ids)
+        if page is not None:
+            serializer = self.get_serializer(self._load_properties([str(pk) for pk in page]), many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(
+            self._load_properties([str(pk) for pk in property_ids]), many=True
+        )
+        return Response(serializer.data)
+
+    def _projection_queryset(self, params):
+        """Filtres de la liste et de la recherche, appliqués à la projection"""
+        queryset = PropertySearchProjection.objects.all()
+        for name in ('property_type_id', 'property_category_id', 'status'):
+            value = params.get(name)
+            if value:
+                queryset = queryset.filter(**{name: value})
+
+        # Ville et pays sont stockés sans accents ni casse
+        city = params.get('city')
+        country = params.get('country')
+        if city:
+            queryset = queryset.filter(city__contains=fold(city))
+        if country:
+            queryset = queryset.filter(country__contains=fold(country))
+
+        min_rating = params.get('min_rating')
+        if min_rating:
+            queryset = queryset.filter(rating__gte=min_rating)
+        amenity_id = params.get('amenity_id')
+        if amenity_id:
+            queryset = search_projection.filter_amenity(queryset, amenity_id)
+        return queryset
+
+    def _projection_ordering(self, ordering, default):
+        """
+        Champs de tri de la projection pour le paramètre ordering
+        (« price,-rating »), ou `default` s'il n'en contient aucun de valide.
+        """
+        fields = []
+        for term in (ordering or '').split(','):
+            term = term.strip()
+            field = self.PROJECTION_ORDERING.get(term.lstrip('-'))
+            if field is None:
+                continue
+            expression = F(field).desc(nulls_last=True) if term.startswith('-') else F(field).asc(nulls_last=True)
+            fields.append(expression)
+        # Dernier critère unique : pagination stable
+        return (fields or list(default)) + ['property_id']
+
     @action(detail=False, methods=['get'])
     def search(self, request):
-        """Recherche avancée de propriétés"""
+        """
+        Recherche avancée de propriétés.
+
+        La liste ordonnée des identifiants trouvés est mise en cache
+        (search_cache) : les pages suivantes d'une même recherche ne font que
+        charger les propriétés de la page. Avec facets=true, la réponse
+        contient aussi les compteurs de facettes de tous les résultats
+        (facet_index, sans requête SQL).
+
+        Mode multi-chambres (party=true ou rooms=N) : une propriété est
+        retenue si une combinaison de ses chambres libres toutes les nuits
+        peut loger les `guests` personnes (en `rooms` chambres si précisé) ;
+        chaque résultat de la page indique la combinaison proposée et son
+        prix (allocation).
+
+        Avec check_in et check_out, chaque résultat indique aussi rooms_left
+        (chambres libres toutes les nuits du séjour, d'après le stock par
+        type de chambre).
+        """
+        party, error = self._parse_party_params(request)
+        if error is not None:
+            return error
+
+        try:
+            key = search_cache.make_key(search_cache.normalize_params(request.query_params))
+        except ValueError:
+            key = None
+
+        property_ids = search_cache.get_ids(key) if key is not None else None
+        if property_ids is None:
+            property_ids = [str(pk) for pk in self._search_property_ids(request, party)]
+            if key is not None:
+                search_cache.set_ids(key, property_ids)
+
+        facets = None
+        if request.query_params.get('facets', '').lower() == 'true':
+            facets = get_property_facet_index().counts(property_ids, key=key)
+
+        page = self.paginate_queryset(property_ids)
+        if page is not None:
+            serializer = self.get_serializer(self._load_properties(page), many=True)
+            if party is not None:
+                self._add_allocations(serializer.data, party)
+            self._add_rooms_left(serializer.data, request)
+            response = self.get_paginated_response(serializer.data)
+            if facets is not None:
+                response.data['facets'] = facets
+            return response
+
+        serializer = self.get_serializer(self._load_properties(property_ids), many=True)
+        if party is not None:
+            self._add_allocations(serializer.data, party)
+        self._add_rooms_left(serializer.data, request)
+        if facets is not None:
+            return Response({'results': serializer.data, 'facets': facets})
+        return Response(serializer.data)
+
+    MAX_TEXT_FILTER_IDS = 5000
+
+    def _search_property_ids(self, request, party=None):
+        """
+        Identifiants des propriétés correspondant à la recherche, triés.
+
+        Filtres et tri portent sur la projection de recherche (ou sur les
+        propriétés si PROPERTY_SEARCH_PROJECTION_ENABLED est désactivé). Tri
+        par note par défaut ; ordering accepte aussi price, name,
+        created_at et total_reviews. Avec q, seules les propriétés contenant
+        tous les termes sont gardées (text_index) et, sans ordering, classées
+        par pertinence puis par note. Avec des dates, ordering=rooms_left
+        (ou -rooms_left) classe par chambres libres sur le séjour.
+        """
+        q = request.query_params.get('q')
         check_in = request.query_params.get('check_in')
         check_out = request.query_params.get('check_out')
         guests = request.query_params.get('guests', 2)
-        city = request.query_params.get('city')
-        country = request.query_params.get('country')
-        min_rating = request.query_params.get('min_rating')
-        
-        queryset = self.get_queryset().filter(status='active')
-        
-        # Filtres géographiques
-        if city:
-            queryset = queryset.filter(address__city__icontains=city)
-        if country:
-            queryset = queryset.filter(address__country__icontains=country)
+        ordering = request.query_params.get('ordering')
+
+        if search_projection.projection_enabled():
+            queryset = self._projection_queryset(request.query_params)
+            pk_field = 'property_id'
+            order_by = self._projection_ordering(ordering, self.SEARCH_ORDERING)
+        else:
+            # get_queryset applique déjà les filtres de ville, pays et note
+            queryset = self.get_queryset()
+            pk_field = 'id'
+            order_by = self.SEARCH_ORDERING + ['id']
+        queryset = queryset.filter(status='active')
         
-        # Filtre par note
-        if min_rating:
-            queryset = queryset.filter(rating__gte=min_rating)
+        # Recherche plein texte (noms, descriptions, ville, équipements)
+        scores = None
+        terms = query_terms(q) if q else []
+        if terms:
+            scores = get_property_text_index().search(terms)
+            if len(scores) <= self.MAX_TEXT_FILTER_IDS:
+                queryset = queryset.filter(**{f'{pk_field}__in': list(scores)})
         
-        # Filtre par disponibilité et capacité
-        if check_in and check_out:
+        # Filtre par disponibilité (toutes les nuits du séjour) et capacité
+        if party is not None:
+            queryset = queryset.filter(**{
+                f'{pk_field}__in': self._party_property_ids(queryset, pk_field, party)
+            })
+        elif check_in and check_out:
             try:
-                check_in_date = datetime.strptime(check_in, '%Y-%m-%d').date()
-                check_out_date = datetime.strptime(check_out, '%Y-%m-%d').date()
-                
-                # Trouver les chambres disponibles pour cette période
-                available_rooms = RoomAvailability.objects.filter(
-                    date__gte=check_in_date,
-                    date__lt=check_out_date,
-                    available=True
-                ).values_list('room_id', flat=True).distinct()
-                
-                # Filtrer les propriétés qui ont des chambres disponibles
-                # avec la capacité requise
-                rooms_with_capacity = Room.objects.filter(
-                    id__in=available_rooms,
-                    max_guests__gte=int(guests),
-                    status='available'
-                ).values_list('property_id', flat=True).distinct()
-                
-                queryset = queryset.filter(id__in=rooms_with_capacity)
+                check_in_date, check_out_date = parse_stay(check_in, check_out)
+                if pk_field == 'property_id':
+                    # Propriétés sans chambre assez grande écartées sans lire le calendrier
+                    queryset = queryset.filter(max_guests__gte=int(guests))
+                index = get_availability_index()
+                if index is not None and index.covers(check_in_date, check_out_date):
+                    # Bitmaps en mémoire : un ET binaire par chambre candidate
+                    candidate_ids = list(queryset.order_by().values_list(pk_field, flat=True))
+                    queryset = queryset.filter(**{
+                        f'{pk_field}__in': index.available_property_ids(
+                            check_in_date, check_out_date, int(guests), candidate_ids
+                        )
+                    })
+                else:
+                    queryset = queryset.filter(**{
+                        f'{pk_field}__in': properties_available_for_stay(
+                            check_in_date, check_out_date, int(guests),
+                            properties=queryset
+                        )
+                    })
             except ValueError:
                 pass
         
-        # Trier par note décroissante
-        queryset = queryset.order_by('-rating', '-total_reviews')
-        
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        property_ids = queryset.order_by(*order_by).values_list(pk_field, flat=True)
+        if scores is not None:
+            property_ids = [pk for pk in property_ids if pk in scores]
+            if not ordering:
+                # Tri stable : à pertinence égale, l'ordre par note est gardé
+                property_ids.sort(key=lambda pk: -scores[pk])
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        rooms_left_term = next(
+            (term.strip() for term in (ordering or '').split(',') if term.strip().lstrip('-') == 'rooms_left'),
+            None
+        )
+        if rooms_left_term and check_in and check_out:
+            property_ids = self._sort_by_rooms_left(
+                list(property_ids), check_in, check_out, rooms_left_term.startswith('-')
+            )
+        return property_ids
+
+    def _sort_by_rooms_left(self, property_ids, check_in, check_out, descending):
+        """
+        Trier par chambres libres sur le séjour (stock par type de chambre),
+        en gardant l'ordre précédent à égalité. Les propriétés sans stock
+        connu sont placées à la fin.
+        """
+        try:
+            check_in_date, check_out_date = parse_stay(check_in, check_out)
+        except ValueError:
+            return property_ids
+        rooms_left = rooms_left_by_property(property_ids, check_in_date, check_out_date)
+        sign = -1 if descending else 1
+        return sorted(
+            property_ids,
+            key=lambda pk: (pk not in rooms_left, sign * rooms_left.get(pk, 0))
+        )
+
+    def _parse_party_params(self, request):
+        """
+        Paramètres du mode multi-chambres : (None, None) hors de ce mode,
+        (paramètres, None) ou (None, réponse 400).
+        """
+        params = request.query_params
+        if params.get('party', '').lower() != 'true' and not params.get('rooms'):
+            return None, None
+        stay, _, error = self._parse_quote_params(request)
+        if error is not None:
+            return None, error
+        try:
+            guests = int(params.get('guests', 2))
+            room_count = int(params['rooms']) if params.get('rooms') else None
+        except ValueError:
+            return None, Response(
+                {'error': 'guests et rooms doivent être des entiers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if guests < 1 or (room_count is not None and not 1 <= room_count <= MAX_PARTY_ROOMS):
+            return None, Response(
+                {'error': f'guests doit être positif et rooms compris entre 1 et {MAX_PARTY_ROOMS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return {'check_in': stay[0], 'check_out': stay[1], 'guests': guests, 'rooms': room_count}, None
+
+    def _party_property_ids(self, queryset, pk_field, party):
+        """
+        Propriétés candidates pouvant loger le groupe, en un passage sur les
+        chambres libres toutes les nuits du séjour (test de capacité seul).
+        """
+        check_in, check_out = party['check_in'], party['check_out']
+        index = get_availability_index()
+        if index is not None and index.covers(check_in, check_out):
+            capacities = index.open_room_capacities(
+                check_in, check_out, list(queryset.order_by().values_list(pk_field, flat=True))
+            )
+        else:
+            capacities = {}
+            for property_id, max_guests in rooms_available_for_stay(
+                check_in, check_out, properties=queryset
+            ).order_by().values_list('property_id', 'max_guests'):
+                capacities.setdefault(property_id, []).append(max_guests)
+        return [
+            property_id for property_id, room_capacities in capacities.items()
+            if can_host(room_capacities, party['guests'], party['rooms'])
+        ]
+
+    def _add_allocations(self, items, party):
+        """Ajouter à chaque propriété sérialisée la combinaison de chambres proposée"""
+        allocations = party_allocations(
+            [item['id'] for item in items],
+            party['check_in'], party['check_out'], party['guests'], party['rooms']
+        )
+        for item in items:
+            item['allocation'] = allocations.get(item['id'])
+
+    def _add_rooms_left(self, items, request):
+        """Avec des dates valides, ajouter à chaque propriété ses chambres libres sur le séjour"""
+        try:
+            check_in, check_out = parse_stay(
+                request.query_params.get('check_in'), request.query_params.get('check_out')
+            )
+        except ValueError:
+            return
+        rooms_left = rooms_left_by_property([item['id'] for item in items], check_in, check_out)
+        for item in items:
+            item['rooms_left'] = rooms_left.get(uuid.UUID(item['id']))
+
+    def _load_properties(self, property_ids):
+        """Charger les propriétés dans l'ordre de `property_ids`"""
+        properties = {
+            str(property_obj.id): property_obj
+            for property_obj in self._with_relations(super().get_queryset()).filter(id__in=property_ids)
+        }
+        return [properties[pk] for pk in property_ids if pk in properties]
+
+    def _with_relations(self, queryset):
+        """
+        Relations lues par le serializer de l'action, chargées en un nombre fixe
+        de requêtes quelle que soit la taille de la page.
+        """
+        if self.action == 'list':
+            return queryset.prefetch_related(
+                Prefetch(
+                    'images',
+                    queryset=PropertyImage.objects.filter(image_type='main'),
+                    to_attr='main_images'
+                )
+            ).annotate(rooms_count=count_subquery(Room, 'property'))
+        if self.action == 'retrieve':
+            return queryset.prefetch_related(
+                'images', 'descriptions', 'amenity_links__amenity',
+                Prefetch('rooms', queryset=with_room_relations(Room.objects.select_related('room_type')))
+            )
+        return queryset
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def search_cache_stats(self, request):
+        """Statistiques du cache de recherche (succès, échecs, évictions)"""
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Seuls les administrateurs peuvent consulter le cache de recherche'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return Response(search_cache.stats())
     
+    MAX_QUOTE_PROPERTIES = 100
+
+    @action(detail=True, methods=['get'])
+    def quote(self, request, pk=None):
+        """
+        Devis d'un séjour pour les chambres d'une propriété.
+
+        Prix de chaque nuit : prix du calendrier, sinon saison RoomPricing.
+        Les chambres réservables (toutes les nuits tarifées et disponibles)
+        viennent en premier, de la moins chère à la plus chère.
+        """
+        property_obj = self.get_object()
+        stay, guests, error_response = self._parse_quote_params(request)
+        if error_response:
+            return error_response
+
+        rooms = Room.objects.filter(
+            property=property_obj,
+            status='available',
+            max_guests__gte=guests
+        ).only('id', 'name', 'property_id')
+        room_id = request.query_params.get('room_id')
+        if room_id:
+            try:
+                rooms = rooms.filter(id=uuid.UUID(room_id))
+            except ValueError:
+                return Response(
+                    {'error': f'Identifiant de chambre invalide: {room_id}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        quotes = sorted(
+            quote_rooms(rooms, *stay).values(),
+            key=lambda quote: (not (quote['complete'] and quote['available']), quote['total'])
+        )
+        if not self._include_nights(request):
+            for quote in quotes:
+                del quote['nights']
+        return Response({
+            'property_id': str(property_obj.id),
+            'check_in': str(stay[0]),
+            'check_out': str(stay[1]),
+            'nights': (stay[1] - stay[0]).days,
+            'guests': guests,
+            'rooms': quotes
+        })
+
+    @action(detail=False, methods=['get'])
+    def quote_batch(self, request):
+        """
+        Meilleur devis de plusieurs propriétés pour un même séjour.
+
+        property_ids : identifiants séparés par des virgules (100 au plus).
+        Pour chaque propriété, la chambre réservable la moins chère, ou null.
+        """
+        raw_ids = [
+            value.strip()
+            for value in request.query_params.get('property_ids', '').split(',')
+            if value.strip()
+        ]
+        if not raw_ids:
+            return Response(
+                {'error': 'property_ids est requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(raw_ids) > self.MAX_QUOTE_PROPERTIES:
+            return Response(
+                {'error': f'{self.MAX_QUOTE_PROPERTIES} propriétés au maximum par requête'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            property_ids = list(dict.fromkeys(uuid.UUID(value) for value in raw_ids))
+        except ValueError:
+            return Response(
+                {'error': 'Identifiant de propriété invalide'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        stay, guests, error_response = self._parse_quote_params(request)
+        if error_response:
+            return error_response
+
+        include_nights = self._include_nights(request)
+        results = []
+        for property_id, quote in quote_properties(property_ids, *stay, guests=guests).items():
+            if quote is not None and not include_nights:
+                del quote['nights']
+            results.append({'property_id': str(property_id), 'quote': quote})
+        return Response({
+            'check_in': str(stay[0]),
+            'check_out': str(stay[1]),
+            'nights': (stay[1] - stay[0]).days,
+            'guests': guests,
+            'results': results
+        })
+
+    def _parse_quote_params(self, request):
+        """Retourne (période, voyageurs, None) ou (None, None, réponse 400)"""
+        check_in = request.query_params.get('check_in')
+        check_out = request.query_params.get('check_out')
+        if not (check_in and check_out):
+            return None, None, Response(
+                {'error': 'check_in et check_out sont requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            stay = parse_stay(check_in, check_out)
+        except ValueError as e:
+            return None, None, Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            guests = int(request.query_params.get('guests', 1))
+        except ValueError:
+            return None, None, Response(
+                {'error': 'guests doit être un entier'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return stay, guests, None
+
+    def _include_nights(self, request):
+        """Le détail par nuit est inclus sauf si include_nights=false"""
+        return request.query_params.get('include_nights', 'true').lower() != 'false'
+
     @action(detail=True, methods=['get'])
     def rooms(self, request, pk=None):
-        """Récupérer toutes les chambres d'une propriété"""
+        """
+        Récupérer toutes les chambres d'une propriété.
+
+        Chaque chambre indique rooms_left : chambres de son type libres toutes
+        les nuits de [check_in, check_out) (par défaut : cette nuit), lu dans
+        le stock par type de chambre (inventory) ; None sans type ou hors
+        horizon.
+        """
         property_obj = self.get_object()
-        rooms = property_obj.rooms.select_related('room_type').prefetch_related(
-            'amenity_links__amenity'
-        ).all()
+        check_in = request.query_params.get('check_in')
+        check_out = request.query_params.get('check_out')
+        try:
+            if check_in or check_out:
+                check_in_date, check_out_date = parse_stay(check_in, check_out)
+            else:
+                check_in_date = timezone.localdate()
+                check_out_date = check_in_date + timedelta(days=1)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        rooms = with_room_relations(property_obj.rooms.select_related('room_type'))
+        rooms_left = rooms_left_by_type(property_obj.id, check_in_date, check_out_date)
         
         serializer = RoomSerializer(rooms, many=True)
-        return Response(serializer.data)
+        data = serializer.data
+        for room, item in zip(rooms, data):
+            item['rooms_left'] = rooms_left.get(room.room_type_id)
+        return Response(data)
     
     @action(detail=True, methods=['get'])
     def availability(self, request, pk=None):
@@ -543,21 +1312,96 @@ class PropertyViewSet(viewsets.ModelViewSet):
         rooms = property_obj.rooms.all()
         availability_data = []
         
+        if ranges_enabled():
+            try:
+                rows = daily_rows_for_rooms(rooms, date_from, date_to)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            for room in rooms:
+                availability_data.append({
+                    'room_id': str(room.id),
+                    'room_name': room.name,
+                    'availabilities': RoomAvailabilitySerializer(rows[room.id], many=True).data
+                })
+            return Response(availability_data)
+        
+        # Une seule requête pour les nuits de toutes les chambres
+        availabilities = RoomAvailability.objects.all()
+        if date_from:
+            availabilities = availabilities.filter(date__gte=date_from)
+        if date_to:
+            availabilities = availabilities.filter(date__lte=date_to)
+        rooms = rooms.prefetch_related(Prefetch('availabilities', queryset=availabilities))
+        
         for room in rooms:
-            availabilities = room.availabilities.all()
-            
-            if date_from:
-                availabilities = availabilities.filter(date__gte=date_from)
-            if date_to:
-                availabilities = availabilities.filter(date__lte=date_to)
-            
             availability_data.append({
                 'room_id': str(room.id),
                 'room_name': room.name,
                 'availabilities': RoomAvailabilitySerializer(
-                    availabilities,
+                    room.availabilities.all(),
                     many=True
                 ).data
             })
         
         return Response(availability_data)
+
+    MAX_MATRIX_DAYS = 366
+    DEFAULT_MATRIX_DAYS = 30
+
+    @action(detail=True, methods=['get'])
+    def availability_matrix(self, request, pk=None):
+        """
+        Calendrier d'une propriété en matrice chambres × dates (extranet).
+
+        date_from / date_to inclus (par défaut 30 jours à partir
+        d'aujourd'hui, 366 au plus), room_type_id optionnel. Réponse JSON
+        envoyée en flux, construite à partir d'une seule requête sur les nuits.
+        """
+        property_obj = self.get_object()
+        try:
+            date_from = request.query_params.get('date_from')
+            date_from = (
+                datetime.strptime(date_from, '%Y-%m-%d').date() if date_from
+                else timezone.now().date()
+            )
+            date_to = request.query_params.get('date_to')
+            date_to = (
+                datetime.strptime(date_to, '%Y-%m-%d').date() if date_to
+                else date_from + timedelta(days=self.DEFAULT_MATRIX_DAYS - 1)
+            )
+        except ValueError:
+            return Response(
+                {'error': 'Format de date invalide. Utilisez YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if date_to < date_from:
+            return Response(
+                {'error': 'date_to doit être postérieure ou égale à date_from'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (date_to - date_from).days >= self.MAX_MATRIX_DAYS:
+            return Response(
+                {'error': f'La période ne peut pas dépasser {self.MAX_MATRIX_DAYS} jours'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rooms = property_obj.rooms.order_by('id')
+        room_type_id = request.query_params.get('room_type_id')
+        if room_type_id:
+            try:
+                rooms = rooms.filter(room_type_id=uuid.UUID(room_type_id))
+            except ValueError:
+                return Response(
+                    {'error': f'Identifiant de type de chambre invalide: {room_type_id}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        return StreamingHttpResponse(
+            iter_matrix_json(
+                property_obj.id,
+                list(rooms.values_list('id', 'name', 'room_type_id')),
+                date_from,
+                date_to + timedelta(days=1)
+            ),
+            content_type='application/json'
+        )
@@ -0,0 +1,57 @@
+"""
+Réaffecter les chambres des séjours à venir pour limiter les trous
+invendables (voir bookings/room_assignment.py).
+
+Sans --apply, la commande n'écrit rien et affiche le plan : trous courts
+avant / après et liste des séjours à déplacer. À planifier chaque nuit :
+
+    python manage.py optimize_room_assignments --property-id <uuid>
+    python manage.py optimize_room_assignments --property-id <uuid> --apply
+    python manage.py optimize_room_assignments --all --apply
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accommodations.models import Property
+from bookings.room_assignment import DEFAULT_HORIZON_DAYS, AssignmentConflict, plan, apply
+
+
+class Command(BaseCommand):
+    help = "Réaffecter les chambres des séjours à venir pour limiter les trous de 1 ou 2 nuits"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--property-id', action='append', dest='property_ids',
+                            help='Propriété à optimiser (option répétable)')
+        parser.add_argument('--all', action='store_true',
+                            help='Toutes les propriétés ayant des séjours à venir')
+        parser.add_argument('--horizon-days', type=int, default=DEFAULT_HORIZON_DAYS,
+                            help='Seuls les séjours arrivant dans cet horizon sont déplacés')
+        parser.add_argument('--apply', action='store_true',
+                            help='Appliquer le plan (par défaut : simulation)')
+        parser.add_argument('--summary', action='store_true',
+                            help='Ne pas afficher la liste des déplacements')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            property_ids = list(Property.objects.filter(
+                rooms__booking_rooms__check_in__gt=timezone.localdate()
+            ).distinct().values_list('id', flat=True))
+        elif options['property_ids']:
+            property_ids = options['property_ids']
+        else:
+            raise CommandError('Préciser --property-id ou --all')
+
+        run = apply if options['apply'] else plan
+        for property_id in property_ids:
+            try:
+                result = run(property_id, options['horizon_days'])
+            except AssignmentConflict as e:
+                # Réservation concurrente : la propriété sera reprise au prochain passage
+                self.stderr.write(f'{property_id} : {e}')
+                continue
+            result['applied'] = options['apply']
+            if options['summary']:
+                result['moves'] = len(result['moves'])
+            self.stdout.write(json.dumps(result, indent=2))
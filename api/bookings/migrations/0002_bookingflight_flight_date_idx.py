@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookingflight',
+            index=models.Index(fields=['flight', 'flight_date'], name='booking_flight_date_idx'),
+        ),
+    ]
@@ -10,6 +10,9 @@ from django.conf import settings
 
 class BookingStatus(models.Model):
     """Statuts (confirmé, en attente, annulé, complété)"""
+    # Noms des statuts d'une réservation annulée (ses chambres sont libérées)
+    CANCELLED_NAMES = ['cancelled', 'canceled', 'annulé', 'annulée', 'annule', 'annulee']
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=50, unique=True, db_index=True)
     description = models.TextField(blank=True, null=True)
@@ -253,6 +256,7 @@ class BookingFlight(models.Model):
         indexes = [
             models.Index(fields=['booking_item']),
             models.Index(fields=['flight']),
+            models.Index(fields=['flight', 'flight_date'], name='booking_flight_date_idx'),
         ]
     
     def __str__(self):
@@ -0,0 +1,373 @@
+"""
+Réaffectation des chambres réservées (BookingRoom) d'une propriété pour
+limiter les trous invendables du calendrier.
+
+Les séjours sont affectés à une chambre au fil des réservations : le
+calendrier se remplit de trous de 1 ou 2 nuits entre deux séjours, trop
+courts pour être vendus. L'optimiseur redistribue les séjours pas encore
+commencés entre les chambres d'un même RoomType (partition d'intervalles) :
+
+1. Sont figés : les séjours commencés, ceux qui débutent après l'horizon,
+   ceux dont la chambre n'a pas de jumelle (même type, en service), et ceux
+   qui chevauchent une nuit fermée (RoomAvailability available=False) de
+   leur chambre, cette fermeture pouvant leur être liée. Les nuits fermées
+   des chambres occupent aussi le calendrier.
+2. Les séjours mobiles sont parcourus par date d'arrivée ; chacun va dans la
+   chambre libre (capacité suffisante, sans séjour figé à venir pendant le
+   séjour) qui laisse le plus petit trou vendable avant lui : trou nul
+   d'abord, puis trou d'au moins MIN_SELLABLE_NIGHTS nuits le plus court,
+   puis, faute de mieux, un trou court. À égalité, la chambre actuelle est
+   gardée pour limiter les déplacements.
+3. Le plan n'est retenu pour un type de chambre que s'il réduit les nuits
+   perdues en trous courts (puis le nombre de plages libres).
+
+plan() ne fait que lire ; apply() verrouille les chambres de la propriété,
+recalcule le plan sous verrou et l'applique dans une transaction, avec le
+stock par type de chambre (accommodations.inventory) des chambres touchées.
+Avant validation, les séjours des chambres touchées sont relus (lecture
+verrouillante) : si un séjour enregistré entre-temps en chevauche un autre,
+rien n'est appliqué (AssignmentConflict).
+"""
+import heapq
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from accommodations import inventory
+from accommodations.models import Room, RoomAvailability
+
+from .models import BookingStatus, BookingRoom
+
+
+MIN_SELLABLE_NIGHTS = 3
+DEFAULT_HORIZON_DAYS = 90
+
+
+class AssignmentConflict(ValueError):
+    """Deux séjours d'une chambre se chevauchent après réaffectation ; `room_id` = chambre"""
+
+    def __init__(self, room_id):
+        self.room_id = room_id
+        super().__init__(
+            f"Séjours qui se chevauchent dans la chambre {room_id} : réaffectation annulée"
+        )
+
+
+class Stay:
+    """Séjour d'une chambre : réservé (BookingRoom) ou nuits fermées"""
+    __slots__ = ('id', 'reference', 'room_id', 'check_in', 'check_out', 'guests', 'movable')
+
+    def __init__(self, id, reference, room_id, check_in, check_out, guests=1, movable=False):
+        self.id = id
+        self.reference = reference
+        self.room_id = room_id
+        self.check_in = check_in
+        self.check_out = check_out
+        self.guests = guests
+        self.movable = movable
+
+
+def fragmentation(stays_by_room, date_from, date_to):
+    """
+    Trous courts du calendrier sur [date_from, date_to).
+
+    Un trou court est une plage libre de moins de MIN_SELLABLE_NIGHTS nuits
+    bornée des deux côtés par une occupation. Retourne short_gaps,
+    short_gap_nights et free_runs (plages libres, toutes longueurs).
+    """
+    short_gaps = short_gap_nights = free_runs = 0
+    for stays in stays_by_room.values():
+        cursor = date_from
+        for start, end in sorted((stay.check_in, stay.check_out) for stay in stays):
+            if end <= cursor:
+                continue
+            if start >= date_to:
+                break
+            gap = (start - cursor).days
+            if gap > 0:
+                free_runs += 1
+                if gap < MIN_SELLABLE_NIGHTS and cursor > date_from:
+                    short_gaps += 1
+                    short_gap_nights += gap
+            cursor = max(cursor, end)
+        if cursor < date_to:
+            free_runs += 1
+    return {'short_gaps': short_gaps, 'short_gap_nights': short_gap_nights, 'free_runs': free_runs}
+
+
+def _score(metrics):
+    return (metrics['short_gap_nights'], metrics['free_runs'])
+
+
+# ============================================================================
+# CHARGEMENT
+# ============================================================================
+
+def _blocked_runs(room_ids, date_from):
+    """Nuits fermées à partir de date_from, regroupées en plages par chambre"""
+    runs = {}
+    for room_id, night in RoomAvailability.objects.filter(
+        room_id__in=room_ids, date__gte=date_from, available=False
+    ).order_by('room_id', 'date').values_list('room_id', 'date'):
+        room_runs = runs.setdefault(room_id, [])
+        if room_runs and room_runs[-1][1] == night:
+            room_runs[-1][1] = night + timedelta(days=1)
+        else:
+            room_runs.append([night, night + timedelta(days=1)])
+    return runs
+
+
+def _load(property_id, today, horizon_end, lock=False):
+    """Chambres en service par type, et séjours occupant leurs calendriers"""
+    rooms = {
+        room_id: (room_type_id, max_guests)
+        for room_id, room_type_id, max_guests in Room.objects.filter(
+            property_id=property_id, status='available', room_type__isnull=False
+        ).values_list('id', 'room_type_id', 'max_guests')
+    }
+
+    bookings = BookingRoom.objects.filter(
+        room__property_id=property_id, check_out__gt=today
+    ).exclude(
+        booking_item__booking__status__name__in=BookingStatus.CANCELLED_NAMES
+    ).order_by('check_in', 'id')
+    if lock:
+        bookings = bookings.select_for_update(of=('self',))
+
+    blocked = _blocked_runs(list(rooms), today)
+    stays = {room_id: [] for room_id in rooms}
+    for room_id, runs in blocked.items():
+        for start, end in runs:
+            stays[room_id].append(Stay(None, None, room_id, start, end))
+
+    type_sizes = {}
+    for room_type_id, _ in rooms.values():
+        type_sizes[room_type_id] = type_sizes.get(room_type_id, 0) + 1
+
+    for booking_id, reference, room_id, check_in, check_out, guests in bookings.values_list(
+        'id', 'booking_item__booking__booking_reference', 'room_id', 'check_in', 'check_out', 'guests'
+    ):
+        if room_id not in rooms:
+            # Chambre hors service ou sans type : le séjour reste où il est
+            continue
+        overlaps_block = any(
+            start < check_out and end > check_in for start, end in blocked.get(room_id, ())
+        )
+        movable = (
+            check_in > today
+            and check_in < horizon_end
+            and type_sizes[rooms[room_id][0]] > 1
+            and not overlaps_block
+        )
+        stays[room_id].append(Stay(booking_id, reference, room_id, check_in, check_out, guests, movable))
+    return rooms, stays
+
+
+# ============================================================================
+# OPTIMISATION
+# ============================================================================
+
+def _assign_room_type(room_ids, capacities, stays, today):
+    """
+    Affectation gloutonne des séjours mobiles d'un type de chambre.
+
+    Retourne {stay.id: room_id} ou None si un séjour n'a pas trouvé de
+    chambre (l'affectation actuelle est alors gardée).
+    """
+    fixed_starts = {}
+    # Occupations figées à prendre en compte au fil du parcours : (début, fin, chambre)
+    fixed_events = []
+    movable = []
+    for room_id in room_ids:
+        room_fixed = sorted((stay.check_in, stay.check_out) for stay in stays[room_id] if not stay.movable)
+        fixed_starts[room_id] = [start for start, _ in room_fixed]
+        fixed_events += [(start, end, room_id) for start, end in room_fixed]
+        movable += [stay for stay in stays[room_id] if stay.movable]
+    heapq.heapify(fixed_events)
+    movable.sort(key=lambda stay: (stay.check_in, -(stay.check_out - stay.check_in).days, str(stay.id)))
+
+    # free_from[room] : fin de la dernière occupation commencée avant le séjour courant
+    free_from = {room_id: today for room_id in room_ids}
+    rooms_by_date = {today: set(room_ids)}
+    dates = [today]
+
+    def move_room(room_id, new_date):
+        old_date = free_from[room_id]
+        if old_date == new_date:
+            return
+        members = rooms_by_date[old_date]
+        members.discard(room_id)
+        if not members:
+            del rooms_by_date[old_date]
+            dates.pop(bisect_left(dates, old_date))
+        free_from[room_id] = new_date
+        if new_date not in rooms_by_date:
+            rooms_by_date[new_date] = set()
+            insort(dates, new_date)
+        rooms_by_date[new_date].add(room_id)
+
+    def fits(room_id, stay):
+        if capacities[room_id] < stay.guests:
+            return False
+        # Prochaine occupation figée après l'arrivée
+        starts = fixed_starts[room_id]
+        position = bisect_right(starts, stay.check_in)
+        return position == len(starts) or starts[position] >= stay.check_out
+
+    def pick(date, stay):
+        candidates = [room_id for room_id in rooms_by_date.get(date, ()) if fits(room_id, stay)]
+        if not candidates:
+            return None
+        return stay.room_id if stay.room_id in candidates else min(candidates, key=str)
+
+    assignment = {}
+    for stay in movable:
+        while fixed_events and fixed_events[0][0] <= stay.check_in:
+            _, end, room_id = heapq.heappop(fixed_events)
+            move_room(room_id, max(free_from[room_id], end))
+
+        # Trou nul, puis trous vendables du plus court au plus long, puis trous courts
+        chosen = pick(stay.check_in, stay)
+        limit = bisect_right(dates, stay.check_in)
+        floor = bisect_right(dates, stay.check_in - timedelta(days=MIN_SELLABLE_NIGHTS))
+        position = floor
+        while chosen is None and position > 0:
+            position -= 1
+            chosen = pick(dates[position], stay)
+        position = floor
+        while chosen is None and position < limit:
+            if dates[position] != stay.check_in:
+                chosen = pick(dates[position], stay)
+            position += 1
+        if chosen is None:
+            return None
+        assignment[stay.id] = chosen
+        move_room(chosen, stay.check_out)
+    return assignment
+
+
+def plan(property_id, horizon_days=DEFAULT_HORIZON_DAYS, today=None, lock=False):
+    """
+    Plan de réaffectation d'une propriété (sans rien écrire).
+
+    Retourne before / after (trous courts, nuits perdues et plages libres
+    sur l'horizon), moves (séjours à déplacer : booking_room_id,
+    booking_reference, dates, from_room_id, to_room_id), room_types (résultat
+    par type de chambre) et seconds.
+    """
+    started = time.perf_counter()
+    today = today or timezone.localdate()
+    horizon_end = today + timedelta(days=horizon_days)
+    rooms, stays = _load(property_id, today, horizon_end, lock=lock)
+
+    room_types = {}
+    for room_id, (room_type_id, _) in rooms.items():
+        room_types.setdefault(room_type_id, []).append(room_id)
+
+    before_total = {room_id: stays[room_id] for room_id in rooms}
+    after_total = {}
+    moves = []
+    report = []
+    for room_type_id, room_ids in room_types.items():
+        room_ids.sort(key=str)
+        type_stays = {room_id: stays[room_id] for room_id in room_ids}
+        before = fragmentation(type_stays, today, horizon_end)
+        movable = [stay for room_id in room_ids for stay in stays[room_id] if stay.movable]
+        assignment = _assign_room_type(
+            room_ids, {room_id: rooms[room_id][1] for room_id in room_ids}, type_stays, today
+        ) if movable else None
+
+        after_stays = type_stays
+        if assignment is not None:
+            candidate = {room_id: [stay for stay in stays[room_id] if not stay.movable] for room_id in room_ids}
+            for stay in movable:
+                candidate[assignment[stay.id]].append(stay)
+            if _score(fragmentation(candidate, today, horizon_end)) < _score(before):
+                after_stays = candidate
+            else:
+                assignment = None
+
+        type_moves = []
+        if assignment is not None:
+            type_moves = [
+                {
+                    'booking_room_id': str(stay.id),
+                    'booking_reference': stay.reference,
+                    'check_in': str(stay.check_in),
+                    'check_out': str(stay.check_out),
+                    'from_room_id': str(stay.room_id),
+                    'to_room_id': str(assignment[stay.id]),
+                }
+                for stay in movable if assignment[stay.id] != stay.room_id
+            ]
+        moves += type_moves
+        after_total.update(after_stays)
+        report.append({
+            'room_type_id': str(room_type_id),
+            'rooms': len(room_ids),
+            'movable_stays': len(movable),
+            'before': before,
+            'after': fragmentation(after_stays, today, horizon_end),
+            'moves': len(type_moves),
+        })
+
+    return {
+        'property_id': str(property_id),
+        'date_from': str(today),
+        'date_to': str(horizon_end),
+        'before': fragmentation(before_total, today, horizon_end),
+        'after': fragmentation(after_total, today, horizon_end),
+        'room_types': report,
+        'moves': moves,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def _check_overlaps(room_ids, today):
+    """
+    Relire (lecture verrouillante : dernières versions validées) les séjours
+    à venir de `room_ids` et lever AssignmentConflict si deux séjours d'une
+    même chambre se chevauchent.
+    """
+    previous = {}
+    for room_id, check_in, check_out in BookingRoom.objects.select_for_update(of=('self',)).filter(
+        room_id__in=list(room_ids), check_out__gt=today
+    ).exclude(
+        booking_item__booking__status__name__in=BookingStatus.CANCELLED_NAMES
+    ).order_by('room_id', 'check_in').values_list('room_id', 'check_in', 'check_out'):
+        if check_in < previous.get(room_id, check_in):
+            raise AssignmentConflict(room_id)
+        previous[room_id] = max(previous.get(room_id, check_out), check_out)
+
+
+def apply(property_id, horizon_days=DEFAULT_HORIZON_DAYS, today=None):
+    """
+    Recalculer le plan sous verrou (chambres et séjours de la propriété) et
+    l'appliquer.
+
+    Retourne le plan appliqué ; lève AssignmentConflict (rien n'est écrit)
+    si un séjour enregistré pendant le calcul chevauche un séjour déplacé.
+    """
+    with transaction.atomic():
+        # Deux réaffectations de la même propriété ne se croisent pas
+        list(Room.objects.select_for_update().filter(
+            property_id=property_id
+        ).order_by('id').values_list('id', flat=True))
+        result = plan(property_id, horizon_days, today, lock=True)
+        targets = {move['booking_room_id']: move['to_room_id'] for move in result['moves']}
+        booking_rooms = list(BookingRoom.objects.filter(id__in=list(targets)))
+        for booking_room in booking_rooms:
+            booking_room.room_id = targets[str(booking_room.id)]
+        BookingRoom.objects.bulk_update(booking_rooms, ['room'], batch_size=500)
+        if result['moves']:
+            _check_overlaps(set(targets.values()), date.fromisoformat(result['date_from']))
+            # bulk_update ne déclenche pas les signaux
+            inventory.refresh_rooms(
+                {move[key] for move in result['moves'] for key in ('from_room_id', 'to_room_id')},
+                min(date.fromisoformat(move['check_in']) for move in result['moves']),
+                max(date.fromisoformat(move['check_out']) for move in result['moves'])
+            )
+    return result
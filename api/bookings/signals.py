@@ -0,0 +1,148 @@
+"""
+Signaux de l'app bookings.
+
+Les séjours réservés (BookingRoom) et les changements de statut des
+réservations (annulation, réactivation) recalculent, dans la même
+transaction, le stock par type de chambre des chambres concernées
+(accommodations.inventory) et invalident les recherches en cache de leurs
+villes (tri ordering=rooms_left).
+
+Les vols réservés (BookingFlight) décomptent leurs sièges avant
+l'enregistrement (flights.seats) : une création ou une modification sans
+assez de sièges lève flights.seats.SeatsUnavailable et n'est pas
+enregistrée. Une suppression ou une annulation rend les sièges, une
+réactivation les décompte à nouveau (tous les vols ou aucun).
+"""
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from accommodations import inventory, search_cache
+from accommodations.availability import stay_nights
+from accommodations.models import Room
+from flights import seats
+
+from .models import Booking, BookingFlight, BookingRoom, BookingStatus
+
+
+def _stays_changed(stays):
+    """Séjours (room_id, check_in, check_out) réservés ou libérés"""
+    room_ids = {room_id for room_id, _, _ in stays}
+    date_from = min(check_in for _, check_in, _ in stays)
+    date_to = max(check_out for _, _, check_out in stays)
+    inventory.refresh_rooms(room_ids, date_from, date_to)
+    nights = stay_nights(date_from, date_to)
+    for city in set(Room.objects.filter(id__in=room_ids).values_list('property__address__city', flat=True)):
+        search_cache.invalidate(city, nights)
+
+
+# ============================================================================
+# STOCK PAR TYPE DE CHAMBRE
+# ============================================================================
+
+@receiver(pre_save, sender=BookingRoom)
+def inventory_booking_room_pre_save(sender, instance, **kwargs):
+    # Ancien séjour : ses nuits sont libérées si la chambre ou les dates changent
+    instance._inventory_stay = None
+    if not instance._state.adding:
+        instance._inventory_stay = BookingRoom.objects.filter(pk=instance.pk).values_list(
+            'room_id', 'check_in', 'check_out'
+        ).first()
+
+
+@receiver(post_save, sender=BookingRoom)
+@receiver(post_delete, sender=BookingRoom)
+def inventory_booking_room_changed(sender, instance, **kwargs):
+    stays = [(instance.room_id, instance.check_in, instance.check_out)]
+    if getattr(instance, '_inventory_stay', None):
+        stays.append(instance._inventory_stay)
+    _stays_changed(stays)
+
+
+@receiver(pre_save, sender=Booking)
+def inventory_booking_pre_save(sender, instance, **kwargs):
+    # Ancien statut, lu aussi par la section SIÈGES DES VOLS
+    instance._previous_status_id = None
+    if not instance._state.adding:
+        instance._previous_status_id = Booking.objects.filter(pk=instance.pk).values_list(
+            'status_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=Booking)
+def inventory_booking_saved(sender, instance, created, **kwargs):
+    if created or instance._previous_status_id == instance.status_id:
+        return
+    stays = list(BookingRoom.objects.filter(
+        booking_item__booking=instance
+    ).values_list('room_id', 'check_in', 'check_out'))
+    if stays:
+        _stays_changed(stays)
+
+
+# ============================================================================
+# SIÈGES DES VOLS
+# ============================================================================
+
+def _is_cancelled(status_id):
+    return BookingStatus.objects.filter(id=status_id, name__in=BookingStatus.CANCELLED_NAMES).exists()
+
+
+def _holds_seats(booking_item_id):
+    """Les vols d'une réservation non annulée tiennent leurs sièges"""
+    return not Booking.objects.filter(
+        items=booking_item_id, status__name__in=BookingStatus.CANCELLED_NAMES
+    ).exists()
+
+
+def _flight_leg(booking_flight):
+    return (
+        booking_flight.flight_id, booking_flight.flight_class_id,
+        booking_flight.flight_date, booking_flight.passengers
+    )
+
+
+@receiver(pre_save, sender=BookingFlight)
+def seats_booking_flight_pre_save(sender, instance, **kwargs):
+    previous = None
+    if not instance._state.adding:
+        previous = BookingFlight.objects.filter(pk=instance.pk).values_list(
+            'flight_id', 'flight_class_id', 'flight_date', 'passengers'
+        ).first()
+    leg = _flight_leg(instance)
+    if previous == leg or not _holds_seats(instance.booking_item_id):
+        return
+    with transaction.atomic():
+        if previous:
+            seats.release([previous])
+        seats.reserve([leg])
+
+
+@receiver(pre_delete, sender=BookingFlight)
+def seats_booking_flight_pre_delete(sender, instance, **kwargs):
+    instance._seats_leg = _flight_leg(instance) if _holds_seats(instance.booking_item_id) else None
+
+
+@receiver(post_delete, sender=BookingFlight)
+def seats_booking_flight_deleted(sender, instance, **kwargs):
+    if getattr(instance, '_seats_leg', None):
+        seats.release([instance._seats_leg])
+
+
+@receiver(post_save, sender=Booking)
+def seats_booking_saved(sender, instance, created, **kwargs):
+    if created or instance._previous_status_id == instance.status_id:
+        return
+    was_cancelled = _is_cancelled(instance._previous_status_id)
+    if was_cancelled == _is_cancelled(instance.status_id):
+        return
+    legs = [
+        _flight_leg(booking_flight)
+        for booking_flight in BookingFlight.objects.filter(booking_item__booking=instance)
+    ]
+    if not legs:
+        return
+    if was_cancelled:
+        seats.reserve(legs)
+    else:
+        seats.release(legs)
@@ -1,12 +1,15 @@
 from rest_framework import viewsets, status, permissions, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
 from django.db.models import Q, Count, Sum
 from django.utils import timezone
 from datetime import datetime, timedelta
 import random
 import string
 
+from flights.seats import SeatsUnavailable
+
 from .models import (
     BookingStatus, Booking, BookingItem, BookingGuest,
     BookingRoom, BookingFlight, BookingCar, BookingActivity, BookingCruise
@@ -19,6 +22,15 @@ from .serializers import (
 )
 
 
+def _with_seats(write, *args, **kwargs):
+    """Écriture qui décompte des sièges de vol (voir signals.py) : 400 si un vol est complet"""
+    try:
+        with transaction.atomic():
+            return write(*args, **kwargs)
+    except SeatsUnavailable as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+
 # ============================================================================
 # BOOKING STATUSES
 # ============================================================================
@@ -140,6 +152,12 @@ class BookingFlightViewSet(viewsets.ModelViewSet):
     ordering_fields = ['flight_date', 'created_at']
     ordering = ['flight_date']
     
+    def create(self, request, *args, **kwargs):
+        return _with_seats(super().create, request, *args, **kwargs)
+    
+    def update(self, request, *args, **kwargs):
+        return _with_seats(super().update, request, *args, **kwargs)
+    
     def get_queryset(self):
         queryset = super().get_queryset()
         booking_id = self.request.query_params.get('booking_id')
@@ -305,6 +323,10 @@ class BookingViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def update(self, request, *args, **kwargs):
+        # Une réactivation décompte à nouveau les sièges des vols
+        return _with_seats(super().update, request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         """Créer une réservation pour l'utilisateur connecté"""
         # Générer une référence unique
@@ -5,6 +5,8 @@ from django.db.models import Q, Count
 from django.utils import timezone
 from datetime import datetime, timedelta
 
+from nomade_api.geo import parse_point, nearby, serialize_with_distance
+
 from .models import (
     CruiseLine, CruiseShip, CruisePort, Cruise, CruiseCabinType, CruiseCabin
 )
@@ -93,7 +95,6 @@ class CruisePortViewSet(viewsets.ModelViewSet):
         """Rechercher des ports proches d'un point GPS"""
         latitude = request.query_params.get('latitude')
         longitude = request.query_params.get('longitude')
-        radius_km = float(request.query_params.get('radius', 50))
         
         if not latitude or not longitude:
             return Response(
@@ -101,19 +102,18 @@ class CruisePortViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Approximation simple (pour une vraie app, utiliser PostGIS)
-        lat = float(latitude)
-        lon = float(longitude)
-        lat_range = radius_km / 111.0  # ~111 km par degré de latitude
-        lon_range = radius_km / (111.0 * abs(lat))
-        
-        queryset = self.queryset.filter(
-            latitude__range=(lat - lat_range, lat + lat_range),
-            longitude__range=(lon - lon_range, lon + lon_range)
-        )
+        try:
+            lat, lon, radius_km, limit = parse_point(
+                latitude, longitude,
+                request.query_params.get('radius', 50),
+                request.query_params.get('limit')
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        # Distances de haversine, du plus proche au plus lointain
+        results = nearby(self.get_queryset(), lat, lon, radius_km, limit)
+        return Response(serialize_with_distance(self.get_serializer, results))
 
 
 # ============================================================================
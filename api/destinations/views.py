@@ -3,7 +3,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db.models import Q, Count
 from django.utils import timezone
-from decimal import Decimal
+
+from nomade_api.geo import parse_point, bounding_box_q, nearby
 
 from .models import Country, Region, City, Destination
 from .serializers import (
@@ -93,22 +94,12 @@ class CityViewSet(viewsets.ModelViewSet):
         if has_coordinates and has_coordinates.lower() == 'true':
             queryset = queryset.exclude(latitude__isnull=True, longitude__isnull=True)
         
-        # Recherche par proximité GPS
-        if latitude and longitude:
+        # Recherche par proximité GPS (boîte englobant le rayon)
+        if latitude and longitude and radius:
             try:
-                lat = Decimal(latitude)
-                lon = Decimal(longitude)
-                # Filtrer les villes dans un rayon approximatif
-                # Approximation simple : 1 degré ≈ 111 km
-                if radius:
-                    radius_deg = Decimal(radius) / Decimal('111')
-                    queryset = queryset.filter(
-                        latitude__gte=lat - radius_deg,
-                        latitude__lte=lat + radius_deg,
-                        longitude__gte=lon - radius_deg,
-                        longitude__lte=lon + radius_deg
-                    )
-            except (ValueError, TypeError):
+                lat, lon, radius_km, _ = parse_point(latitude, longitude, radius)
+                queryset = queryset.filter(bounding_box_q(lat, lon, radius_km))
+            except ValueError:
                 pass
         
         return queryset
@@ -127,47 +118,31 @@ class CityViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            lat = Decimal(latitude)
-            lon = Decimal(longitude)
-            radius_km = Decimal(radius)
-            radius_deg = radius_km / Decimal('111')
-            
-            cities = self.get_queryset().filter(
-                latitude__isnull=False,
-                longitude__isnull=False,
-                latitude__gte=lat - radius_deg,
-                latitude__lte=lat + radius_deg,
-                longitude__gte=lon - radius_deg,
-                longitude__lte=lon + radius_deg
+            lat, lon, radius_km, limit = parse_point(
+                latitude, longitude, radius, request.query_params.get('limit')
             )
-            
-            # Calculer la distance approximative (formule de Haversine simplifiée)
-            cities_with_distance = []
-            for city in cities:
-                # Distance approximative en km
-                lat_diff = abs(float(city.latitude) - float(lat))
-                lon_diff = abs(float(city.longitude) - float(lon))
-                distance = ((lat_diff ** 2 + lon_diff ** 2) ** 0.5) * 111
-                
-                if distance <= float(radius_km):
-                    cities_with_distance.append({
-                        'city': CityListSerializer(city).data,
-                        'distance_km': round(distance, 2)
-                    })
-            
-            # Trier par distance
-            cities_with_distance.sort(key=lambda x: x['distance_km'])
-            
-            page = self.paginate_queryset(cities_with_distance)
-            if page is not None:
-                return self.get_paginated_response(page)
-            
-            return Response(cities_with_distance)
-        except (ValueError, TypeError) as e:
+        except ValueError as e:
             return Response(
                 {'error': f'Paramètres invalides: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        
+        # Distances de haversine, du plus proche au plus lointain
+        results = nearby(self.get_queryset(), lat, lon, radius_km, limit)
+        cities_data = CityListSerializer([city for city, _ in results], many=True).data
+        cities_with_distance = [
+            {
+                'city': city_data,
+                'distance_km': round(distance, 2)
+            }
+            for city_data, (_, distance) in zip(cities_data, results)
+        ]
+        
+        page = self.paginate_queryset(cities_with_distance)
+        if page is not None:
+            return self.get_paginated_response(page)
+        
+        return Response(cities_with_distance)
 
 
 # ============================================================================
@@ -0,0 +1,140 @@
+"""
+Index en mémoire de l'autocomplétion des aéroports (AirportViewSet.autocomplete).
+
+Les aéroports sont rangés par trafic décroissant (nombre de vols au départ
+et à l'arrivée), puis par code IATA : la position d'un aéroport est son
+rang. Chaque mot du code IATA, du code OACI, du nom, de la ville et du pays,
+replié (accents et casse, voir accommodations.text_index.fold), est une
+entrée d'un tableau trié de (mot, rang).
+
+Une recherche découpe la requête en mots ; pour chacun, les entrées qui
+commencent par ce mot forment une tranche contiguë du tableau (bisect), dont
+on garde les rangs distincts. Les aéroports retenus ont tous les mots de la
+requête ; les rangs étant triés, les `limit` premiers sont les plus
+fréquentés. Un code IATA égal à la requête passe en tête.
+
+Une reconstruction publie l'index d'un seul bloc (AirportSnapshot) : une
+recherche concurrente lit entièrement l'ancien index ou le nouveau, jamais
+des rangs de l'un avec les aéroports de l'autre.
+
+L'index est propre au processus, construit à la première recherche. Les
+signaux d'Airport le marquent à reconstruire ; il est aussi reconstruit
+après AIRPORT_AUTOCOMPLETE_INDEX_MAX_AGE secondes (trafic, écritures des
+autres processus).
+"""
+import bisect
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count
+
+from accommodations.text_index import TOKEN_RE, fold
+
+from .models import Airport, Flight
+
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# Contenu de l'index à un instant donné (jamais modifié après construction)
+AirportSnapshot = namedtuple('AirportSnapshot', ['airports', 'iata_ranks', 'keys', 'ranks'])
+
+
+class AirportAutocompleteIndex:
+    """Mots des aéroports triés, pour la recherche par préfixe"""
+
+    def __init__(self):
+        self.snapshot = AirportSnapshot([], {}, [], np.zeros(0, dtype=np.int32))
+        self.built_at = None
+        self.build_seconds = None
+        self.dirty = True
+        self._lock = threading.Lock()
+
+    def rebuild(self):
+        started = time.perf_counter()
+        # Une écriture pendant la lecture remettra dirty à True
+        self.dirty = False
+        traffic = {}
+        for field in ('departure_airport_id', 'arrival_airport_id'):
+            for airport_id, count in Flight.objects.order_by().values(field).annotate(
+                count=Count('id')
+            ).values_list(field, 'count'):
+                traffic[airport_id] = traffic.get(airport_id, 0) + count
+
+        rows = sorted(
+            Airport.objects.order_by().values_list('id', 'iata_code', 'icao_code', 'name', 'city', 'country'),
+            key=lambda row: (-traffic.get(row[0], 0), row[1])
+        )
+        airports = []
+        entries = set()
+        for rank, (airport_id, iata_code, icao_code, name, city, country) in enumerate(rows):
+            airports.append({
+                'id': str(airport_id),
+                'iata_code': iata_code,
+                'name': name,
+                'city': city,
+                'country': country,
+                'flights_count': traffic.get(airport_id, 0),
+            })
+            for text in (iata_code, icao_code, name, city, country):
+                for token in TOKEN_RE.findall(fold(text or '')):
+                    entries.add((token, rank))
+
+        entries = sorted(entries)
+        self.snapshot = AirportSnapshot(
+            airports,
+            {airport['iata_code'].upper(): rank for rank, airport in enumerate(airports)},
+            [token for token, _ in entries],
+            np.fromiter((rank for _, rank in entries), dtype=np.int32, count=len(entries)),
+        )
+        self.built_at = time.monotonic()
+        self.build_seconds = round(time.perf_counter() - started, 3)
+        return self
+
+    def ensure_fresh(self):
+        max_age = getattr(settings, 'AIRPORT_AUTOCOMPLETE_INDEX_MAX_AGE', 600)
+        if self.dirty or self.built_at is None or time.monotonic() - self.built_at > max_age:
+            with self._lock:
+                if self.dirty or self.built_at is None or time.monotonic() - self.built_at > max_age:
+                    self.rebuild()
+        return self
+
+    @staticmethod
+    def _prefix_ranks(snapshot, term):
+        """Rangs distincts (triés) des aéroports ayant un mot qui commence par `term`"""
+        keys = snapshot.keys
+        lo = bisect.bisect_left(keys, term)
+        hi = bisect.bisect_left(keys, term + '\uffff', lo)
+        return np.unique(snapshot.ranks[lo:hi])
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Aéroports (dicts) dont chaque mot de la requête préfixe un mot, les plus fréquentés d'abord"""
+        terms = TOKEN_RE.findall(fold(query))
+        if not terms:
+            return []
+        snapshot = self.snapshot
+        # Les mots les plus longs sont les plus sélectifs
+        terms.sort(key=len, reverse=True)
+        ranks = self._prefix_ranks(snapshot, terms[0])
+        for term in terms[1:]:
+            if not len(ranks):
+                break
+            ranks = np.intersect1d(ranks, self._prefix_ranks(snapshot, term), assume_unique=True)
+
+        exact = snapshot.iata_ranks.get(query.strip().upper())
+        results = [] if exact is None else [exact]
+        for rank in ranks[:limit + 1].tolist():
+            if rank != exact and len(results) < limit:
+                results.append(rank)
+        return [snapshot.airports[rank] for rank in results]
+
+
+airport_index = AirportAutocompleteIndex()
+
+
+def get_airport_index():
+    """Index du processus, construit ou reconstruit si nécessaire"""
+    return airport_index.ensure_fresh()
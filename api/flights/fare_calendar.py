@@ -0,0 +1,149 @@
+"""
+Calendrier des tarifs d'une route (prix minimum et sièges par jour).
+
+Pour un couple d'aéroports (codes IATA), une fenêtre de dates (au plus
+MAX_WINDOW_DAYS jours) et éventuellement une classe, chaque jour donne le
+prix le plus bas des vols programmés ou retardés qui ont encore des sièges,
+le nombre total de sièges libres et le nombre de vols. Les prix ne sont
+comparés qu'à devise égale : le minimum est donné par devise.
+
+Les jours sont calculés par mois calendaire et mis en cache (clé : route,
+classe, mois) pour FLIGHT_FARE_CALENDAR_CACHE_TIMEOUT secondes, sans
+invalidation : un prix modifié apparaît au plus tard à l'expiration. Les mois
+absents du cache sont lus ensemble en deux requêtes groupées sur
+FlightAvailability : totaux par jour, minimums par jour et devise.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Min, Sum
+
+from .models import FlightAvailability
+
+
+KEY_PREFIX = 'flight-fare-calendar:v2'
+MAX_WINDOW_DAYS = 60
+SEARCHABLE_STATUSES = ['scheduled', 'delayed']
+
+
+def get_cache():
+    return caches[getattr(settings, 'FLIGHT_FARE_CALENDAR_CACHE_ALIAS', 'default')]
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _months(date_from, date_to):
+    """Premiers jours des mois couvrant [date_from, date_to]"""
+    month = _month_start(date_from)
+    months = []
+    while month <= date_to:
+        months.append(month)
+        month = _next_month(month)
+    return months
+
+
+def _key(departure_iata, arrival_iata, flight_class_id, month):
+    return f"{KEY_PREFIX}:{departure_iata}:{arrival_iata}:{flight_class_id or 'all'}:{month:%Y-%m}"
+
+
+def _load_days(departure_iata, arrival_iata, flight_class_id, date_from, date_to):
+    """
+    {jour ISO: {min_price, currency, min_prices, available_seats,
+    flights_count}} des jours de [date_from, date_to) qui ont au moins un
+    siège, en deux requêtes.
+
+    Sièges et vols sont totalisés par jour, toutes devises confondues.
+    min_prices donne le prix le plus bas de chaque devise ; min_price et
+    currency ne sont renseignés que si le jour n'a qu'une devise.
+    """
+    availabilities = FlightAvailability.objects.filter(
+        flight__departure_airport__iata_code__iexact=departure_iata,
+        flight__arrival_airport__iata_code__iexact=arrival_iata,
+        flight__status__in=SEARCHABLE_STATUSES,
+        date__gte=date_from,
+        date__lt=date_to,
+        available_seats__gt=0
+    )
+    if flight_class_id:
+        availabilities = availabilities.filter(flight_class_id=flight_class_id)
+
+    days = {}
+    for day, seats, flights_count in availabilities.order_by().values('date').annotate(
+        seats=Sum('available_seats'), flights_count=Count('flight_id', distinct=True)
+    ).values_list('date', 'seats', 'flights_count'):
+        days[day.isoformat()] = {
+            'min_price': None,
+            'currency': None,
+            'min_prices': {},
+            'available_seats': seats,
+            'flights_count': flights_count,
+        }
+    for day, currency, min_price in availabilities.order_by().values('date', 'currency').annotate(
+        min_price=Min('price')
+    ).values_list('date', 'currency', 'min_price'):
+        days[day.isoformat()]['min_prices'][currency] = float(min_price)
+
+    for values in days.values():
+        if len(values['min_prices']) == 1:
+            values['currency'], values['min_price'] = next(iter(values['min_prices'].items()))
+    return days
+
+
+def fare_calendar(departure_iata, arrival_iata, date_from, date_to, flight_class_id=None):
+    """
+    Liste, pour chaque jour de [date_from, date_to] (bornes incluses), de
+    {date, min_price, currency, min_prices, available_seats, flights_count}
+    (voir _load_days). Un jour sans siège a min_price et currency à None.
+    """
+    departure_iata = departure_iata.upper()
+    arrival_iata = arrival_iata.upper()
+    cache = get_cache()
+    months = _months(date_from, date_to)
+    keys = {month: _key(departure_iata, arrival_iata, flight_class_id, month) for month in months}
+    cached = cache.get_many(list(keys.values()))
+
+    calendar = {}
+    missing = [month for month in months if keys[month] not in cached]
+    for month in months:
+        if month not in missing:
+            calendar.update(cached[keys[month]])
+    if missing:
+        loaded = _load_days(
+            departure_iata, arrival_iata, flight_class_id, missing[0], _next_month(missing[-1])
+        )
+        # Les mois déjà en cache lus au passage sont ignorés
+        entries = {}
+        for month in missing:
+            prefix = f'{month:%Y-%m}'
+            entries[keys[month]] = {day: values for day, values in loaded.items() if day.startswith(prefix)}
+            calendar.update(entries[keys[month]])
+        cache.set_many(entries, timeout=getattr(settings, 'FLIGHT_FARE_CALENDAR_CACHE_TIMEOUT', 120))
+
+    days = []
+    day = date_from
+    while day <= date_to:
+        values = calendar.get(day.isoformat())
+        if values is None:
+            values = {
+                'min_price': None, 'currency': None, 'min_prices': {}, 'available_seats': 0, 'flights_count': 0
+            }
+        days.append({'date': day.isoformat(), **values})
+        day += timedelta(days=1)
+    return days
+
+
+def cheapest_dates(days):
+    """Jour le moins cher de chaque devise : {devise: jour ISO}"""
+    cheapest = {}
+    for day in days:
+        for currency, price in day['min_prices'].items():
+            if currency not in cheapest or price < cheapest[currency][1]:
+                cheapest[currency] = (day['date'], price)
+    return {currency: day for currency, (day, _) in cheapest.items()}
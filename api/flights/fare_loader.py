@@ -0,0 +1,322 @@
+"""
+Chargement en masse des vols et des tarifs (FlightAvailability) depuis un
+fichier CSV ou NDJSON.
+
+Une ligne = un tarif :
+
+    airline,flight_number,departure,arrival,flight_class,date,available_seats,price[,currency,duration_minutes,aircraft_type]
+
+(en NDJSON, un objet JSON par ligne avec les mêmes clés). airline est le
+code de la compagnie, departure / arrival les codes IATA, flight_class le
+nom de la classe ; ces références doivent exister. Un vol est identifié par
+(compagnie, numéro, départ, arrivée) : il est créé s'il n'existe pas, sa
+durée et son appareil sont mis à jour s'ils sont renseignés.
+
+Le fichier est lu en flux et écrit par lots de `batch_size` lignes, chacun
+dans sa transaction : la mémoire est bornée par la taille d'un lot et par
+les tables de correspondance (compagnies, aéroports, classes, vols). Les
+tarifs sont écrits en upsert sur (vol, classe, date) ; dans un lot, la
+dernière ligne d'un même tarif l'emporte. Une ligne invalide est rejetée
+(numéro et motif dans le rapport) sans interrompre le chargement.
+
+available_seats est le nombre de sièges mis en vente par la compagnie : les
+sièges déjà tenus par des réservations non annulées (BookingFlight, voir
+seats.py) en sont retranchés, pour qu'un rechargement ne les remette pas en
+vente. Les tarifs existants du lot sont verrouillés avant ce décompte, dans
+l'ordre utilisé par seats.reserve().
+
+Avec prune=True, les tarifs futurs des compagnies présentes dans le fichier
+qui n'y figurent pas sont supprimés : tout tarif écrit par le chargement a un
+updated_at postérieur à son début, les autres sont périmés. Le fichier doit
+donc être complet pour ces compagnies.
+
+Les écritures en masse contournent les signaux : le graphe des itinéraires
+est marqué à reconstruire à la fin du chargement.
+"""
+import csv
+import json
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from nomade_api.upsert import upsert_options
+
+from .itineraries import itinerary_graph
+from .models import Airline, Airport, FlightClass, Flight, FlightAvailability
+
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+REQUIRED_FIELDS = [
+    'airline', 'flight_number', 'departure', 'arrival', 'flight_class',
+    'date', 'available_seats', 'price'
+]
+FORMATS = ['csv', 'ndjson']
+
+
+def detect_format(filename):
+    """'csv' ou 'ndjson' d'après l'extension (csv par défaut)"""
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+def iter_records(lines, file_format):
+    """(numéro de ligne, dict ou None, erreur) des lignes d'un fichier texte"""
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, None, 'JSON invalide'
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, 'Objet JSON attendu'
+            continue
+        yield line_number, record, None
+
+
+class FareLoader:
+    """Chargement d'un fichier de tarifs ; voir load()"""
+
+    def __init__(self, batch_size=BATCH_SIZE, prune=False, today=None):
+        self.batch_size = batch_size
+        self.prune = prune
+        self.today = today or timezone.localdate()
+        self.airlines = {code.upper(): airline_id for airline_id, code in Airline.objects.values_list('id', 'code')}
+        self.airports = {
+            code.upper(): airport_id for airport_id, code in Airport.objects.values_list('id', 'iata_code')
+        }
+        self.classes = {name.lower(): class_id for class_id, name in FlightClass.objects.values_list('id', 'name')}
+        self.flights = {}
+        for flight_id, airline_id, number, departure, arrival, duration, aircraft in Flight.objects.order_by().values_list(
+            'id', 'airline_id', 'flight_number', 'departure_airport_id', 'arrival_airport_id',
+            'duration_minutes', 'aircraft_type'
+        ):
+            self.flights[(airline_id, number, departure, arrival)] = (flight_id, duration, aircraft)
+        self.airline_ids = set()
+        self.report = {
+            'rows': 0, 'fares': 0, 'flights_created': 0, 'flights_updated': 0,
+            'rejected': 0, 'errors': [], 'pruned': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Lecture d'une ligne
+    # ------------------------------------------------------------------
+
+    def _parse(self, record):
+        """(clé du vol, attributs du vol, classe, date, sièges, prix, devise) ; ValueError si invalide"""
+        missing = [field for field in REQUIRED_FIELDS if record.get(field) is None or not str(record[field]).strip()]
+        if missing:
+            raise ValueError(f"Champs manquants : {', '.join(missing)}")
+
+        airline_id = self.airlines.get(str(record['airline']).strip().upper())
+        if airline_id is None:
+            raise ValueError(f"Compagnie inconnue : {record['airline']}")
+        departure = self.airports.get(str(record['departure']).strip().upper())
+        arrival = self.airports.get(str(record['arrival']).strip().upper())
+        if departure is None or arrival is None:
+            raise ValueError(f"Aéroport inconnu : {record['departure'] if departure is None else record['arrival']}")
+        if departure == arrival:
+            raise ValueError('Départ et arrivée identiques')
+        flight_class_id = self.classes.get(str(record['flight_class']).strip().lower())
+        if flight_class_id is None:
+            raise ValueError(f"Classe inconnue : {record['flight_class']}")
+        flight_number = str(record['flight_number']).strip()
+        if len(flight_number) > 20:
+            raise ValueError('Numéro de vol trop long (20 caractères au plus)')
+
+        try:
+            fare_date = date.fromisoformat(str(record['date']).strip())
+        except ValueError:
+            raise ValueError('Format de date invalide. Utilisez YYYY-MM-DD')
+        try:
+            seats = int(record['available_seats'])
+            price = Decimal(str(record['price']).strip()).quantize(Decimal('0.01'))
+        except (ValueError, TypeError, InvalidOperation):
+            raise ValueError('available_seats et price doivent être numériques')
+        if seats < 0 or price < 0:
+            raise ValueError('available_seats et price doivent être positifs')
+        currency = str(record.get('currency') or 'EUR').strip().upper()
+        if len(currency) != 3:
+            raise ValueError(f'Devise invalide : {currency}')
+
+        duration = record.get('duration_minutes')
+        try:
+            duration = int(duration) if duration not in (None, '') else None
+        except (ValueError, TypeError):
+            raise ValueError('duration_minutes doit être numérique')
+        aircraft = str(record.get('aircraft_type') or '').strip() or None
+
+        flight_key = (airline_id, flight_number, departure, arrival)
+        return flight_key, (duration, aircraft), flight_class_id, fare_date, seats, price, currency
+
+    def _reject(self, line_number, reason):
+        self.report['rejected'] += 1
+        if len(self.report['errors']) < MAX_REPORTED_ERRORS:
+            self.report['errors'].append({'line': line_number, 'error': reason})
+
+    # ------------------------------------------------------------------
+    # Écriture d'un lot
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _held_seats(fares):
+        """
+        {(vol, classe, date): sièges} tenus par les réservations non annulées
+        sur les tarifs `fares` (verrouillés au préalable par l'appelant)
+        """
+        from bookings.models import BookingFlight, BookingStatus
+
+        flight_ids = {flight_id for flight_id, _, _ in fares}
+        dates = {fare_date for _, _, fare_date in fares}
+        held = {}
+        for flight_id, flight_class_id, fare_date, passengers in BookingFlight.objects.filter(
+            flight_id__in=flight_ids, flight_date__in=dates
+        ).exclude(
+            booking_item__booking__status__name__in=BookingStatus.CANCELLED_NAMES
+        ).order_by().values('flight_id', 'flight_class_id', 'flight_date').annotate(
+            passengers=Sum('passengers')
+        ).values_list('flight_id', 'flight_class_id', 'flight_date', 'passengers'):
+            key = (flight_id, flight_class_id, fare_date)
+            if key in fares:
+                held[key] = passengers
+        return held
+
+    def _write_batch(self, rows):
+        """rows : tuples renvoyés par _parse()"""
+        new_flights = {}
+        changed_flights = {}
+        fares = {}
+        for flight_key, (duration, aircraft), flight_class_id, fare_date, seats, price, currency in rows:
+            known = self.flights.get(flight_key)
+            if known is None:
+                flight = new_flights.get(flight_key)
+                if flight is None:
+                    flight = new_flights[flight_key] = Flight(
+                        airline_id=flight_key[0], flight_number=flight_key[1],
+                        departure_airport_id=flight_key[2], arrival_airport_id=flight_key[3]
+                    )
+                flight.duration_minutes = duration if duration is not None else flight.duration_minutes
+                flight.aircraft_type = aircraft or flight.aircraft_type
+                flight_id = flight.id
+            else:
+                flight_id, known_duration, known_aircraft = known
+                if (duration is not None and duration != known_duration) or (aircraft and aircraft != known_aircraft):
+                    changed_flights[flight_id] = (
+                        duration if duration is not None else known_duration, aircraft or known_aircraft
+                    )
+                    self.flights[flight_key] = (flight_id,) + changed_flights[flight_id]
+            fares[(flight_id, flight_class_id, fare_date)] = (seats, price, currency)
+            self.airline_ids.add(flight_key[0])
+
+        with transaction.atomic():
+            if new_flights:
+                Flight.objects.bulk_create(new_flights.values(), batch_size=1000)
+            for flight_id, (duration, aircraft) in changed_flights.items():
+                Flight.objects.filter(id=flight_id).update(
+                    duration_minutes=duration, aircraft_type=aircraft, updated_at=timezone.now()
+                )
+            # Une réservation en cours attend la fin du lot, ou le lot la sienne
+            list(FlightAvailability.objects.select_for_update().filter(
+                flight_id__in={flight_id for flight_id, _, _ in fares},
+                date__in={fare_date for _, _, fare_date in fares}
+            ).order_by('flight_id', 'flight_class_id', 'date').values_list('id', flat=True))
+            held = self._held_seats(fares)
+            FlightAvailability.objects.bulk_create(
+                [
+                    FlightAvailability(
+                        flight_id=flight_id, flight_class_id=flight_class_id, date=fare_date,
+                        available_seats=max(seats - held.get((flight_id, flight_class_id, fare_date), 0), 0),
+                        price=price, currency=currency
+                    )
+                    for (flight_id, flight_class_id, fare_date), (seats, price, currency) in fares.items()
+                ],
+                batch_size=1000,
+                **upsert_options(
+                    FlightAvailability, ['flight', 'flight_class', 'date'],
+                    ['available_seats', 'price', 'currency', 'updated_at']
+                )
+            )
+
+        for flight_key, flight in new_flights.items():
+            self.flights[flight_key] = (flight.id, flight.duration_minutes, flight.aircraft_type)
+        self.report['flights_created'] += len(new_flights)
+        self.report['flights_updated'] += len(changed_flights)
+        self.report['fares'] += len(fares)
+
+    def _prune(self, load_started_at):
+        """Supprimer par lots les tarifs futurs des compagnies du fichier non écrits par le chargement"""
+        stale = FlightAvailability.objects.filter(
+            flight__airline_id__in=self.airline_ids,
+            date__gte=self.today,
+            updated_at__lt=load_started_at
+        ).order_by()
+        while True:
+            ids = list(stale.values_list('id', flat=True)[:self.batch_size])
+            if not ids:
+                break
+            deleted, _ = FlightAvailability.objects.filter(id__in=ids).delete()
+            self.report['pruned'] += deleted
+
+    # ------------------------------------------------------------------
+    # Chargement
+    # ------------------------------------------------------------------
+
+    def load(self, lines, file_format='csv', progress=None):
+        """
+        Charger les lignes d'un fichier texte (itérable de lignes, par exemple
+        un fichier ouvert). `progress(report)` est appelé après chaque lot.
+
+        Retourne le rapport : rows (lignes lues), fares (tarifs écrits),
+        flights_created, flights_updated, rejected, errors (les
+        MAX_REPORTED_ERRORS premières), pruned, seconds et rows_per_second.
+        """
+        if file_format not in FORMATS:
+            raise ValueError(f"Format inconnu : {file_format} ({', '.join(FORMATS)})")
+        started = time.perf_counter()
+        load_started_at = timezone.now()
+
+        batch = []
+        for line_number, record, error in iter_records(lines, file_format):
+            self.report['rows'] += 1
+            if error is None:
+                try:
+                    batch.append(self._parse(record))
+                except ValueError as exc:
+                    error = str(exc)
+            if error is not None:
+                self._reject(line_number, error)
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                batch = []
+                if progress is not None:
+                    progress(self.report)
+        if batch:
+            self._write_batch(batch)
+            if progress is not None:
+                progress(self.report)
+
+        if self.prune and self.airline_ids:
+            self._prune(load_started_at)
+
+        if self.report['fares'] or self.report['pruned']:
+            itinerary_graph.dirty = True
+
+        seconds = time.perf_counter() - started
+        self.report['seconds'] = round(seconds, 3)
+        self.report['rows_per_second'] = round(self.report['rows'] / seconds) if seconds else self.report['rows']
+        return self.report
+
+
+def load_fares(lines, file_format='csv', batch_size=BATCH_SIZE, prune=False, today=None, progress=None):
+    """Charger un fichier de tarifs (voir FareLoader.load)"""
+    return FareLoader(batch_size, prune, today).load(lines, file_format, progress)
@@ -0,0 +1,306 @@
+"""
+Recherche d'itinéraires avec correspondances (direct, 1 ou 2 escales).
+
+Le graphe des routes est gardé en mémoire, propre au processus : un nœud par
+aéroport, un arc par vol programmé ou retardé (aéroport de départ → aéroport
+d'arrivée, durée). Les tarifs d'une date (FlightAvailability) sont chargés à
+la première recherche sur cette date puis gardés pour les suivantes
+(ITINERARY_FARE_DATES dates au plus) ; pour une classe et un nombre de sièges
+donnés, chaque vol garde son tarif le moins cher et les arcs sont triés par
+prix et par durée.
+
+Les vols n'ont pas d'horaires : une correspondance enchaîne des vols qui ont
+un tarif à la date demandée, et chaque escale compte LAYOVER_MINUTES dans la
+durée totale. Les itinéraires sont énumérés par coût croissant (prix ou durée
+selon le tri) avec élagage : une branche est abandonnée dès que son coût
+partiel dépasse le K-ième meilleur itinéraire trouvé, max_price ou
+max_duration. Les aéroports ne se répètent pas dans un itinéraire.
+
+Maintenance : les signaux de Flight et Airport (voir signals.py) marquent le
+graphe à reconstruire ; ceux de FlightAvailability oublient les tarifs de la
+date modifiée. Le graphe est reconstruit après FLIGHT_ITINERARY_GRAPH_MAX_AGE
+secondes pour rattraper les écritures des autres processus.
+"""
+import heapq
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Airport, Flight, FlightAvailability
+
+
+LAYOVER_MINUTES = 90
+MAX_STOPS = 2
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+ITINERARY_FARE_DATES = 30
+# Vues tarifées (date, classe, sièges) gardées en mémoire
+DAY_VIEWS = 64
+SEARCHABLE_STATUSES = ['scheduled', 'delayed']
+
+
+class Leg:
+    """Vol tarifé d'un itinéraire"""
+    __slots__ = (
+        'flight_id', 'departure', 'arrival', 'duration', 'price', 'currency',
+        'flight_class_id', 'available_seats'
+    )
+
+    def __init__(self, flight_id, departure, arrival, duration, price, currency, flight_class_id, available_seats):
+        self.flight_id = flight_id
+        self.departure = departure
+        self.arrival = arrival
+        self.duration = duration
+        self.price = price
+        self.currency = currency
+        self.flight_class_id = flight_class_id
+        self.available_seats = available_seats
+
+
+class DayView:
+    """Arcs tarifés d'une date, pour une classe et un nombre de sièges"""
+
+    def __init__(self, legs):
+        self.by_price = {}
+        self.by_duration = {}
+        self.pair_by_price = {}
+        self.pair_by_duration = {}
+        for leg in legs:
+            self.by_price.setdefault(leg.departure, []).append(leg)
+            self.pair_by_price.setdefault((leg.departure, leg.arrival), []).append(leg)
+        for index in (self.by_price, self.pair_by_price):
+            for key, members in index.items():
+                members.sort(key=lambda leg: (leg.price, leg.duration))
+        self.by_duration = {
+            key: sorted(members, key=lambda leg: (leg.duration, leg.price))
+            for key, members in self.by_price.items()
+        }
+        self.pair_by_duration = {
+            key: sorted(members, key=lambda leg: (leg.duration, leg.price))
+            for key, members in self.pair_by_price.items()
+        }
+
+
+class ItineraryGraph:
+    """Graphe des routes aériennes et tarifs par date, en mémoire"""
+
+    def __init__(self):
+        self.flights = {}
+        self.airports = {}
+        self.iata_codes = {}
+        self.built_at = None
+        self.build_seconds = None
+        self.dirty = True
+        self._fares = OrderedDict()
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    def rebuild(self):
+        started = time.perf_counter()
+        # Une écriture pendant la lecture remettra dirty à True
+        self.dirty = False
+        airports = {}
+        iata_codes = {}
+        for airport_id, iata_code in Airport.objects.order_by().values_list('id', 'iata_code'):
+            airports[iata_code.upper()] = airport_id
+            iata_codes[airport_id] = iata_code.upper()
+        flights = {
+            flight_id: (departure, arrival, duration or 0)
+            for flight_id, departure, arrival, duration in Flight.objects.filter(
+                status__in=SEARCHABLE_STATUSES
+            ).order_by().values_list('id', 'departure_airport_id', 'arrival_airport_id', 'duration_minutes')
+        }
+        with self._lock:
+            self.airports = airports
+            self.iata_codes = iata_codes
+            self.flights = flights
+            self._fares = OrderedDict()
+            self._views = OrderedDict()
+            self.built_at = time.monotonic()
+            self.build_seconds = round(time.perf_counter() - started, 3)
+        return self
+
+    def ensure_fresh(self):
+        max_age = getattr(settings, 'FLIGHT_ITINERARY_GRAPH_MAX_AGE', 300)
+        if self.dirty or self.built_at is None or time.monotonic() - self.built_at > max_age:
+            with self._build_lock:
+                if self.dirty or self.built_at is None or time.monotonic() - self.built_at > max_age:
+                    self.rebuild()
+        return self
+
+    def invalidate_date(self, date):
+        """Oublier les tarifs d'une date (écriture sur FlightAvailability)"""
+        with self._lock:
+            self._fares.pop(date, None)
+            for key in [key for key in self._views if key[0] == date]:
+                del self._views[key]
+
+    def _fares_for(self, date):
+        """Tarifs de la date : (flight_id, classe, sièges, prix, devise)"""
+        with self._lock:
+            fares = self._fares.get(date)
+            if fares is not None:
+                self._fares.move_to_end(date)
+                return fares
+        # Les vols hors graphe (annulés, terminés) sont écartés par day_view
+        fares = [
+            (flight_id, flight_class_id, seats, float(price), currency)
+            for flight_id, flight_class_id, seats, price, currency in FlightAvailability.objects.filter(
+                date=date, available_seats__gt=0
+            ).order_by().values_list('flight_id', 'flight_class_id', 'available_seats', 'price', 'currency')
+        ]
+        with self._lock:
+            self._fares[date] = fares
+            while len(self._fares) > getattr(settings, 'FLIGHT_ITINERARY_FARE_DATES', ITINERARY_FARE_DATES):
+                self._fares.popitem(last=False)
+        return fares
+
+    def day_view(self, date, flight_class_id=None, min_seats=1):
+        """Arcs tarifés (tarif le moins cher par vol) d'une date"""
+        key = (date, str(flight_class_id) if flight_class_id else None, min_seats)
+        with self._lock:
+            view = self._views.get(key)
+            if view is not None:
+                self._views.move_to_end(key)
+                return view
+
+        best = {}
+        for flight_id, class_id, seats, price, currency in self._fares_for(date):
+            if seats < min_seats or (key[1] is not None and str(class_id) != key[1]):
+                continue
+            if flight_id not in self.flights:
+                continue
+            current = best.get(flight_id)
+            if current is None or price < current[2]:
+                best[flight_id] = (class_id, seats, price, currency)
+        legs = []
+        for flight_id, (class_id, seats, price, currency) in best.items():
+            departure, arrival, duration = self.flights[flight_id]
+            legs.append(Leg(flight_id, departure, arrival, duration, price, currency, class_id, seats))
+        view = DayView(legs)
+
+        with self._lock:
+            self._views[key] = view
+            while len(self._views) > DAY_VIEWS:
+                self._views.popitem(last=False)
+        return view
+
+    # ------------------------------------------------------------------
+    # Recherche
+    # ------------------------------------------------------------------
+
+    def search(self, departure_iata, arrival_iata, date, flight_class_id=None, min_seats=1,
+               max_stops=MAX_STOPS, max_price=None, max_duration=None, ordering='price',
+               limit=DEFAULT_LIMIT):
+        """
+        Meilleurs itinéraires (au plus `limit`) triés par `ordering` (price
+        ou duration), puis par l'autre critère.
+
+        Retourne une liste de listes de Leg ; liste vide si un aéroport est
+        inconnu.
+        """
+        origin = self.airports.get(departure_iata.upper())
+        destination = self.airports.get(arrival_iata.upper())
+        if origin is None or destination is None or origin == destination:
+            return []
+        view = self.day_view(date, flight_class_id, min_seats)
+        return _best_itineraries(view, origin, destination, max_stops, max_price, max_duration, ordering, limit)
+
+
+def _best_itineraries(view, origin, destination, max_stops, max_price, max_duration, ordering, limit):
+    by_duration = ordering == 'duration'
+    outgoing = view.by_duration if by_duration else view.by_price
+    pairs = view.pair_by_duration if by_duration else view.pair_by_price
+    max_price = float('inf') if max_price is None else max_price
+    max_duration = float('inf') if max_duration is None else max_duration
+
+    def leg_cost(leg):
+        return leg.duration if by_duration else leg.price
+
+    # Tas des `limit` meilleurs, le moins bon au sommet :
+    # (-coût, -coût secondaire, -ordre de découverte, legs)
+    best = []
+    counter = 0
+
+    def threshold():
+        return -best[0][0] if len(best) >= limit else float('inf')
+
+    def offer(legs, price, duration):
+        nonlocal counter
+        if price > max_price or duration > max_duration:
+            return
+        if any(leg.currency != legs[0].currency for leg in legs):
+            return
+        cost, secondary = (duration, price) if by_duration else (price, duration)
+        entry = (-cost, -secondary, -counter, legs)
+        counter += 1
+        if len(best) < limit:
+            heapq.heappush(best, entry)
+        elif entry > best[0]:
+            heapq.heapreplace(best, entry)
+
+    for leg in pairs.get((origin, destination), ()):
+        offer([leg], leg.price, leg.duration)
+
+    # Les arcs sont triés par coût : dès qu'un coût partiel dépasse le seuil,
+    # les arcs suivants le dépassent aussi
+    if max_stops >= 1:
+        for first in outgoing.get(origin, ()):
+            hub = first.arrival
+            if hub == destination or hub == origin:
+                continue
+            if leg_cost(first) > threshold():
+                break
+            if first.price > max_price or first.duration > max_duration:
+                continue
+            for second in pairs.get((hub, destination), ()):
+                price = first.price + second.price
+                duration = first.duration + second.duration + LAYOVER_MINUTES
+                cost = duration if by_duration else price
+                if cost > threshold():
+                    break
+                offer([first, second], price, duration)
+
+    if max_stops >= 2:
+        for first in outgoing.get(origin, ()):
+            hub = first.arrival
+            if hub == destination or hub == origin:
+                continue
+            if leg_cost(first) > threshold():
+                break
+            if first.price > max_price or first.duration > max_duration:
+                continue
+            for second in outgoing.get(hub, ()):
+                second_hub = second.arrival
+                if second_hub in (origin, hub, destination):
+                    continue
+                price = first.price + second.price
+                duration = first.duration + second.duration + 2 * LAYOVER_MINUTES
+                cost = duration if by_duration else price
+                if cost > threshold():
+                    break
+                if price > max_price or duration > max_duration:
+                    continue
+                for third in pairs.get((second_hub, destination), ()):
+                    total_price = price + third.price
+                    total_duration = duration + third.duration
+                    if (total_duration if by_duration else total_price) > threshold():
+                        break
+                    offer([first, second, third], total_price, total_duration)
+
+    return [entry[3] for entry in sorted(best, reverse=True)]
+
+
+itinerary_graph = ItineraryGraph()
+
+
+def get_itinerary_graph():
+    """Graphe du processus, construit ou reconstruit si nécessaire"""
+    return itinerary_graph.ensure_fresh()
@@ -0,0 +1,161 @@
+"""
+Benchmark de la réservation des sièges de vol sous concurrence (flights.seats).
+
+Crée un trajet synthétique en deux vols (aéroports préfixés « QX », classe
+« bench-seats »), puis lance --bookers réservations simultanées (un thread
+et une connexion par réservation, départ synchronisé) de 1 à
+--max-passengers sièges sur les deux vols, tout ou rien. Le second vol a
+moins de sièges que le premier : les réservations refusées sur le second
+vol ne doivent rien décompter sur le premier.
+
+Vérifie l'absence de survente (sièges vendus = capacité - sièges restants,
+jamais au-delà de la capacité, mêmes ventes sur les deux vols), affiche le
+débit et les latences, puis rend tous les sièges vendus (release).
+
+À lancer uniquement sur une base de test :
+    python manage.py bench_seat_reservations --yes --bookers 200
+"""
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from flights.models import Airline, Airport, FlightClass, Flight, FlightAvailability
+from flights.seats import SeatsUnavailable, reserve, release
+
+
+BENCH_PREFIX = 'bench-seats-'
+
+
+class Command(BaseCommand):
+    help = "Mesurer la réservation concurrente des sièges de vol (survente et débit)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookers', type=int, default=200, help='Réservations simultanées')
+        parser.add_argument('--seats', type=int, default=180, help='Sièges du premier vol')
+        parser.add_argument('--connecting-seats', type=int, default=150, help='Sièges du second vol')
+        parser.add_argument('--max-passengers', type=int, default=2, help='Sièges par réservation (1 à N)')
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Supprimer les données synthétiques à la fin')
+        parser.add_argument('--yes', action='store_true',
+                            help='Confirmer l\'écriture de données synthétiques dans la base')
+
+    def handle(self, *args, **options):
+        if not options['yes']:
+            raise CommandError('Ce benchmark écrit dans la base. Relancez avec --yes sur une base de test.')
+
+        capacities = [options['seats'], options['connecting_seats']]
+        flight_class, flights, date = self._create_route(capacities)
+        rng = random.Random(42)
+        requests = [rng.randint(1, options['max_passengers']) for _ in range(options['bookers'])]
+        barrier = threading.Barrier(options['bookers'])
+
+        def book(passengers):
+            try:
+                barrier.wait()
+                started = time.perf_counter()
+                try:
+                    reserve([(flight.id, flight_class.id, date, passengers) for flight in flights])
+                    accepted = True
+                except SeatsUnavailable:
+                    accepted = False
+                return accepted, passengers, time.perf_counter() - started, None
+            except Exception as exc:
+                return False, passengers, 0, exc
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['bookers']) as executor:
+            results = list(executor.map(book, requests))
+        elapsed = time.perf_counter() - started
+
+        errors = [error for _, _, _, error in results if error is not None]
+        sold = sum(passengers for accepted, passengers, _, _ in results if accepted)
+        accepted_count = sum(1 for accepted, _, _, _ in results if accepted)
+        latencies = sorted(latency * 1000 for _, _, latency, error in results if error is None)
+        remaining = [
+            FlightAvailability.objects.get(flight=flight, flight_class=flight_class, date=date).available_seats
+            for flight in flights
+        ]
+
+        self.stdout.write(
+            f"{options['bookers']} réservations en {elapsed:.3f} s "
+            f"({options['bookers'] / elapsed:.0f} réservations/s)"
+        )
+        self.stdout.write(f'acceptées : {accepted_count}, refusées : {len(results) - accepted_count - len(errors)}, '
+                          f'erreurs : {len(errors)}')
+        if latencies:
+            self.stdout.write(
+                f'latence médiane : {statistics.median(latencies):.1f} ms, '
+                f'p95 : {latencies[max(0, int(len(latencies) * 0.95) - 1)]:.1f} ms'
+            )
+        oversold = 0
+        for flight, capacity, left in zip(flights, capacities, remaining):
+            self.stdout.write(
+                f'{flight.flight_number} : capacité {capacity}, vendus {sold}, restants {left}'
+            )
+            if left < 0 or capacity - left != sold:
+                oversold += 1
+        for error in errors[:5]:
+            self.stdout.write(self.style.ERROR(f'{type(error).__name__} : {error}'))
+
+        if oversold or errors:
+            self.stdout.write(self.style.ERROR('Incohérence des sièges ou erreurs : voir ci-dessus'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Aucune survente'))
+
+        # Rendre les sièges vendus
+        release([
+            (flight.id, flight_class.id, date, passengers)
+            for accepted, passengers, _, _ in results if accepted
+            for flight in flights
+        ])
+        restored = [
+            FlightAvailability.objects.get(flight=flight, flight_class=flight_class, date=date).available_seats
+            for flight in flights
+        ]
+        if restored == capacities:
+            self.stdout.write(self.style.SUCCESS('Sièges rendus : capacités rétablies'))
+        else:
+            self.stdout.write(self.style.ERROR(f'Sièges rendus : {restored} au lieu de {capacities}'))
+
+        if options['cleanup']:
+            Flight.objects.filter(flight_number__startswith=BENCH_PREFIX).delete()
+            Airport.objects.filter(name__startswith=BENCH_PREFIX).delete()
+            Airline.objects.filter(name__startswith=BENCH_PREFIX).delete()
+            FlightClass.objects.filter(name__startswith=BENCH_PREFIX).delete()
+            self.stdout.write(self.style.SUCCESS('Données synthétiques supprimées'))
+
+    def _create_route(self, capacities):
+        """Trajet QXA → QXB → QXC et ses disponibilités, remises à `capacities`"""
+        airline, _ = Airline.objects.get_or_create(code='QXZ', defaults={'name': f'{BENCH_PREFIX}airline'})
+        airports = [
+            Airport.objects.get_or_create(iata_code=code, defaults={'name': f'{BENCH_PREFIX}{code}'})[0]
+            for code in ('QXA', 'QXB', 'QXC')
+        ]
+        flight_class, _ = FlightClass.objects.get_or_create(name=f'{BENCH_PREFIX}class')
+        date = timezone.localdate() + timedelta(days=30)
+        flights = []
+        for i, capacity in enumerate(capacities):
+            flight, _ = Flight.objects.get_or_create(
+                flight_number=f'{BENCH_PREFIX}{i}',
+                defaults={
+                    'airline': airline,
+                    'departure_airport': airports[i],
+                    'arrival_airport': airports[i + 1],
+                    'duration_minutes': 90,
+                }
+            )
+            FlightAvailability.objects.update_or_create(
+                flight=flight, flight_class=flight_class, date=date,
+                defaults={'available_seats': capacity, 'price': 100}
+            )
+            flights.append(flight)
+        return flight_class, flights, date
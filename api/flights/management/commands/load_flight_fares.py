@@ -0,0 +1,43 @@
+"""
+Charger un fichier quotidien de vols et de tarifs (CSV ou NDJSON), voir
+flights/fare_loader.py.
+
+    python manage.py load_flight_fares fares.csv
+    python manage.py load_flight_fares fares.ndjson --prune
+    zcat fares.csv.gz | python manage.py load_flight_fares - --format csv
+"""
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flights.fare_loader import BATCH_SIZE, FORMATS, detect_format, load_fares
+
+
+class Command(BaseCommand):
+    help = "Charger en masse des vols et des tarifs depuis un fichier CSV ou NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fichier à charger (- pour l\'entrée standard)')
+        parser.add_argument('--format', choices=FORMATS,
+                            help="Format du fichier (par défaut : d'après l'extension, csv sinon)")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Nombre de lignes écrites par lot')
+        parser.add_argument('--prune', action='store_true',
+                            help='Supprimer les tarifs futurs des compagnies du fichier qui n\'y figurent pas')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or detect_format(options['path'])
+
+        def progress(report):
+            self.stdout.write(f"{report['rows']} lignes lues, {report['rejected']} rejetées")
+
+        try:
+            if options['path'] == '-':
+                report = load_fares(sys.stdin, file_format, options['batch_size'], options['prune'], progress=progress)
+            else:
+                with open(options['path'], encoding='utf-8', newline='') as lines:
+                    report = load_fares(lines, file_format, options['batch_size'], options['prune'], progress=progress)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flightavailability',
+            index=models.Index(fields=['flight', 'date', 'price'], name='flight_avail_cheapest_idx'),
+        ),
+    ]
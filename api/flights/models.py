@@ -183,6 +183,8 @@ class FlightAvailability(models.Model):
         indexes = [
             models.Index(fields=['flight']),
             models.Index(fields=['date']),
+            # Tarif le moins cher d'un vol pour une date (sous-requêtes de FlightViewSet.search)
+            models.Index(fields=['flight', 'date', 'price'], name='flight_avail_cheapest_idx'),
         ]
         verbose_name_plural = 'Flight Availabilities'
     
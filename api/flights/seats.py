@@ -0,0 +1,83 @@
+"""
+Réservation et libération des sièges (FlightAvailability.available_seats).
+
+Chaque étape (vol, classe, date, sièges) est décomptée par un UPDATE
+conditionnel :
+
+    UPDATE flight_availability SET available_seats = available_seats - n
+    WHERE flight_id = ... AND flight_class_id = ... AND date = ... AND available_seats >= n
+
+Le test et la décrémentation sont faits par la base dans la même
+instruction : aucune lecture préalable en Python, donc ni survente ni verrou
+tenu entre la lecture et l'écriture. Une étape refusée (0 ligne modifiée)
+annule les étapes déjà décomptées de la même réservation (tout ou rien). Les
+étapes sont traitées dans un ordre fixe pour que deux réservations
+multi-vols simultanées ne se bloquent pas mutuellement.
+
+Les réservations de vols (bookings.BookingFlight) passent par ce module
+via les signaux de bookings (création, modification, suppression,
+annulation et réactivation d'une réservation). Les UPDATE ne déclenchent pas
+les signaux de FlightAvailability : les sièges affichés par les itinéraires
+et le calendrier des tarifs suivent au rythme de leurs caches.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import FlightAvailability
+
+
+class SeatsUnavailable(ValueError):
+    """Une étape n'a plus assez de sièges ; `leg` = (flight_id, flight_class_id, date, sièges)"""
+
+    def __init__(self, leg):
+        self.leg = leg
+        flight_id, flight_class_id, date, seats = leg
+        super().__init__(
+            f"Plus assez de sièges disponibles sur le vol {flight_id} ({date}) pour {seats} passager(s)"
+        )
+
+
+def _normalize(legs):
+    """Étapes (flight_id, flight_class_id, date, sièges) regroupées et triées"""
+    seats = {}
+    for flight_id, flight_class_id, date, count in legs:
+        if count <= 0:
+            raise ValueError('Le nombre de sièges doit être positif')
+        key = (str(flight_id), str(flight_class_id), date)
+        seats[key] = seats.get(key, 0) + count
+    return [key + (count,) for key, count in sorted(seats.items())]
+
+
+def _availability(flight_id, flight_class_id, date):
+    return FlightAvailability.objects.filter(flight_id=flight_id, flight_class_id=flight_class_id, date=date)
+
+
+def reserve(legs):
+    """
+    Décompter les sièges de toutes les étapes, ou d'aucune.
+
+    Lève SeatsUnavailable pour la première étape sans assez de sièges (ou
+    sans disponibilité pour cette date) ; les étapes déjà décomptées sont
+    alors annulées.
+    """
+    legs = _normalize(legs)
+    now = timezone.now()
+    with transaction.atomic():
+        for flight_id, flight_class_id, date, count in legs:
+            updated = _availability(flight_id, flight_class_id, date).filter(
+                available_seats__gte=count
+            ).update(available_seats=F('available_seats') - count, updated_at=now)
+            if not updated:
+                raise SeatsUnavailable((flight_id, flight_class_id, date, count))
+
+
+def release(legs):
+    """Rendre les sièges des étapes (annulation, modification ou suppression)"""
+    legs = _normalize(legs)
+    now = timezone.now()
+    with transaction.atomic():
+        for flight_id, flight_class_id, date, count in legs:
+            _availability(flight_id, flight_class_id, date).update(
+                available_seats=F('available_seats') + count, updated_at=now
+            )
@@ -166,3 +166,18 @@ class FlightSerializer(serializers.ModelSerializer):
     def get_duration_hours(self, obj):
         return obj.duration_hours
 
+
+class FlightSearchSerializer(FlightSerializer):
+    """Serializer des résultats de recherche, avec le tarif le moins cher (annotations de search)"""
+    fare_date = serializers.DateField(read_only=True)
+    cheapest_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    cheapest_currency = serializers.CharField(read_only=True)
+    cheapest_flight_class_id = serializers.UUIDField(read_only=True)
+    cheapest_flight_class_name = serializers.CharField(read_only=True)
+    cheapest_available_seats = serializers.IntegerField(read_only=True)
+    
+    class Meta(FlightSerializer.Meta):
+        fields = FlightSerializer.Meta.fields + [
+            'fare_date', 'cheapest_price', 'cheapest_currency', 'cheapest_flight_class_id',
+            'cheapest_flight_class_name', 'cheapest_available_seats'
+        ]
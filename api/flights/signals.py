@@ -0,0 +1,43 @@
+"""
+Signaux de l'app flights.
+
+Les écritures sur les vols et les aéroports marquent le graphe des
+itinéraires (itineraries) à reconstruire ; celles sur les disponibilités
+oublient les tarifs en mémoire de la date modifiée. Les écritures sur les
+aéroports marquent aussi l'index d'autocomplétion (airport_index) à
+reconstruire.
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Airport, Flight, FlightAvailability
+from .airport_index import airport_index
+from .itineraries import itinerary_graph
+
+
+# ============================================================================
+# GRAPHE DES ITINÉRAIRES
+# ============================================================================
+
+@receiver(post_save, sender=Flight)
+@receiver(post_delete, sender=Flight)
+@receiver(post_save, sender=Airport)
+@receiver(post_delete, sender=Airport)
+def itinerary_graph_changed(sender, **kwargs):
+    itinerary_graph.dirty = True
+
+
+@receiver(post_save, sender=FlightAvailability)
+@receiver(post_delete, sender=FlightAvailability)
+def itinerary_fares_changed(sender, instance, **kwargs):
+    itinerary_graph.invalidate_date(instance.date)
+
+
+# ============================================================================
+# AUTOCOMPLÉTION DES AÉROPORTS
+# ============================================================================
+
+@receiver(post_save, sender=Airport)
+@receiver(post_delete, sender=Airport)
+def airport_index_changed(sender, **kwargs):
+    airport_index.dirty = True
@@ -0,0 +1,202 @@
+"""
+Mise à jour en masse du statut des vols (retards, annulations poussés par
+les compagnies) et notification des voyageurs concernés.
+
+Une mise à jour = (vol, date, statut, message facultatif). Le statut est
+celui du vol (Flight.status), pour toutes ses dates : le modèle n'a pas de
+statut par date, une annulation « du 12 juin » annule donc le vol. La date
+désigne seulement les réservations à prévenir : les BookingFlight de ce vol
+à cette date dont la réservation n'est pas annulée. Si un même vol apparaît
+plusieurs fois, le dernier statut est retenu sur le vol.
+
+Seules les mises à jour qui changent le statut du vol (par rapport à son
+statut avant la requête) modifient le vol et préviennent les voyageurs ; les
+autres (statut renvoyé une seconde fois par la compagnie) sont listées dans
+unchanged, sans notification.
+
+Tout est fait dans une transaction, par lots de `batch_size` mises à jour.
+Un lot coûte un nombre fixe de requêtes : lecture des vols (verrouillés,
+avec leur statut), un UPDATE par
+statut, une jointure BookingFlight → BookingItem → Booking (index
+booking_flight_date_idx sur (flight, flight_date)) pour trouver les
+réservations, puis un bulk_create des notifications. Chaque client reçoit
+une notification par vol et date, qui cite ses références de réservation.
+
+Les UPDATE contournent les signaux : le graphe des itinéraires est marqué à
+reconstruire ; le calendrier des tarifs suit à l'expiration de son cache.
+"""
+import uuid
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from bookings.models import BookingFlight, BookingStatus
+from notifications.models import Notification
+
+from .itineraries import itinerary_graph
+from .models import Flight
+
+
+BATCH_SIZE = 500
+MAX_UPDATES = 5000
+STATUSES = [value for value, _ in Flight.STATUS_CHOICES]
+
+# Statuts annoncés aux voyageurs : (type de notification, libellé)
+NOTIFIED_STATUSES = {
+    'delayed': ('alert', 'retardé'),
+    'cancelled': ('alert', 'annulé'),
+    'scheduled': ('info', 'de nouveau programmé'),
+}
+
+
+def parse_updates(items):
+    """
+    Mises à jour (flight_id, date, statut, message) d'une liste de dicts
+    {flight_id, date, status, message} ; ValueError si un élément est invalide.
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError('updates est requis (liste de {flight_id, date, status})')
+    if len(items) > MAX_UPDATES:
+        raise ValueError(f'Maximum {MAX_UPDATES} mises à jour par requête')
+
+    updates = []
+    for position, item in enumerate(items):
+        if not isinstance(item, dict) or not all(item.get(field) for field in ('flight_id', 'date', 'status')):
+            raise ValueError(f'Mise à jour {position} : flight_id, date et status sont requis')
+        if item['status'] not in STATUSES:
+            raise ValueError(f"Mise à jour {position} : status doit valoir {', '.join(STATUSES)}")
+        try:
+            flight_date = datetime.strptime(str(item['date']), '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError(f'Mise à jour {position} : format de date invalide. Utilisez YYYY-MM-DD')
+        try:
+            flight_id = str(uuid.UUID(str(item['flight_id'])))
+        except ValueError:
+            raise ValueError(f"Mise à jour {position} : identifiant de vol invalide: {item['flight_id']}")
+        message = str(item.get('message') or '').strip()
+        updates.append((flight_id, flight_date, item['status'], message))
+    return updates
+
+
+def _notification(user_id, flight_label, flight_date, status, message, references):
+    notification_type, status_label = NOTIFIED_STATUSES[status]
+    text = f"Votre vol {flight_label} du {flight_date:%d/%m/%Y} est {status_label}."
+    if message:
+        text += f" {message.rstrip('.')}."
+    text += f" Réservation(s) : {', '.join(sorted(references))}"
+    return Notification(
+        user_id=user_id,
+        type=notification_type,
+        title=f"Vol {flight_label} {status_label}",
+        message=text
+    )
+
+
+def _apply_batch(updates, report, updated, initial):
+    """
+    `initial` : statut de chaque vol avant la requête (complété au fil des
+    lots) ; `updated` : vols dont le statut a été modifié.
+    """
+    flights = {}
+    current = {}
+    for flight_id, airline_code, flight_number, flight_status in Flight.objects.select_for_update(
+        of=('self',)
+    ).filter(
+        id__in={flight_id for flight_id, _, _, _ in updates}
+    ).values_list('id', 'airline__code', 'flight_number', 'status'):
+        flights[str(flight_id)] = f"{airline_code}{flight_number}"
+        current[str(flight_id)] = flight_status
+        initial.setdefault(str(flight_id), flight_status)
+    for flight_id, _, _, _ in updates:
+        if flight_id not in flights and flight_id not in report['not_found']:
+            report['not_found'].append(flight_id)
+
+    found = []
+    final = {}
+    for flight_id, flight_date, status, message in updates:
+        if flight_id not in flights:
+            continue
+        final[flight_id] = status
+        if status == initial[flight_id]:
+            report['unchanged'].append({
+                'flight_id': flight_id,
+                'flight': flights[flight_id],
+                'date': flight_date.isoformat(),
+                'status': status,
+            })
+        else:
+            found.append((flight_id, flight_date, status, message))
+
+    # Dernier statut de chaque vol, puis un UPDATE par statut, seulement s'il change
+    statuses = {flight_id: status for flight_id, status in final.items() if status != current[flight_id]}
+    now = timezone.now()
+    for status in set(statuses.values()):
+        Flight.objects.filter(
+            id__in=[flight_id for flight_id, flight_status in statuses.items() if flight_status == status]
+        ).update(status=status, updated_at=now)
+    updated.update(statuses)
+
+    notified = [update for update in found if update[2] in NOTIFIED_STATUSES]
+    bookings = {}
+    if notified:
+        condition = Q()
+        for flight_id, flight_date, _, _ in notified:
+            condition |= Q(flight_id=flight_id, flight_date=flight_date)
+        for flight_id, flight_date, user_id, reference, passengers in BookingFlight.objects.filter(
+            condition
+        ).exclude(
+            booking_item__booking__status__name__in=BookingStatus.CANCELLED_NAMES
+        ).order_by().values_list(
+            'flight_id', 'flight_date', 'booking_item__booking__user_id',
+            'booking_item__booking__booking_reference', 'passengers'
+        ):
+            bookings.setdefault((str(flight_id), flight_date), []).append((user_id, reference, passengers))
+
+    notifications = []
+    for flight_id, flight_date, status, message in found:
+        rows = bookings.pop((flight_id, flight_date), []) if status in NOTIFIED_STATUSES else []
+        references_by_user = {}
+        for user_id, reference, _ in rows:
+            references_by_user.setdefault(user_id, []).append(reference)
+        for user_id, references in references_by_user.items():
+            notifications.append(
+                _notification(user_id, flights[flight_id], flight_date, status, message, references)
+            )
+        report['flights'].append({
+            'flight_id': flight_id,
+            'flight': flights[flight_id],
+            'date': flight_date.isoformat(),
+            'status': status,
+            'bookings': len(rows),
+            'passengers': sum(passengers for _, _, passengers in rows),
+            'notified': len(references_by_user),
+        })
+    Notification.objects.bulk_create(notifications, batch_size=1000)
+    report['notifications'] += len(notifications)
+
+
+def apply_status_updates(updates, batch_size=BATCH_SIZE):
+    """
+    Appliquer des mises à jour (voir parse_updates) en une transaction.
+
+    Retourne le rapport : flights_updated, notifications, flights (par mise à
+    jour qui change le statut : bookings, passengers et notified, le nombre
+    de clients prévenus), unchanged (mises à jour sans changement de statut,
+    ni écrites ni notifiées), not_found (vols inconnus) et status_scope
+    (« flight » : le statut s'applique au vol pour toutes ses dates).
+    """
+    report = {
+        'flights_updated': 0, 'notifications': 0, 'flights': [], 'unchanged': [], 'not_found': [],
+        'status_scope': 'flight',
+    }
+    updated = set()
+    initial = {}
+    with transaction.atomic():
+        for start in range(0, len(updates), batch_size):
+            _apply_batch(updates[start:start + batch_size], report, updated, initial)
+    report['flights_updated'] = len(updated)
+    if report['flights_updated']:
+        itinerary_graph.dirty = True
+    return report
@@ -0,0 +1,562 @@
+import random
+from datetime import date, timedelta
+from functools import partial
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from bookings.models import Booking, BookingFlight, BookingItem, BookingStatus
+from notifications.models import Notification
+
+from .airport_index import AirportAutocompleteIndex
+from .fare_calendar import cheapest_dates, fare_calendar, get_cache as get_fare_calendar_cache
+from .fare_loader import FareLoader, load_fares
+from .itineraries import LAYOVER_MINUTES, DayView, Leg, _best_itineraries
+from .models import Airline, Airport, Flight, FlightAvailability, FlightClass
+from .seats import SeatsUnavailable, release, reserve
+from .status_updates import apply_status_updates, parse_updates
+
+
+class FlightTestCase(TestCase):
+    """Compagnie, aéroports, classe et vols communs aux tests"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.airline = Airline.objects.create(code='AF', name='Air France')
+        cls.cdg = Airport.objects.create(iata_code='CDG', name='Paris Charles de Gaulle')
+        cls.jfk = Airport.objects.create(iata_code='JFK', name='New York JFK')
+        cls.economy = FlightClass.objects.create(name='Economy')
+        cls.confirmed = BookingStatus.objects.create(name='confirmed')
+        cls.cancelled = BookingStatus.objects.create(name='cancelled')
+        cls.user = get_user_model().objects.create_user(email='client@example.com', password='secret')
+        cls.day = date(2030, 6, 1)
+
+    def create_flight(self, number, seats=None):
+        flight = Flight.objects.create(
+            airline=self.airline, flight_number=number,
+            departure_airport=self.cdg, arrival_airport=self.jfk, duration_minutes=480
+        )
+        if seats is not None:
+            FlightAvailability.objects.create(
+                flight=flight, flight_class=self.economy, date=self.day, available_seats=seats, price=300
+            )
+        return flight
+
+    def seats(self, flight):
+        return FlightAvailability.objects.get(flight=flight, date=self.day).available_seats
+
+    def book(self, flights, passengers=1, status=None, user=None, reference='REF'):
+        booking = Booking.objects.create(
+            user=user or self.user, booking_reference=reference, status=status or self.confirmed, total_amount=300
+        )
+        for flight in flights:
+            item = BookingItem.objects.create(
+                booking=booking, item_type='flight', item_id=str(flight.id), unit_price=300, total_price=300
+            )
+            BookingFlight.objects.create(
+                booking_item=item, flight=flight, flight_class=self.economy,
+                flight_date=self.day, passengers=passengers
+            )
+        return booking
+
+
+# ============================================================================
+# ITINÉRAIRES AVEC CORRESPONDANCES
+# ============================================================================
+
+class ItinerarySearchTests(SimpleTestCase):
+    """L'élagage du tas des K meilleurs donne les mêmes itinéraires qu'une énumération complète"""
+
+    def setUp(self):
+        rng = random.Random(18)
+        airports = list(range(8))
+        self.legs = [
+            Leg(index, departure, arrival, rng.randint(60, 600), float(rng.randint(50, 900)), 'EUR', 1, 9)
+            for index, (departure, arrival) in enumerate(
+                (departure, arrival) for departure in airports for arrival in airports
+                if departure != arrival and rng.random() < 0.5
+            )
+        ]
+        self.view = DayView(self.legs)
+
+    def all_itineraries(self, origin, destination, max_stops):
+        paths = []
+
+        def walk(path):
+            airport = path[-1].arrival if path else origin
+            if airport == destination:
+                paths.append(path)
+                return
+            if len(path) > max_stops:
+                return
+            visited = {origin} | {leg.arrival for leg in path}
+            for leg in self.legs:
+                if leg.departure == airport and leg.arrival not in visited:
+                    walk(path + [leg])
+
+        walk([])
+        return paths
+
+    def costs(self, itineraries, ordering):
+        result = []
+        for legs in itineraries:
+            price = sum(leg.price for leg in legs)
+            duration = sum(leg.duration for leg in legs) + LAYOVER_MINUTES * (len(legs) - 1)
+            result.append((duration, price) if ordering == 'duration' else (price, duration))
+        return result
+
+    def test_k_best_matches_exhaustive_search(self):
+        for ordering in ('price', 'duration'):
+            for max_stops in (0, 1, 2):
+                for origin, destination in [(0, 7), (3, 1), (5, 2)]:
+                    expected = sorted(self.costs(self.all_itineraries(origin, destination, max_stops), ordering))[:5]
+                    found = _best_itineraries(self.view, origin, destination, max_stops, None, None, ordering, 5)
+                    self.assertEqual(self.costs(found, ordering), expected)
+                    for legs in found:
+                        stops = [origin] + [leg.arrival for leg in legs]
+                        self.assertEqual(len(stops), len(set(stops)))
+
+    def test_limits_and_currencies(self):
+        found = _best_itineraries(self.view, 0, 7, 2, 800, 900, 'price', 50)
+        self.assertTrue(found)
+        for price, duration in self.costs(found, 'price'):
+            self.assertLessEqual(price, 800)
+            self.assertLessEqual(duration, 900)
+
+        view = DayView([
+            Leg(1, 0, 1, 60, 10.0, 'EUR', 1, 9),
+            Leg(2, 1, 2, 60, 10.0, 'USD', 1, 9),
+            Leg(3, 0, 2, 60, 500.0, 'EUR', 1, 9),
+        ])
+        found = _best_itineraries(view, 0, 2, 1, None, None, 'price', 5)
+        self.assertEqual([[leg.flight_id for leg in legs] for legs in found], [[3]])
+
+
+# ============================================================================
+# CALENDRIER DES TARIFS
+# ============================================================================
+
+class FareCalendarTests(FlightTestCase):
+    """Mois mis en cache séparément, minimums séparés par devise"""
+
+    def setUp(self):
+        get_fare_calendar_cache().clear()
+        self.addCleanup(get_fare_calendar_cache().clear)
+        self.flight = self.create_flight('001')
+        self.other = self.create_flight('002')
+
+    def fare(self, flight, day, price, currency='EUR', seats=5):
+        FlightAvailability.objects.create(
+            flight=flight, flight_class=self.economy, date=day, available_seats=seats, price=price, currency=currency
+        )
+
+    def test_months_are_loaded_once(self):
+        self.fare(self.flight, date(2030, 5, 31), 200)
+        self.fare(self.flight, date(2030, 6, 1), 300)
+
+        with self.assertNumQueries(2):
+            days = fare_calendar('cdg', 'jfk', date(2030, 5, 30), date(2030, 6, 2))
+        self.assertEqual([day['min_price'] for day in days], [None, 200, 300, None])
+        with self.assertNumQueries(0):
+            self.assertEqual(fare_calendar('CDG', 'JFK', date(2030, 5, 30), date(2030, 6, 2)), days)
+        # Seul juillet manque
+        with self.assertNumQueries(2):
+            fare_calendar('CDG', 'JFK', date(2030, 6, 25), date(2030, 7, 5))
+
+    def test_currencies_are_not_compared(self):
+        self.fare(self.flight, self.day, 300, 'EUR', seats=2)
+        self.fare(self.other, self.day, 250, 'USD', seats=3)
+        self.fare(self.flight, self.day + timedelta(days=1), 280, 'EUR', seats=0)
+        self.fare(self.flight, self.day + timedelta(days=2), 290, 'EUR')
+
+        days = fare_calendar('CDG', 'JFK', self.day, self.day + timedelta(days=2))
+        self.assertEqual(
+            (days[0]['min_price'], days[0]['currency'], days[0]['min_prices']),
+            (None, None, {'EUR': 300, 'USD': 250})
+        )
+        self.assertEqual((days[0]['available_seats'], days[0]['flights_count']), (5, 2))
+        self.assertEqual((days[1]['min_price'], days[1]['available_seats']), (None, 0))
+        self.assertEqual(
+            cheapest_dates(days),
+            {'EUR': str(self.day + timedelta(days=2)), 'USD': str(self.day)}
+        )
+
+
+# ============================================================================
+# RECHERCHE DE VOLS
+# ============================================================================
+
+class FlightSearchTests(FlightTestCase):
+    """Chaque vol porte son tarif le moins cher ; ordering=price trie sur ce tarif"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.business = FlightClass.objects.create(name='Business')
+        self.long = self.create_flight('001', seats=4)
+        Flight.objects.filter(pk=self.long.pk).update(duration_minutes=600)
+        FlightAvailability.objects.create(
+            flight=self.long, flight_class=self.business, date=self.day, available_seats=2, price=250
+        )
+        self.short = self.create_flight('002')
+        FlightAvailability.objects.create(
+            flight=self.short, flight_class=self.economy, date=self.day, available_seats=7, price=280
+        )
+        self.unpriced = self.create_flight('003')
+        self.cancelled_flight = self.create_flight('004', seats=9)
+        Flight.objects.filter(pk=self.cancelled_flight.pk).update(status='cancelled')
+
+    def search(self, **params):
+        response = self.client.get('/api/flights/flights/search/', {
+            'departure_iata': 'cdg', 'arrival_iata': 'JFK', 'date': str(self.day), **params
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'] if isinstance(response.data, dict) else response.data
+
+    def test_cheapest_fare_annotations(self):
+        results = {flight['flight_number']: flight for flight in self.search()}
+        self.assertEqual(set(results), {'001', '002'})
+        cheapest = results['001']
+        self.assertEqual(
+            (float(cheapest['cheapest_price']), cheapest['cheapest_flight_class_name'],
+             cheapest['cheapest_available_seats'], str(cheapest['fare_date'])),
+            (250.0, 'Business', 2, str(self.day))
+        )
+        self.assertEqual(float(results['002']['cheapest_price']), 280.0)
+
+    def test_ordering(self):
+        self.assertEqual([flight['flight_number'] for flight in self.search()], ['002', '001'])
+        self.assertEqual([flight['flight_number'] for flight in self.search(ordering='price')], ['001', '002'])
+        self.assertEqual(
+            [flight['flight_number'] for flight in self.search(ordering='price', flight_class_id=str(self.economy.id))],
+            ['002', '001']
+        )
+        response = self.client.get('/api/flights/flights/search/', {'ordering': 'cheapest'})
+        self.assertEqual(response.status_code, 400)
+
+
+# ============================================================================
+# SIÈGES DES VOLS
+# ============================================================================
+
+class SeatReservationTests(FlightTestCase):
+    """Les sièges sont décomptés tout ou rien et rendus à l'annulation"""
+
+    def test_full_leg_rejects_the_whole_reservation(self):
+        outbound = self.create_flight('001', seats=5)
+        inbound = self.create_flight('002', seats=1)
+        legs = [
+            (outbound.id, self.economy.id, self.day, 2),
+            (inbound.id, self.economy.id, self.day, 2),
+        ]
+        with self.assertRaises(SeatsUnavailable):
+            reserve(legs)
+        self.assertEqual((self.seats(outbound), self.seats(inbound)), (5, 1))
+
+        reserve(legs[:1])
+        release(legs[:1])
+        self.assertEqual(self.seats(outbound), 5)
+
+    def test_reactivated_booking_without_seats_changes_nothing(self):
+        outbound = self.create_flight('001', seats=4)
+        inbound = self.create_flight('002', seats=4)
+        booking = self.book([outbound, inbound], passengers=3, status=self.cancelled)
+        self.assertEqual((self.seats(outbound), self.seats(inbound)), (4, 4))
+
+        FlightAvailability.objects.filter(flight=inbound).update(available_seats=2)
+        booking.status = self.confirmed
+        with self.assertRaises(SeatsUnavailable):
+            booking.save()
+        self.assertEqual((self.seats(outbound), self.seats(inbound)), (4, 2))
+
+    def test_cancellation_and_deletion_release_seats(self):
+        flight = self.create_flight('001', seats=5)
+        booking = self.book([flight], passengers=2)
+        self.assertEqual(self.seats(flight), 3)
+
+        booking.status = self.cancelled
+        booking.save()
+        self.assertEqual(self.seats(flight), 5)
+
+        booking.status = self.confirmed
+        booking.save()
+        self.assertEqual(self.seats(flight), 3)
+
+        BookingFlight.objects.get(booking_item__booking=booking).delete()
+        self.assertEqual(self.seats(flight), 5)
+
+    def test_api_returns_400_when_flight_is_full(self):
+        flight = self.create_flight('001', seats=1)
+        booking = Booking.objects.create(
+            user=self.user, booking_reference='REF', status=self.confirmed, total_amount=300
+        )
+        item = BookingItem.objects.create(
+            booking=booking, item_type='flight', item_id=str(flight.id), unit_price=300, total_price=300
+        )
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.post('/api/bookings/flights/', {
+            'booking_item': str(item.id),
+            'flight': str(flight.id),
+            'flight_class': str(self.economy.id),
+            'flight_date': str(self.day),
+            'passengers': 2,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sièges', response.data['error'])
+        self.assertFalse(BookingFlight.objects.exists())
+        self.assertEqual(self.seats(flight), 1)
+
+
+# ============================================================================
+# CHARGEMENT DES TARIFS
+# ============================================================================
+
+class FareLoaderTests(FlightTestCase):
+    """Les lignes invalides sont rejetées, prune supprime les tarifs non rechargés"""
+
+    HEADER = 'airline,flight_number,departure,arrival,flight_class,date,available_seats,price,currency\n'
+
+    def test_invalid_lines_are_rejected_without_stopping_the_load(self):
+        report = load_fares([
+            self.HEADER,
+            'AF,001,CDG,JFK,Economy,2030-06-01,10,300,EUR\n',
+            'ZZ,002,CDG,JFK,Economy,2030-06-01,10,300,EUR\n',
+            'AF,003,CDG,CDG,Economy,2030-06-01,10,300,EUR\n',
+            'AF,004,CDG,JFK,Economy,01/06/2030,10,300,EUR\n',
+            'AF,005,CDG,JFK,Economy,2030-06-01,-1,300,EUR\n',
+            'AF,006,CDG,JFK,Economy,2030-06-01,10,300,EURO\n',
+        ], today=date(2030, 1, 1))
+
+        self.assertEqual((report['rows'], report['fares'], report['rejected']), (6, 1, 5))
+        self.assertEqual([error['line'] for error in report['errors']], [3, 4, 5, 6, 7])
+        self.assertEqual(report['errors'][0]['error'], 'Compagnie inconnue : ZZ')
+        self.assertEqual(list(Flight.objects.values_list('flight_number', flat=True)), ['001'])
+
+    def test_prune_removes_future_fares_not_in_the_file(self):
+        kept = self.create_flight('001', seats=10)
+        stale = self.create_flight('002', seats=10)
+        FlightAvailability.objects.create(
+            flight=stale, flight_class=self.economy, date=self.day - timedelta(days=200),
+            available_seats=10, price=300
+        )
+        other_airline = Flight.objects.create(
+            airline=Airline.objects.create(code='BA', name='British Airways'), flight_number='003',
+            departure_airport=self.cdg, arrival_airport=self.jfk, duration_minutes=480
+        )
+        FlightAvailability.objects.create(
+            flight=other_airline, flight_class=self.economy, date=self.day, available_seats=10, price=300
+        )
+        FlightAvailability.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+        report = load_fares(
+            [self.HEADER, 'AF,001,CDG,JFK,Economy,2030-06-01,8,250,EUR\n'],
+            prune=True, today=date(2030, 1, 1)
+        )
+
+        self.assertEqual(report['pruned'], 1)
+        self.assertEqual(self.seats(kept), 8)
+        self.assertFalse(FlightAvailability.objects.filter(flight=stale, date=self.day).exists())
+        # Tarif passé et tarifs d'une compagnie absente du fichier conservés
+        self.assertTrue(FlightAvailability.objects.filter(flight=stale).exists())
+        self.assertTrue(FlightAvailability.objects.filter(flight=other_airline).exists())
+
+    def test_reload_keeps_booked_seats_out_of_sale(self):
+        flight = self.create_flight('001', seats=10)
+        self.book([flight], passengers=3)
+        self.book([flight], passengers=2, status=self.cancelled, reference='REF-2')
+        self.assertEqual(self.seats(flight), 7)
+
+        load_fares([self.HEADER, 'AF,001,CDG,JFK,Economy,2030-06-01,10,280,EUR\n'], today=date(2030, 1, 1))
+        self.assertEqual(self.seats(flight), 7)
+        load_fares([self.HEADER, 'AF,001,CDG,JFK,Economy,2030-06-01,2,280,EUR\n'], today=date(2030, 1, 1))
+        self.assertEqual(self.seats(flight), 0)
+
+    def test_upload_reports_partial_load_on_decode_error(self):
+        client = APIClient()
+        client.force_authenticate(SimpleNamespace(is_staff=True, is_authenticated=True, pk=None, id=None))
+        # L'erreur de décodage survient après les premiers lots (lecture par blocs)
+        content = (self.HEADER + ''.join(
+            f'AF,001,CDG,JFK,Economy,{self.day + timedelta(days=offset)},10,300,EUR\n' for offset in range(400)
+        )).encode('utf-8') + 'AF,002,CDG,JFK,Économie,2030-06-01,10,300,EUR\n'.encode('latin-1')
+
+        with mock.patch('flights.views.FareLoader', partial(FareLoader, batch_size=50)):
+            response = client.post('/api/flights/flight-availability/upload/', {
+                'file': SimpleUploadedFile('fares.csv', content), 'prune': 'true'
+            })
+        self.assertEqual(response.status_code, 400)
+        report = response.data['report']
+        self.assertGreater(report['fares'], 0)
+        self.assertEqual(report['pruned'], 0)
+        self.assertEqual(FlightAvailability.objects.count(), report['fares'])
+
+
+# ============================================================================
+# AUTOCOMPLÉTION DES AÉROPORTS
+# ============================================================================
+
+class AirportAutocompleteTests(FlightTestCase):
+    """Préfixes de tous les mots, accents repliés, aéroports les plus fréquentés d'abord"""
+
+    def setUp(self):
+        Airport.objects.filter(pk=self.cdg.pk).update(city='Paris', country='France')
+        self.orly = Airport.objects.create(iata_code='ORY', name='Paris Orly', city='Paris', country='France')
+        self.montreal = Airport.objects.create(
+            iata_code='YUL', name='Montréal-Trudeau', city='Montréal', country='Canada'
+        )
+        self.create_flight('001')
+        self.index = AirportAutocompleteIndex().rebuild()
+
+    def codes(self, query, limit=10):
+        return [airport['iata_code'] for airport in self.index.search(query, limit)]
+
+    def test_prefix_search(self):
+        self.assertEqual(self.codes('par'), ['CDG', 'ORY'])
+        self.assertEqual(self.codes('paris or'), ['ORY'])
+        self.assertEqual(self.codes('MONTREAL'), ['YUL'])
+        self.assertEqual(self.codes('ory'), ['ORY'])
+        self.assertEqual(self.codes('par', limit=1), ['CDG'])
+        self.assertEqual(self.codes('lyon'), [])
+
+    def test_rebuild_publishes_a_new_snapshot(self):
+        snapshot = self.index.snapshot
+        Airport.objects.create(iata_code='BVA', name='Paris Beauvais', city='Beauvais', country='France')
+        self.index.rebuild()
+
+        self.assertIsNot(self.index.snapshot, snapshot)
+        self.assertEqual(len(snapshot.airports), 4)
+        self.assertEqual(self.codes('paris'), ['CDG', 'BVA', 'ORY'])
+
+
+# ============================================================================
+# PRIX DE PLUSIEURS VOLS
+# ============================================================================
+
+class PricesBatchTests(FlightTestCase):
+    """Prix par classe de chaque couple (vol, date) demandé, en une requête"""
+
+    URL = '/api/flights/flights/prices_batch/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.business = FlightClass.objects.create(name='Business')
+        self.flight = self.create_flight('001', seats=5)
+        FlightAvailability.objects.create(
+            flight=self.flight, flight_class=self.business, date=self.day, available_seats=2, price=900
+        )
+        self.other = self.create_flight('002')
+        FlightAvailability.objects.create(
+            flight=self.other, flight_class=self.economy, date=self.day + timedelta(days=1),
+            available_seats=3, price=200
+        )
+
+    def test_prices_per_pair(self):
+        unknown = '00000000-0000-0000-0000-000000000000'
+        items = [
+            {'flight_id': str(self.flight.id), 'date': str(self.day)},
+            {'flight_id': str(self.other.id), 'date': str(self.day)},
+            {'flight_id': str(self.other.id), 'date': str(self.day + timedelta(days=1))},
+            {'flight_id': str(self.flight.id), 'date': str(self.day)},
+            {'flight_id': unknown, 'date': str(self.day)},
+        ]
+        with self.assertNumQueries(2):
+            response = self.client.post(self.URL, {'items': items}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(result['flight'], result['date'], [(price['flight_class_name'], price['price']) for price in result['prices']])
+             for result in response.data['results']],
+            [
+                ('AF001', str(self.day), [('Business', 900.0), ('Economy', 300.0)]),
+                ('AF002', str(self.day), []),
+                ('AF002', str(self.day + timedelta(days=1)), [('Economy', 200.0)]),
+            ]
+        )
+        self.assertEqual(response.data['not_found'], [unknown])
+
+        response = self.client.post(self.URL, {
+            'items': items[:1], 'flight_class_ids': [str(self.economy.id)]
+        }, format='json')
+        self.assertEqual([price['flight_class_name'] for price in response.data['results'][0]['prices']], ['Economy'])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.post(self.URL, {'items': []}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(self.URL, {
+            'items': [{'flight_id': str(self.flight.id), 'date': '01/06/2030'}]
+        }, format='json').status_code, 400)
+        with mock.patch('flights.views.FlightViewSet.MAX_BATCH_PRICES', 1):
+            self.assertEqual(self.client.post(self.URL, {
+                'items': [{'flight_id': str(self.flight.id), 'date': str(self.day)}] * 2
+            }, format='json').status_code, 400)
+
+
+# ============================================================================
+# STATUT DES VOLS EN MASSE
+# ============================================================================
+
+class StatusUpdateTests(FlightTestCase):
+    """Une notification par client, vol et date, hors réservations annulées"""
+
+    def test_notification_counts_per_flight(self):
+        delayed = self.create_flight('001', seats=20)
+        completed = self.create_flight('002', seats=20)
+        other = get_user_model().objects.create_user(email='autre@example.com', password='secret')
+        self.book([delayed], passengers=2, reference='REF-1')
+        self.book([delayed], passengers=1, reference='REF-2')
+        self.book([delayed], passengers=3, user=other, reference='REF-3')
+        self.book([delayed], passengers=4, status=self.cancelled, reference='REF-4')
+        self.book([completed], passengers=1, reference='REF-5')
+        unknown = '00000000-0000-0000-0000-000000000000'
+
+        report = apply_status_updates(parse_updates([
+            {'flight_id': str(delayed.id), 'date': str(self.day), 'status': 'delayed', 'message': 'Retard de 2h'},
+            {'flight_id': str(completed.id), 'date': str(self.day), 'status': 'completed'},
+            {'flight_id': unknown, 'date': str(self.day), 'status': 'delayed'},
+        ]), batch_size=2)
+
+        self.assertEqual((report['flights_updated'], report['notifications']), (2, 2))
+        self.assertEqual(report['not_found'], [unknown])
+        self.assertEqual(
+            [(flight['flight'], flight['bookings'], flight['passengers'], flight['notified']) for flight in report['flights']],
+            [('AF001', 3, 6, 2), ('AF002', 0, 0, 0)]
+        )
+        delayed.refresh_from_db()
+        self.assertEqual(delayed.status, 'delayed')
+
+        notification = Notification.objects.get(user=self.user)
+        self.assertEqual(notification.title, 'Vol AF001 retardé')
+        self.assertIn('Retard de 2h.', notification.message)
+        self.assertIn('REF-1, REF-2', notification.message)
+        self.assertTrue(Notification.objects.filter(user=other).exists())
+
+    def test_invalid_update_is_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_updates([{'flight_id': 'x', 'date': str(self.day), 'status': 'landed'}])
+
+    def test_unchanged_status_is_neither_written_nor_notified(self):
+        flight = self.create_flight('001', seats=20)
+        Flight.objects.filter(pk=flight.pk).update(status='delayed')
+        self.book([flight], reference='REF-1')
+        updated_at = Flight.objects.get(pk=flight.pk).updated_at
+
+        report = apply_status_updates(parse_updates([
+            {'flight_id': str(flight.id), 'date': str(self.day), 'status': 'delayed'},
+        ]))
+        self.assertEqual((report['flights_updated'], report['notifications'], report['flights']), (0, 0, []))
+        self.assertEqual([update['flight'] for update in report['unchanged']], ['AF001'])
+        self.assertEqual(report['status_scope'], 'flight')
+        self.assertEqual(Flight.objects.get(pk=flight.pk).updated_at, updated_at)
+        self.assertFalse(Notification.objects.exists())
+
+        # Retard confirmé puis retour à l'heure : seul le retour est notifié, le dernier statut est écrit
+        report = apply_status_updates(parse_updates([
+            {'flight_id': str(flight.id), 'date': str(self.day), 'status': 'delayed'},
+            {'flight_id': str(flight.id), 'date': str(self.day), 'status': 'scheduled'},
+        ]), batch_size=1)
+        self.assertEqual((report['flights_updated'], report['notifications']), (1, 1))
+        self.assertEqual(len(report['unchanged']), 1)
+        self.assertEqual(Flight.objects.get(pk=flight.pk).status, 'scheduled')
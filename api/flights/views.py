@@ -1,16 +1,25 @@
 from rest_framework import viewsets, status, permissions, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q, Count, Min, Max
+from django.db.models import Q, Count, Min, Max, Exists, F, OuterRef, Subquery, UUIDField
 from django.utils import timezone
 from datetime import datetime, timedelta
+import io
+import uuid
 
+from nomade_api.geo import parse_point, nearby, serialize_with_distance
+
+from .airport_index import DEFAULT_LIMIT as AUTOCOMPLETE_LIMIT, MAX_LIMIT as AUTOCOMPLETE_MAX_LIMIT, get_airport_index
+from .fare_calendar import MAX_WINDOW_DAYS, cheapest_dates, fare_calendar
+from .fare_loader import FORMATS, FareLoader, detect_format
+from .itineraries import LAYOVER_MINUTES, MAX_STOPS, DEFAULT_LIMIT, MAX_LIMIT, get_itinerary_graph
 from .models import Airline, Airport, FlightClass, Flight, FlightAvailability
 from .serializers import (
     AirlineSerializer, AirportSerializer, FlightClassSerializer,
     FlightSerializer, FlightListSerializer, FlightDetailSerializer,
-    FlightAvailabilitySerializer
+    FlightAvailabilitySerializer, FlightSearchSerializer
 )
+from .status_updates import apply_status_updates, parse_updates
 
 
 # ============================================================================
@@ -62,12 +71,37 @@ class AirportViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Autocomplétion par préfixe sur le code IATA, le nom, la ville et le
+        pays (sans accents ni casse) : code IATA exact en tête, puis par
+        nombre de vols
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'error': 'Le paramètre q est requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', AUTOCOMPLETE_LIMIT)), 1), AUTOCOMPLETE_MAX_LIMIT)
+        except ValueError:
+            return Response(
+                {'error': 'limit doit être un entier'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({
+            'query': query,
+            'results': get_airport_index().search(query, limit)
+        })
+    
     @action(detail=False, methods=['get'])
     def nearby(self, request):
         """Rechercher des aéroports proches d'un point GPS"""
         latitude = request.query_params.get('latitude')
         longitude = request.query_params.get('longitude')
-        radius_km = float(request.query_params.get('radius', 50))
         
         if not latitude or not longitude:
             return Response(
@@ -75,19 +109,18 @@ class AirportViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Approximation simple (pour une vraie app, utiliser PostGIS)
-        lat = float(latitude)
-        lon = float(longitude)
-        lat_range = radius_km / 111.0  # ~111 km par degré de latitude
-        lon_range = radius_km / (111.0 * abs(lat))
-        
-        queryset = self.queryset.filter(
-            latitude__range=(lat - lat_range, lat + lat_range),
-            longitude__range=(lon - lon_range, lon + lon_range)
-        )
+        try:
+            lat, lon, radius_km, limit = parse_point(
+                latitude, longitude,
+                request.query_params.get('radius', 50),
+                request.query_params.get('limit')
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        # Distances de haversine, du plus proche au plus lointain
+        results = nearby(self.get_queryset(), lat, lon, radius_km, limit)
+        return Response(serialize_with_distance(self.get_serializer, results))
 
 
 # ============================================================================
@@ -145,12 +178,68 @@ class FlightAvailabilityViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(price__lte=float(max_price))
         
         return queryset
+    
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def upload(self, request):
+        """
+        Charger un fichier de vols et de tarifs (CSV ou NDJSON, champ file)
+        en masse (staff seulement). Paramètres : format (csv ou ndjson, par
+        défaut d'après l'extension), prune=true pour supprimer les tarifs
+        futurs des compagnies du fichier qui n'y figurent pas.
+        """
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Seuls les administrateurs peuvent charger des tarifs'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        uploaded = request.FILES.get('file')
+        if uploaded is None:
+            return Response(
+                {'error': 'Le fichier (champ file) est requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        file_format = request.data.get('format') or detect_format(uploaded.name)
+        if file_format not in FORMATS:
+            return Response(
+                {'error': f"format doit valoir {', '.join(FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        prune = str(request.data.get('prune', '')).lower() in ('1', 'true', 'yes')
+        
+        # Lecture en flux du fichier reçu (en mémoire ou sur disque selon sa taille)
+        lines = io.TextIOWrapper(uploaded.file, encoding='utf-8', newline='')
+        loader = FareLoader(prune=prune)
+        try:
+            report = loader.load(lines, file_format)
+        except UnicodeDecodeError:
+            # Les lots écrits avant l'erreur sont validés : le rapport les décrit
+            return Response(
+                {
+                    'error': 'Le fichier doit être encodé en UTF-8 : chargement interrompu, '
+                             'les tarifs déjà écrits (report.fares) sont conservés',
+                    'report': loader.report,
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        finally:
+            lines.detach()
+        
+        return Response(report)
 
 
 # ============================================================================
 # FLIGHTS
 # ============================================================================
 
+# Tris de FlightViewSet.search (ordering=)
+SEARCH_ORDERINGS = {
+    'duration': ['duration_minutes', 'flight_number'],
+    'price': [F('cheapest_price').asc(nulls_last=True), 'duration_minutes', 'flight_number'],
+    'departure': ['departure_airport__iata_code', 'flight_number'],
+}
+
+
 class FlightViewSet(viewsets.ModelViewSet):
     """ViewSet pour Flight"""
     queryset = Flight.objects.select_related(
@@ -161,12 +250,15 @@ class FlightViewSet(viewsets.ModelViewSet):
     search_fields = ['flight_number', 'aircraft_type']
     ordering_fields = ['flight_number', 'duration_minutes', 'status', 'created_at']
     ordering = ['-created_at']
+    MAX_BATCH_PRICES = 200
     
     def get_serializer_class(self):
         if self.action == 'list':
             return FlightListSerializer
         elif self.action == 'retrieve':
             return FlightDetailSerializer
+        elif self.action == 'search':
+            return FlightSearchSerializer
         return FlightSerializer
     
     def get_queryset(self):
@@ -200,7 +292,15 @@ class FlightViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def search(self, request):
-        """Recherche avancée de vols"""
+        """
+        Recherche avancée de vols.
+        
+        Chaque vol porte le tarif le moins cher qui correspond à la recherche
+        (prix, devise, classe, sièges restants) pour la date demandée, ou à
+        partir d'aujourd'hui sans date, calculé par sous-requêtes dans la
+        requête de la page. Tri : ordering=duration (par défaut), price ou
+        departure (aéroport de départ, les vols n'ayant pas d'horaire).
+        """
         departure_iata = request.query_params.get('departure_iata')
         arrival_iata = request.query_params.get('arrival_iata')
         departure_city = request.query_params.get('departure_city')
@@ -210,8 +310,16 @@ class FlightViewSet(viewsets.ModelViewSet):
         min_seats = request.query_params.get('min_seats', 1)
         max_price = request.query_params.get('max_price')
         airline_id = request.query_params.get('airline_id')
+        ordering = request.query_params.get('ordering', 'duration')
         
-        queryset = self.get_queryset().filter(status__in=['scheduled', 'delayed'])
+        if ordering not in SEARCH_ORDERINGS:
+            return Response(
+                {'error': f"ordering doit valoir {', '.join(SEARCH_ORDERINGS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Les disponibilités préchargées par get_queryset ne sont pas sérialisées
+        queryset = self.get_queryset().prefetch_related(None).filter(status__in=['scheduled', 'delayed'])
         
         # Filtres géographiques
         if departure_iata:
@@ -228,34 +336,38 @@ class FlightViewSet(viewsets.ModelViewSet):
         if airline_id:
             queryset = queryset.filter(airline_id=airline_id)
         
+        # Tarifs correspondant à la recherche
+        try:
+            available_flights = FlightAvailability.objects.filter(available_seats__gte=int(min_seats))
+            if flight_class_id:
+                available_flights = available_flights.filter(flight_class_id=flight_class_id)
+            if max_price:
+                available_flights = available_flights.filter(price__lte=float(max_price))
+        except ValueError:
+            available_flights = FlightAvailability.objects.filter(available_seats__gte=1)
+        
         # Filtre par disponibilité et date
+        search_date = None
         if date:
             try:
                 search_date = datetime.strptime(date, '%Y-%m-%d').date()
-                
-                # Filtrer les vols qui ont des disponibilités pour cette date
-                if flight_class_id:
-                    available_flights = FlightAvailability.objects.filter(
-                        date=search_date,
-                        flight_class_id=flight_class_id,
-                        available_seats__gte=int(min_seats)
-                    )
-                else:
-                    available_flights = FlightAvailability.objects.filter(
-                        date=search_date,
-                        available_seats__gte=int(min_seats)
-                    )
-                
-                if max_price:
-                    available_flights = available_flights.filter(price__lte=float(max_price))
-                
-                flight_ids = available_flights.values_list('flight_id', flat=True).distinct()
-                queryset = queryset.filter(id__in=flight_ids)
             except ValueError:
                 pass
+        if search_date:
+            available_flights = available_flights.filter(date=search_date)
+            queryset = queryset.filter(Exists(available_flights.filter(flight=OuterRef('pk'))))
+        else:
+            available_flights = available_flights.filter(date__gte=timezone.localdate())
         
-        # Trier par durée croissante
-        queryset = queryset.order_by('duration_minutes', 'flight_number')
+        cheapest = available_flights.filter(flight=OuterRef('pk')).order_by('price', 'date', '-available_seats')
+        queryset = queryset.annotate(
+            fare_date=Subquery(cheapest.values('date')[:1]),
+            cheapest_price=Subquery(cheapest.values('price')[:1]),
+            cheapest_currency=Subquery(cheapest.values('currency')[:1]),
+            cheapest_flight_class_id=Subquery(cheapest.values('flight_class_id')[:1], output_field=UUIDField()),
+            cheapest_flight_class_name=Subquery(cheapest.values('flight_class__name')[:1]),
+            cheapest_available_seats=Subquery(cheapest.values('available_seats')[:1]),
+        ).order_by(*SEARCH_ORDERINGS[ordering])
         
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -265,6 +377,146 @@ class FlightViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def itineraries(self, request):
+        """
+        Itinéraires directs ou avec correspondances (1 ou 2 escales) pour une
+        date, triés par prix total (ordering=price) ou par durée totale
+        estimée (ordering=duration)
+        """
+        departure_iata = request.query_params.get('departure_iata')
+        arrival_iata = request.query_params.get('arrival_iata')
+        date = request.query_params.get('date')
+        flight_class_id = request.query_params.get('flight_class_id')
+        ordering = request.query_params.get('ordering', 'price')
+        
+        if not departure_iata or not arrival_iata or not date:
+            return Response(
+                {'error': 'Les paramètres departure_iata, arrival_iata et date sont requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            search_date = datetime.strptime(date, '%Y-%m-%d').date()
+        except ValueError:
+            return Response(
+                {'error': 'Format de date invalide. Utilisez YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            min_seats = max(int(request.query_params.get('min_seats', 1)), 1)
+            max_stops = min(max(int(request.query_params.get('max_stops', MAX_STOPS)), 0), MAX_STOPS)
+            limit = min(max(int(request.query_params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+            max_price = request.query_params.get('max_price')
+            max_price = float(max_price) if max_price else None
+            max_duration = request.query_params.get('max_duration')
+            max_duration = int(max_duration) if max_duration else None
+        except ValueError:
+            return Response(
+                {'error': 'min_seats, max_stops, limit, max_price et max_duration doivent être numériques'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if ordering not in ('price', 'duration'):
+            return Response(
+                {'error': 'ordering doit valoir price ou duration'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        graph = get_itinerary_graph()
+        results = graph.search(
+            departure_iata, arrival_iata, search_date,
+            flight_class_id=flight_class_id, min_seats=min_seats, max_stops=max_stops,
+            max_price=max_price, max_duration=max_duration, ordering=ordering, limit=limit
+        )
+        
+        # Détail des vols retenus en une requête
+        flights = Flight.objects.select_related('airline').in_bulk(
+            {leg.flight_id for legs in results for leg in legs}
+        )
+        itineraries = []
+        for legs in results:
+            if any(leg.flight_id not in flights for leg in legs):
+                continue
+            flying_minutes = sum(leg.duration for leg in legs)
+            layover_minutes = LAYOVER_MINUTES * (len(legs) - 1)
+            itineraries.append({
+                'stops': len(legs) - 1,
+                'total_price': round(sum(leg.price for leg in legs), 2),
+                'currency': legs[0].currency,
+                'total_duration_minutes': flying_minutes + layover_minutes,
+                'flying_minutes': flying_minutes,
+                'layover_minutes': layover_minutes,
+                'legs': [
+                    {
+                        'flight_id': str(leg.flight_id),
+                        'flight': f"{flights[leg.flight_id].airline.code}{flights[leg.flight_id].flight_number}",
+                        'departure_airport_code': graph.iata_codes.get(leg.departure),
+                        'arrival_airport_code': graph.iata_codes.get(leg.arrival),
+                        'duration_minutes': flights[leg.flight_id].duration_minutes,
+                        'flight_class_id': str(leg.flight_class_id),
+                        'available_seats': leg.available_seats,
+                        'price': leg.price,
+                        'currency': leg.currency,
+                    }
+                    for leg in legs
+                ],
+            })
+        
+        return Response({
+            'departure_iata': departure_iata.upper(),
+            'arrival_iata': arrival_iata.upper(),
+            'date': date,
+            'count': len(itineraries),
+            'itineraries': itineraries
+        })
+    
+    @action(detail=False, methods=['get'])
+    def fare_calendar(self, request):
+        """Prix minimum et sièges disponibles par jour pour une route"""
+        departure_iata = request.query_params.get('departure_iata')
+        arrival_iata = request.query_params.get('arrival_iata')
+        date_from = request.query_params.get('date_from')
+        date_to = request.query_params.get('date_to')
+        flight_class_id = request.query_params.get('flight_class_id')
+        
+        if not departure_iata or not arrival_iata or not date_from or not date_to:
+            return Response(
+                {'error': 'Les paramètres departure_iata, arrival_iata, date_from et date_to sont requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start = datetime.strptime(date_from, '%Y-%m-%d').date()
+            end = datetime.strptime(date_to, '%Y-%m-%d').date()
+        except ValueError:
+            return Response(
+                {'error': 'Format de date invalide. Utilisez YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if end < start:
+            return Response(
+                {'error': 'date_to doit être postérieure ou égale à date_from'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (end - start).days + 1 > MAX_WINDOW_DAYS:
+            return Response(
+                {'error': f'La période ne peut pas dépasser {MAX_WINDOW_DAYS} jours'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        days = fare_calendar(departure_iata, arrival_iata, start, end, flight_class_id)
+        # Les prix de devises différentes ne se comparent pas
+        cheapest = cheapest_dates(days)
+        
+        return Response({
+            'departure_iata': departure_iata.upper(),
+            'arrival_iata': arrival_iata.upper(),
+            'date_from': date_from,
+            'date_to': date_to,
+            'flight_class_id': flight_class_id,
+            'cheapest_date': next(iter(cheapest.values())) if len(cheapest) == 1 else None,
+            'cheapest_dates': cheapest,
+            'days': days
+        })
+    
     @action(detail=True, methods=['get'])
     def availability(self, request, pk=None):
         """Récupérer la disponibilité d'un vol pour une période"""
@@ -324,4 +576,146 @@ class FlightViewSet(viewsets.ModelViewSet):
             'date': date,
             'prices': prices_data
         })
-
+    
+    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny])
+    def prices_batch(self, request):
+        """
+        Prix par classe de plusieurs vols, chacun pour une date, en une requête.
+        
+        Corps : {"items": [{"flight_id": ..., "date": "YYYY-MM-DD"}, ...],
+        "flight_class_ids": [...] (facultatif)}. Chaque résultat a la forme de
+        prices ; les vols inconnus sont listés dans not_found.
+        """
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'error': 'items est requis (liste de {flight_id, date})'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.MAX_BATCH_PRICES:
+            return Response(
+                {'error': f'Maximum {self.MAX_BATCH_PRICES} couples (vol, date) par requête'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        pairs, error_response = self._parse_fare_requests(items)
+        if error_response:
+            return error_response
+        
+        flight_class_ids = request.data.get('flight_class_ids') or []
+        if not isinstance(flight_class_ids, list):
+            flight_class_ids = [flight_class_ids]
+        try:
+            flight_class_ids = [str(uuid.UUID(str(class_id))) for class_id in flight_class_ids]
+        except ValueError:
+            return Response(
+                {'error': 'flight_class_ids doit être une liste d\'identifiants de classe'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        flight_ids = list(dict.fromkeys(flight_id for flight_id, _ in pairs))
+        flights = {
+            str(flight_id): f"{airline_code}{flight_number}"
+            for flight_id, airline_code, flight_number in Flight.objects.filter(
+                id__in=flight_ids
+            ).values_list('id', 'airline__code', 'flight_number')
+        }
+        
+        # Une condition (vol, dates demandées) par vol : l'index unique
+        # (flight, flight_class, date) sert chaque branche
+        dates_by_flight = {}
+        for flight_id, fare_date in pairs:
+            if flight_id in flights:
+                dates_by_flight.setdefault(flight_id, []).append(fare_date)
+        
+        prices = {}
+        if dates_by_flight:
+            condition = Q()
+            for flight_id, dates in dates_by_flight.items():
+                condition |= Q(flight_id=flight_id, date__in=dates)
+            availabilities = FlightAvailability.objects.filter(condition)
+            if flight_class_ids:
+                availabilities = availabilities.filter(flight_class_id__in=flight_class_ids)
+            for flight_id, fare_date, class_id, class_name, seats, price, currency in availabilities.order_by(
+                'flight_class__name'
+            ).values_list(
+                'flight_id', 'date', 'flight_class_id', 'flight_class__name', 'available_seats', 'price', 'currency'
+            ):
+                prices.setdefault((str(flight_id), fare_date), []).append({
+                    'flight_class_id': str(class_id),
+                    'flight_class_name': class_name,
+                    'available_seats': seats,
+                    'price': float(price),
+                    'currency': currency
+                })
+        
+        return Response({
+            'results': [
+                {
+                    'flight_id': flight_id,
+                    'flight': flights[flight_id],
+                    'date': fare_date.isoformat(),
+                    'prices': prices.get((flight_id, fare_date), [])
+                }
+                for flight_id, fare_date in pairs
+                if flight_id in flights
+            ],
+            'not_found': [flight_id for flight_id in flight_ids if flight_id not in flights]
+        })
+    
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def bulk_status(self, request):
+        """
+        Mettre à jour le statut de plusieurs vols en une transaction et
+        prévenir les clients des réservations concernées (staff seulement).
+        
+        Corps : {"updates": [{"flight_id": ..., "date": "YYYY-MM-DD",
+        "status": "delayed", "message": "..."}, ...]}. Flight.status est porté
+        par le vol, pour toutes ses dates (status_scope = "flight" dans le
+        rapport) : la date désigne seulement les réservations à prévenir.
+        Seules les mises à jour qui changent le statut du vol sont écrites et
+        notifiées ; le rapport donne, pour chacune, le nombre de réservations,
+        de passagers et de clients notifiés, et liste les autres dans
+        unchanged.
+        """
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Seuls les administrateurs peuvent modifier le statut des vols'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            updates = parse_updates(request.data.get('updates'))
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(apply_status_updates(updates))
+    
+    def _parse_fare_requests(self, items):
+        """Retourne (couples (vol, date) distincts, None) ou (None, réponse 400)"""
+        pairs = []
+        for item in items:
+            if not isinstance(item, dict) or not item.get('flight_id') or not item.get('date'):
+                return None, Response(
+                    {'error': 'Chaque élément de items doit avoir flight_id et date'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                flight_id = str(uuid.UUID(str(item['flight_id'])))
+            except ValueError:
+                return None, Response(
+                    {'error': f"Identifiant de vol invalide: {item['flight_id']}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                fare_date = datetime.strptime(str(item['date']), '%Y-%m-%d').date()
+            except ValueError:
+                return None, Response(
+                    {'error': 'Format de date invalide. Utilisez YYYY-MM-DD'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            pairs.append((flight_id, fare_date))
+        return list(dict.fromkeys(pairs)), None
@@ -0,0 +1,224 @@
+"""
+Recherche géographique partagée par les actions `nearby`.
+
+Chaque modèle géolocalisé (champs latitude / longitude) a un index en mémoire
+propre au processus : les points sont triés par latitude, une recherche ne
+calcule les distances que sur la bande de latitudes du rayon, avec la formule
+de haversine vectorisée par NumPy. Les longitudes ne sont pas bornées, ce qui
+gère correctement l'antiméridien et les pôles.
+
+L'index d'un modèle est construit à la première recherche puis reconstruit
+après une écriture sur le modèle (signaux post_save / post_delete) ou après
+GEO_INDEX_MAX_AGE secondes pour rattraper les écritures des autres processus.
+Une reconstruction publie ses points d'un seul bloc (GeoPoints) : les
+recherches concurrentes, sans verrou, lisent l'ancien ou le nouveau jeu.
+"""
+import math
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def parse_point(latitude, longitude, radius, limit=None):
+    """
+    Valider les paramètres d'une recherche de proximité.
+
+    Retourne (latitude, longitude, radius_km, limit) ; lève ValueError avec un
+    message lisible si un paramètre est invalide.
+    """
+    try:
+        lat = float(latitude)
+        lon = float(longitude)
+        radius_km = float(radius)
+    except (TypeError, ValueError):
+        raise ValueError('latitude, longitude et radius doivent être des nombres')
+    if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+        raise ValueError('latitude doit être entre -90 et 90, longitude entre -180 et 180')
+    if not radius_km > 0:
+        raise ValueError('radius doit être positif')
+
+    if limit in (None, ''):
+        limit = DEFAULT_LIMIT
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError('limit doit être un entier')
+    if limit < 1:
+        raise ValueError('limit doit être positif')
+    return lat, lon, radius_km, min(limit, MAX_LIMIT)
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Distances (km) entre un point et des tableaux de points, en degrés"""
+    return _haversine_radians(
+        math.radians(latitude), math.radians(longitude),
+        np.radians(np.asarray(latitudes, dtype=np.float64)),
+        np.radians(np.asarray(longitudes, dtype=np.float64))
+    )
+
+
+def _haversine_radians(lat, lon, lats, lons, cos_lats=None):
+    if cos_lats is None:
+        cos_lats = np.cos(lats)
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * cos_lats * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box_q(latitude, longitude, radius_km, lat_field='latitude', lon_field='longitude'):
+    """
+    Filtre Q englobant le cercle de rayon `radius_km` (préfiltre en base).
+
+    La largeur en longitude dépend de cos(latitude) ; près des pôles seule la
+    latitude est bornée, et une boîte qui traverse l'antiméridien est coupée
+    en deux intervalles.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    q = Q(**{
+        f'{lat_field}__gte': max(-90.0, latitude - lat_delta),
+        f'{lat_field}__lte': min(90.0, latitude + lat_delta),
+    })
+
+    if abs(latitude) + lat_delta >= 90:
+        return q
+    # Demi-largeur maximale du cercle en longitude (à la latitude de tangence)
+    lon_delta = math.degrees(math.asin(
+        min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude)))
+    ))
+    if lon_delta >= 180:
+        return q
+
+    lon_min, lon_max = longitude - lon_delta, longitude + lon_delta
+    if lon_min < -180:
+        return q & (Q(**{f'{lon_field}__gte': lon_min + 360}) | Q(**{f'{lon_field}__lte': lon_max}))
+    if lon_max > 180:
+        return q & (Q(**{f'{lon_field}__gte': lon_min}) | Q(**{f'{lon_field}__lte': lon_max - 360}))
+    return q & Q(**{f'{lon_field}__gte': lon_min, f'{lon_field}__lte': lon_max})
+
+
+# Points d'un index, publiés ensemble : une recherche lit toujours des pks et
+# des coordonnées de la même construction
+GeoPoints = namedtuple('GeoPoints', ['pks', 'lats', 'lons', 'cos_lats'])
+
+
+class GeoIndex:
+    """Points d'un modèle triés par latitude (en radians)"""
+
+    def __init__(self, model, lat_field='latitude', lon_field='longitude'):
+        self.model = model
+        self.lat_field = lat_field
+        self.lon_field = lon_field
+        self.points = GeoPoints([], np.empty(0), np.empty(0), np.empty(0))
+        self.built_at = None
+        self.dirty = True
+        self._lock = threading.Lock()
+
+    def rebuild(self):
+        # Une écriture pendant la lecture remettra dirty à True
+        self.dirty = False
+        rows = list(self.model._default_manager.filter(**{
+            f'{self.lat_field}__isnull': False,
+            f'{self.lon_field}__isnull': False,
+        }).order_by().values_list('pk', self.lat_field, self.lon_field))
+
+        lats = np.radians(np.array([float(row[1]) for row in rows], dtype=np.float64))
+        lons = np.radians(np.array([float(row[2]) for row in rows], dtype=np.float64))
+        order = np.argsort(lats, kind='stable')
+
+        lats = lats[order]
+        self.points = GeoPoints([rows[i][0] for i in order], lats, lons[order], np.cos(lats))
+        self.built_at = time.monotonic()
+        return self
+
+    def ensure_fresh(self):
+        max_age = getattr(settings, 'GEO_INDEX_MAX_AGE', 600)
+        if self.dirty or self.built_at is None or time.monotonic() - self.built_at > max_age:
+            with self._lock:
+                if self.dirty or self.built_at is None or time.monotonic() - self.built_at > max_age:
+                    self.rebuild()
+        return self
+
+    def query(self, latitude, longitude, radius_km):
+        """Liste de (pk, distance_km) des points dans le rayon, triée par distance"""
+        lat = math.radians(latitude)
+        lon = math.radians(longitude)
+        band = radius_km / EARTH_RADIUS_KM
+
+        pks, lats, lons, cos_lats = self.points
+        start = int(np.searchsorted(lats, lat - band, side='left'))
+        end = int(np.searchsorted(lats, lat + band, side='right'))
+        if start >= end:
+            return []
+
+        distances = _haversine_radians(
+            lat, lon, lats[start:end], lons[start:end], cos_lats[start:end]
+        )
+        inside = np.nonzero(distances <= radius_km)[0]
+        inside = inside[np.argsort(distances[inside], kind='stable')]
+        return [(pks[start + i], float(distances[i])) for i in inside]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_geo_index(model):
+    """Index du modèle (créé et relié aux signaux du modèle à la première demande)"""
+    index = _indexes.get(model)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(model)
+            if index is None:
+                index = _indexes[model] = GeoIndex(model)
+
+                def mark_dirty(sender, **kwargs):
+                    index.dirty = True
+
+                uid = f'geo-index-{model._meta.label}'
+                post_save.connect(mark_dirty, sender=model, weak=False, dispatch_uid=uid)
+                post_delete.connect(mark_dirty, sender=model, weak=False, dispatch_uid=uid)
+    return index.ensure_fresh()
+
+
+def nearby(queryset, latitude, longitude, radius_km, limit=DEFAULT_LIMIT):
+    """
+    Objets de `queryset` dans le rayon, du plus proche au plus lointain.
+
+    Retourne au plus `limit` couples (objet, distance_km). Les filtres du
+    queryset sont appliqués aux candidats de l'index par lots, dans l'ordre des
+    distances.
+    """
+    candidates = get_geo_index(queryset.model).query(latitude, longitude, radius_km)
+    chunk_size = max(limit * 2, 100)
+    results = []
+    for start in range(0, len(candidates), chunk_size):
+        chunk = candidates[start:start + chunk_size]
+        objects = queryset.in_bulk([pk for pk, _ in chunk])
+        for pk, distance in chunk:
+            if pk in objects:
+                results.append((objects[pk], distance))
+                if len(results) >= limit:
+                    return results
+    return results
+
+
+def serialize_with_distance(get_serializer, results):
+    """
+    Sérialiser les résultats de nearby() en ajoutant distance_km à chaque objet.
+
+    `get_serializer` : classe de serializer ou méthode get_serializer de la vue.
+    """
+    data = get_serializer([obj for obj, _ in results], many=True).data
+    for item, (_, distance) in zip(data, results):
+        item['distance_km'] = round(distance, 2)
+    return data
@@ -175,3 +175,70 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_ALL_ORIGINS = True  # Only for development
 
+
+# Index de disponibilités des chambres en mémoire (accommodations.availability_index)
+# Propre à chaque processus : reconstruit entièrement après AVAILABILITY_INDEX_MAX_AGE secondes
+AVAILABILITY_INDEX_ENABLED = False
+AVAILABILITY_INDEX_HORIZON_DAYS = 730
+AVAILABILITY_INDEX_MAX_AGE = 3600
+
+# Caches
+# property_search : résultats de PropertyViewSet.search (accommodations.search_cache),
+# LRU borné à MAX_ENTRIES recherches
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'property_search': {
+        'BACKEND': 'accommodations.cache_backends.LRULocMemCache',
+        'LOCATION': 'property-search',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+}
+PROPERTY_SEARCH_CACHE_ALIAS = 'property_search'
+PROPERTY_SEARCH_CACHE_MAX_IDS = 10000
+
+# Index géographiques en mémoire des actions nearby (nomade_api.geo)
+GEO_INDEX_MAX_AGE = 600
+
+# Index en mémoire des facettes de PropertyViewSet.search (accommodations.facet_index)
+PROPERTY_FACET_INDEX_MAX_AGE = 300
+
+# Index plein texte en mémoire du paramètre q de PropertyViewSet.search (accommodations.text_index)
+PROPERTY_TEXT_INDEX_MAX_AGE = 600
+
+# Liste et recherche de propriétés filtrées et triées sur la table de projection
+# (accommodations.search_projection) ; à remplir après la migration avec
+# refresh_property_search_projection, puis à recalculer chaque nuit
+PROPERTY_SEARCH_PROJECTION_ENABLED = True
+
+# Stock par type de chambre et par nuit (accommodations.inventory) tenu sur cet
+# horizon ; à remplir après la migration avec refresh_room_inventory, puis recalculé chaque nuit
+ROOM_INVENTORY_HORIZON_DAYS = 365
+
+# Report des saisons RoomPricing dans le prix des nuits (accommodations.season_prices) :
+# nuits tenues à jour par materialize_season_prices, à planifier chaque nuit
+ROOM_SEASON_PRICE_HORIZON_DAYS = 365
+
+# Graphe des routes aériennes en mémoire de FlightViewSet.itineraries (flights.itineraries) :
+# propre à chaque processus, reconstruit après FLIGHT_ITINERARY_GRAPH_MAX_AGE secondes ;
+# tarifs gardés pour FLIGHT_ITINERARY_FARE_DATES dates au plus
+FLIGHT_ITINERARY_GRAPH_MAX_AGE = 300
+FLIGHT_ITINERARY_FARE_DATES = 30
+
+# Index en mémoire de l'autocomplétion des aéroports (flights.airport_index) :
+# reconstruit après une écriture sur Airport ou après AIRPORT_AUTOCOMPLETE_INDEX_MAX_AGE
+# secondes (classement par trafic)
+AIRPORT_AUTOCOMPLETE_INDEX_MAX_AGE = 600
+
+# Calendrier des tarifs d'une route (flights.fare_calendar) : jours mis en cache par
+# route et par mois pour FLIGHT_FARE_CALENDAR_CACHE_TIMEOUT secondes
+FLIGHT_FARE_CALENDAR_CACHE_ALIAS = 'default'
+FLIGHT_FARE_CALENDAR_CACHE_TIMEOUT = 120
+
+# Stockage du calendrier des chambres : 'daily' (room_availability, une ligne par
+# nuit) ou 'ranges' (room_availability_ranges, voir compact_room_availability)
+ROOM_AVAILABILITY_STORAGE = 'daily'
@@ -0,0 +1,18 @@
+"""
+Options d'upsert (bulk_create avec update_conflicts) valables sur toutes les bases.
+
+PostgreSQL et SQLite écrivent INSERT ... ON CONFLICT (colonnes) DO UPDATE et
+exigent la contrainte unique visée (unique_fields). MySQL écrit INSERT ...
+ON DUPLICATE KEY UPDATE, qui s'applique à toutes les clés uniques de la
+table : Django y refuse unique_fields.
+"""
+from django.db import connections, router
+
+
+def upsert_options(model, unique_fields, update_fields):
+    """Arguments de model.objects.bulk_create() pour mettre à jour les lignes existantes"""
+    connection = connections[router.db_for_write(model)]
+    options = {'update_conflicts': True, 'update_fields': update_fields}
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = unique_fields
+    return options
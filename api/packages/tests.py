@@ -1,3 +1,50 @@
+from datetime import date, timedelta
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accommodations.models import Property, Room, RoomAvailability, RoomPricing
+
+from .models import Package, PackageComponent
+
+
+# ============================================================================
+# PRIX D'UN FORFAIT AVEC HÔTEL
+# ============================================================================
+
+class PackageHotelPriceTests(TestCase):
+    """Le prix d'un hôtel est le devis du séjour demandé, sans valeur par défaut"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.check_in = date(2027, 3, 1)
+        property_obj = Property.objects.create(name='Hôtel')
+        room = Room.objects.create(property=property_obj, name='Double', max_guests=2)
+        for night in range(2):
+            RoomAvailability.objects.create(room=room, date=self.check_in + timedelta(night))
+        RoomPricing.objects.create(room=room, base_price=100, currency='EUR', season_type='low')
+        self.package = Package.objects.create(name='Week-end')
+        PackageComponent.objects.create(package=self.package, component_type='hotel', component_id=property_obj.id)
+        self.url = f'/api/packages/packages/{self.package.id}/calculate_price/'
+
+    def test_hotel_is_priced_for_the_stay(self):
+        response = self.client.get(self.url, {
+            'check_in': str(self.check_in), 'check_out': str(self.check_in + timedelta(2))
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['subtotal'], response.data['currency']), (200, 'EUR'))
+
+    def test_stay_is_required_and_validated(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {
+            'check_in': str(self.check_in), 'check_out': str(self.check_in)
+        }).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {
+            'check_in': str(self.check_in), 'check_out': str(self.check_in + timedelta(2)), 'guests': 'deux'
+        }).status_code, 400)
 
-# Create your tests here.
+    def test_unavailable_hotel_is_an_error(self):
+        response = self.client.get(self.url, {
+            'check_in': str(self.check_in), 'check_out': str(self.check_in + timedelta(5))
+        })
+        self.assertEqual(response.status_code, 400)
@@ -193,7 +193,12 @@ class PackageViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def calculate_price(self, request, pk=None):
-        """Calculer le prix total d'un forfait avec réduction"""
+        """
+        Calculer le prix total d'un forfait avec réduction.
+
+        check_in et check_out (et guests, 1 par défaut) sont requis si le
+        forfait contient un hôtel.
+        """
         package_obj = self.get_object()
         
         if not package_obj.is_active:
@@ -202,20 +207,54 @@ class PackageViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        components = list(package_obj.components.all())
+        stay = None
+        if any(component.component_type == 'hotel' for component in components):
+            # Les hôtels sont tarifés à la nuit : le séjour doit être précisé
+            from accommodations.availability import parse_stay
+            check_in = request.query_params.get('check_in')
+            check_out = request.query_params.get('check_out')
+            if not (check_in and check_out):
+                return Response(
+                    {'error': 'check_in et check_out sont requis pour un forfait avec hôtel'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                stay = parse_stay(check_in, check_out)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                guests = int(request.query_params.get('guests', 1))
+            except ValueError:
+                return Response(
+                    {'error': 'guests doit être un entier'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
         total_price = 0.0
         currency = 'EUR'
         components_details = []
         
-        for component in package_obj.components.all():
+        for component in components:
             component_obj = component.get_component_object()
             component_price = 0.0
             
             if component_obj:
                 # Récupérer le prix selon le type de composant
                 if component.component_type == 'hotel':
-                    # Pour les hôtels, on pourrait utiliser room_pricing ou room_availability
-                    # Pour l'instant, on retourne juste l'info
-                    component_price = 0.0
+                    # Pour les hôtels, devis de la chambre la moins chère sur
+                    # le séjour check_in / check_out
+                    from accommodations.pricing import quote_properties
+                    quote = quote_properties(
+                        [component_obj.id], *stay, guests=guests
+                    )[component_obj.id]
+                    if quote is None:
+                        return Response(
+                            {'error': f'Aucune chambre disponible et tarifée à {component_obj} pour ce séjour'},
+                            status=status.HTTP_400_BAD_REQUEST
+                        )
+                    component_price = quote['total']
+                    currency = quote['currency']
                 elif component.component_type == 'flight':
                     # Pour les vols, utiliser flight_availability
                     from flights.models import FlightAvailability